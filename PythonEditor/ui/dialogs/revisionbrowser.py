@@ -0,0 +1,118 @@
+import time
+
+from PythonEditor.ui.Qt import QtWidgets, QtCore
+from PythonEditor.ui import editor
+from PythonEditor.ui.features import revisions
+
+
+class RevisionBrowser(QtWidgets.QDialog):
+    """
+    Lists the saved revisions of the current
+    tab, previews the selected one and lets
+    the user restore it.
+    """
+    def __init__(self, tabeditor, parent=None):
+        super(RevisionBrowser, self).__init__(parent)
+        self.setObjectName('PythonEditorRevisionBrowser')
+        self.setWindowTitle('Tab Revisions')
+        self.tabeditor = tabeditor
+        self.tabs = tabeditor.tabs
+        self.store = revisions.get_revision_store()
+        self.uid = None
+
+        self.build_layout()
+        self.connect_signals()
+
+    def build_layout(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal)
+        self.revision_list = QtWidgets.QListWidget()
+        self.preview = editor.Editor(init_features=False)
+        self.preview.setReadOnly(True)
+        splitter.addWidget(self.revision_list)
+        splitter.addWidget(self.preview)
+        splitter.setSizes([200, 600])
+        layout.addWidget(splitter)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        self.restore_button = QtWidgets.QPushButton('Restore Into Tab')
+        self.restore_button.setToolTip(
+            'Replace the tab contents with this revision. '
+            'This can be undone.'
+        )
+        self.new_tab_button = QtWidgets.QPushButton('Open In New Tab')
+        for button in self.restore_button, self.new_tab_button:
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+        self.resize(900, 600)
+
+    def connect_signals(self):
+        self.revision_list.currentRowChanged.connect(
+            self.show_revision
+        )
+        self.restore_button.clicked.connect(
+            self.restore_revision
+        )
+        self.new_tab_button.clicked.connect(
+            self.open_in_new_tab
+        )
+
+    def showEvent(self, event):
+        self.load_revisions()
+        super(RevisionBrowser, self).showEvent(event)
+
+    def load_revisions(self):
+        """
+        List the revisions of the current tab,
+        newest first.
+        """
+        self.revision_list.clear()
+        self.preview.setPlainText('')
+        self.uid = self.tabs.get('uuid')
+        if self.uid is None:
+            return
+
+        # include the revisions still being written
+        self.store.flush(timeout=1)
+        times = self.store.revisions(self.uid)
+        for index in reversed(range(len(times))):
+            label = time.strftime(
+                '%Y-%m-%d %H:%M:%S',
+                time.localtime(times[index])
+            )
+            item = QtWidgets.QListWidgetItem(label)
+            item.setData(QtCore.Qt.UserRole, index)
+            self.revision_list.addItem(item)
+        if self.revision_list.count():
+            self.revision_list.setCurrentRow(0)
+
+    def selected_text(self):
+        item = self.revision_list.currentItem()
+        if item is None:
+            return None
+        index = item.data(QtCore.Qt.UserRole)
+        return self.store.text_at(self.uid, index)
+
+    def show_revision(self, row):
+        text = self.selected_text()
+        if text is not None:
+            self.preview.setPlainText(text)
+
+    def restore_revision(self):
+        text = self.selected_text()
+        if text is None:
+            return
+        if self.tabs.get('uuid') != self.uid:
+            print('The tab has changed, please reopen the revision list.')
+            return
+        self.tabeditor.editor.replace_text(text)
+
+    def open_in_new_tab(self):
+        text = self.selected_text()
+        if text is None:
+            return
+        name = '{0} (revision)'.format(self.tabs.get('name'))
+        self.tabs.new_tab(
+            tab_name=name,
+            tab_data={'text': text}
+        )
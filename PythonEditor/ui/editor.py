@@ -24,6 +24,7 @@ from PythonEditor.ui.features import linenumberarea
 from PythonEditor.ui.features import syntaxhighlighter
 from PythonEditor.ui.features import autocompletion
 from PythonEditor.ui.features import contextmenu
+from PythonEditor.ui.features import fileloader
 
 
 class Editor(QPlainTextEdit):
@@ -329,16 +330,23 @@ class Editor(QPlainTextEdit):
             # if we're handling shortcuts
             # it means there are no tabs.
             # just insert the text
+            paths = [url.toLocalFile() for url in urls]
+            def insert_texts(text_list):
+                self.textCursor(
+                    ).insertText(
+                    '\n'.join(text_list)
+                )
+
+            if fileloader.is_large_file(paths):
+                # read large files on a background thread
+                fileloader.load_files(paths, self, insert_texts)
+                return
+
             text_list = []
-            for url in urls:
-                path = url.toLocalFile()
+            for path in paths:
                 with open(path, 'r') as f:
                     text_list.append(f.read())
-
-            self.textCursor(
-                ).insertText(
-                '\n'.join(text_list)
-            )
+            insert_texts(text_list)
         else:
             tabeditor = self.parent()
             for url in urls:
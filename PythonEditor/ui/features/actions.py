@@ -30,6 +30,7 @@ from PythonEditor.utils import constants
 from PythonEditor.core import execute
 from PythonEditor.ui.features import search
 from PythonEditor.ui.features import autocompletion
+from PythonEditor.ui.features import fileloader
 from PythonEditor.utils.constants import NUKE_DIR
 
 
@@ -1614,6 +1615,17 @@ class Actions(QtCore.QObject):
         """
         backup_pythoneditor_history()
 
+    def show_tab_revisions(self):
+        """
+        Browse and restore saved revisions
+        of the current tab.
+        """
+        from PythonEditor.ui.dialogs import revisionbrowser
+        self.revision_browser = revisionbrowser.RevisionBrowser(
+            self.tabeditor
+        )
+        self.revision_browser.show()
+
     def show_shortcuts(self):
         """
         Generates a popup dialog listing available shortcuts.
@@ -1983,9 +1995,36 @@ def open_action(tabs, editor, path=''):
     if not os.path.isfile(path):
         return
 
+    uid = str(uuid.uuid4())
+    if fileloader.is_large_file([path]):
+        # read and lex large files on a background
+        # thread, filling the new tab's style cache.
+        def open_texts(texts):
+            open_text(tabs, editor, path, texts[0], uid)
+        fileloader.load_files(
+            [path],
+            editor,
+            open_texts,
+            cache_key=uid
+        )
+        return
+
     with open(path, 'rt') as f:
         text = f.read()
+    open_text(tabs, editor, path, text, uid)
 
+
+def open_text(tabs, editor, path, text, uid):
+    """
+    Open the text read from path into a new tab,
+    unless a tab with that path and text is already
+    open, in which case switch to it.
+    :tabs: TabBar
+    :editor: Editor
+    :path: path to the file.
+    :text: the file's contents.
+    :uid: uuid of the new tab.
+    """
     for index in range(tabs.count()):
         data = tabs.tabData(index)
         if data is None:
@@ -1995,7 +2034,7 @@ def open_action(tabs, editor, path=''):
             continue
 
         # try to avoid more costly 2nd comparison
-        if data.get('text') == text:
+        if tabs.load_text(index) == text:
             tabs.setCurrentIndex(index)
             return
 
@@ -2004,7 +2043,6 @@ def open_action(tabs, editor, path=''):
     # Because the document will be open in read-only mode, the
     # autosave should not save the editor's contents until the
     # contents have been modified.
-    uid = str(uuid.uuid4())
     data = {
         'uuid'  : uid,
         'name'  : tab_name,
@@ -2147,9 +2185,32 @@ def backup_pythoneditor_history():
     dst = path+'_'+now+ext
 
     copyfile(src, dst)
+    # changes not yet compacted into the xml
+    journal = src+'.journal'
+    if os.path.isfile(journal):
+        copyfile(journal, dst+'.journal')
     print('Backup of Python Editor History created:')
     print(dst)
 
+    backend = os.getenv('PYTHONEDITOR_AUTOSAVE_BACKEND', 'xml')
+    if backend.lower() != 'sqlite':
+        return
+    from PythonEditor.ui.features import autosavexml
+    from PythonEditor.ui.features import autosavesqlite
+    database = autosavesqlite.define_database_path()
+    if not os.path.isfile(database):
+        return
+    # write the queued saves before copying.
+    autosavexml.flush_stores()
+    path, ext = os.path.splitext(database)
+    dst = path+'_'+now+ext
+    copyfile(database, dst)
+    # changes not yet checkpointed into the database
+    wal = database+'-wal'
+    if os.path.isfile(wal):
+        copyfile(wal, dst+'-wal')
+    print(dst)
+
 
 def get_snippet_name():
     text, ok = QtWidgets.QInputDialog.getText(
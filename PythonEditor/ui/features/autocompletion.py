@@ -12,6 +12,15 @@ from PythonEditor.ui.Qt import QtCore
 from PythonEditor.ui.Qt import QtWidgets
 from PythonEditor.utils.debug import debug
 from PythonEditor.utils.constants import NUKE_DIR
+from PythonEditor.utils import completion
+from PythonEditor.utils import attributes
+from PythonEditor.utils import providers
+from PythonEditor.utils import moduleindex
+from PythonEditor.utils import latency
+# formerly defined here
+from PythonEditor.ui.features import wordindex
+from PythonEditor.ui.features import sourceindex
+from PythonEditor.ui.features import completionpipeline
 
 
 KEYWORDS = [
@@ -20,6 +29,9 @@ KEYWORDS = [
     'execfile'
 ]
 KEYWORDS.extend(dir(__builtins__))
+# completions that do not depend on the document
+# or on __main__, see static_words.
+STATIC_WORDS = None
 
 class_snippet = """class <!cursor>():
     def __init__(self):
@@ -136,6 +148,25 @@ def locate_snippet_file():
         SNIPPETS.update(**user_snippets)
     except Exception as e:
         debug(e)
+    global STATIC_WORDS
+    STATIC_WORDS = None
+
+
+def static_words():
+    """
+    Return the sorted list of keywords, builtins
+    and snippet names, which is only built again
+    when the snippets are reloaded.
+    """
+    global STATIC_WORDS
+    if STATIC_WORDS is None:
+        STATIC_WORDS = sorted(set().union(
+            keyword.kwlist,
+            SNIPPETS.keys(),
+            dir(__builtins__),
+            KEYWORDS,
+        ))
+    return STATIC_WORDS
 
 
 class Completer(QtWidgets.QCompleter):
@@ -156,15 +187,47 @@ class AutoCompleter(QtCore.QObject):
     Requires signals to be emitted from such
     with -pre and -post keyPressEvent signals.
     """
+    # emitted from the module index's reader thread
+    # once the sources and packages it was asked
+    # for while completing an import are read.
+    modules_read = QtCore.Signal()
+
     def __init__(self, editor):
         super(AutoCompleter, self).__init__()
         self.setParent(editor)
         locate_snippet_file()
 
-        self.loadedModules = sys.modules.keys()
+        # the names of importable modules, listed
+        # without importing them.
+        self.module_index = moduleindex.get_module_index()
+        # kept, so that the index is only
+        # given it once per batch it reads.
+        self._modules_read = self.modules_read.emit
         self._completer = None
 
         self.editor = editor
+        # the words in the document, updated
+        # from the blocks changed by each edit.
+        self.word_index = wordindex.get_word_index(editor)
+        # the names defined in the document, parsed
+        # on a background thread as it is edited.
+        self.source_index = sourceindex.get_source_index(editor)
+        self.engine = completion.CompletionEngine()
+        # True while the popup shows the engine's
+        # results, which are only the best ranked
+        # completions for the current prefix.
+        self.completing_variables = False
+        self.variable_prefix = ''
+        # True while the popup shows the modules or
+        # module names of an import statement.
+        self.completing_imports = False
+        # gathers the completions of each key press,
+        # running slow providers after the cheap
+        # ones have been shown.
+        self.pipeline = completionpipeline.CompletionPipeline(self)
+        # True if the last key press cancelled a
+        # request before all its providers ran.
+        self.interrupted = False
         self.connect_signals()
 
     @property
@@ -179,11 +242,7 @@ class AutoCompleter(QtCore.QObject):
         # necessary.
         """
         if self._completer is None:
-            wordlist = re.findall(
-                r'\w+',
-                self.editor.toPlainText()
-            )
-            wordlist = list(set(wordlist))
+            wordlist = list(self.word_index.index.words())
             self._completer = Completer(wordlist)
             self._completer.setParent(self)
             self._completer.setWidget(self.editor)
@@ -201,12 +260,34 @@ class AutoCompleter(QtCore.QObject):
             self._focusInEvent
         )
         # TODO: QtCore.Qt.DirectConnection
+        # slots are called in the order they are
+        # connected, so the timing of each key
+        # press spans _pre_keyPressEvent (which
+        # calls _post_keyPressEvent).
+        self.editor.key_pressed_signal.connect(
+            self._begin_timing
+        )
         self.editor.key_pressed_signal.connect(
             self._pre_keyPressEvent
         )
+        self.editor.key_pressed_signal.connect(
+            self._end_timing
+        )
         self.editor.post_key_pressed_signal.connect(
             self._post_keyPressEvent
         )
+        self.modules_read.connect(self.complete_imports_again)
+        # connected after the source index sets its
+        # index, so the index is ready when it runs.
+        self.source_index.indexed.connect(self.prepare_completions)
+
+    @QtCore.Slot(QtGui.QKeyEvent)
+    def _begin_timing(self, event):
+        latency.begin(event.key(), event.text())
+
+    @QtCore.Slot(QtGui.QKeyEvent)
+    def _end_timing(self, event):
+        latency.end()
 
     @QtCore.Slot()
     def _focusInEvent(self):
@@ -239,6 +320,16 @@ class AutoCompleter(QtCore.QObject):
         word = textCursor.selection().toPlainText()
         return word
 
+    def text_before_cursor(self):
+        """
+        Returns the text of the line
+        before the cursor.
+        """
+        textCursor = self.editor.textCursor()
+        return textCursor.block().text()[
+            :textCursor.positionInBlock()
+        ]
+
     def word_before_cursor(self, regex=r'[\w|\.]+'):
         """
         Returns a string with the last
@@ -287,9 +378,18 @@ class AutoCompleter(QtCore.QObject):
 
         return word_after_dot
 
-    def get_obj_before_char(self, _char):
+    def cursor_line(self):
         """
-        Return python object from string.
+        Returns the line number of the text
+        cursor, counted from 1 as in the
+        source index.
+        """
+        return self.editor.textCursor().blockNumber()+1
+
+    def get_word_before_char(self, _char):
+        """
+        Return the dotted name before _char,
+        or None.
         """
         self.completer.setCompletionPrefix('')
         textCursor = self.editor.textCursor()
@@ -319,76 +419,113 @@ class AutoCompleter(QtCore.QObject):
             or word_before_dot.endswith(_char)
             or not word_before_dot[-1].isalnum()):
             return
+        return word_before_dot
 
+    def get_obj_before_char(self, _char):
+        """
+        Return python object from string.
+        """
+        word_before_dot = self.get_word_before_char(_char)
+        if word_before_dot is None:
+            return
+        return self.resolve_word(word_before_dot)
+
+    def resolve_word(self, word_before_dot):
+        """
+        Return the live object named by a dotted
+        name, with self and cls standing for the
+        class that the current class inherits.
+        """
+        # walk the attributes of the dotted name rather
+        # than copying __main__ and executing it.
+        return attributes.resolve_name(
+            self.live_name(word_before_dot),
+            __main__.__dict__
+        )
+
+    def live_name(self, word_before_dot):
+        """
+        Return the dotted name to look up in
+        __main__ for word_before_dot.
+        """
         if word_before_dot in ['self', 'cls']:
             class_name = self.get_inherited_class()
             if class_name:
-                word_before_dot = class_name
-
-        app_namespace = __main__.__dict__.copy()
-        _obj = app_namespace.get(word_before_dot)
-        if _obj is None:
-            try:
-                _ = {}
-                exec(
-                    '_obj = '+word_before_dot,
-                    app_namespace,
-                    _
-                )
-                _obj = _.get('_obj')
-            except (
-                NameError,
-                AttributeError,
-                SyntaxError
-                ):
-                # we want to handle this
-                # silently, except. TODO:
-                # SyntaxError avoidance
-                # is a lazy way to avoid
-                # properly formatting the
-                # object.
-                return
-
-        return _obj
+                return class_name
+        return word_before_dot
 
     def complete_object(self, _obj=None):
         """
         Get list of object properties
         and methods and set them as
         the completer string list.
+
+        The names found in the source index are
+        shown first. Those of the live object,
+        whose attributes may be slow to get, are
+        added by a deferred provider.
         """
-        if _obj is None:
-            _obj = self.get_obj_before_char('.')
+        if _obj is not None:
+            word = None
+            resolve_steps = lambda: [_obj]
+        else:
+            with latency.stage('words'):
+                word = self.get_word_before_char('.')
+            if word is None:
+                return
+            resolve_steps = lambda: attributes.resolve_steps(
+                self.live_name(word),
+                __main__.__dict__
+            )
 
-        if _obj is None or False:
-            return
+        def source_provider(completions):
+            yield self.static_attributes(word)
 
-        try:
-            attrs = dir(_obj)
-        except TypeError:
-            # found a case where __getattr__
-            # on a n _obj instance
-            # returned a string, rendering
-            # it uncallable. as a last resort,
-            # try getting the class attrs
-            try:
-                attrs = dir(_obj.__class__)
-            except Exception:
+        def object_provider(completions):
+            # checks the time taken after each attribute,
+            # so a slow one costs at most one step.
+            _obj = None
+            for _obj in resolve_steps():
+                yield None
+            if _obj is None:
                 return
+            # the attributes of each type are only
+            # listed (and sorted) the first time.
+            stringlist = attributes.attribute_names(_obj)
+            yield None
+            if completions:
+                stringlist = attributes.order(
+                    set(stringlist).union(completions)
+                )
+            yield stringlist
+
+        provider_list = []
+        if word is not None:
+            provider_list.append(providers.Provider(
+                'source', source_provider, cheap=True
+            ))
+        provider_list.append(
+            providers.Provider('object', object_provider)
+        )
+        self.completing_variables = False
+        self.completing_imports = False
+        self.pipeline.start(
+            provider_list,
+            self.show_object_completions
+        )
 
-        methods = [
-            a for a in attrs
-            if a[0].islower()
-        ]
-        therest = [
-            a for a in attrs
-            if not a[0].islower()
-        ]
-        stringlist = methods+therest
+    def show_object_completions(self, stringlist):
+        """
+        Show the attributes found so far,
+        filtered by the word after the dot.
+        """
+        cp = self.completer
+        if not stringlist:
+            cp.popup().hide()
+            return
         self.set_list(stringlist)
         self.show_popup()
 
-        cp = self.completer
         current_word = self.word_under_cursor()
         all_alpha = all(
             (c.isalnum() or c in '_.')
@@ -412,104 +549,270 @@ class AutoCompleter(QtCore.QObject):
             cp.completionModel().index(0, 0)
         )
 
+    def static_attributes(self, word):
+        """
+        Return the attribute names of the dotted name
+        word found in the source index, so that they
+        can be completed before the code is run:
+        the members of the current class for self and
+        cls, the members of classes defined in the
+        document, and the names in modules that are
+        imported in the document and already loaded.
+        """
+        index = self.source_index.index
+        line = self.cursor_line()
+        if word in ['self', 'cls']:
+            scope = index.scope_at(line, 'class')
+            if scope is None:
+                return []
+            return scope.members()
+
+        scope = index.find_class(word)
+        if scope is not None:
+            return scope.members()
+
+        name, _, rest = word.partition('.')
+        kind = index.module.names.get(name, '')
+        if not kind.startswith('import '):
+            return []
+        parts = kind[len('import '):].split('.')
+        if rest:
+            parts += rest.split('.')
+        # the longest part of the name that is
+        # a loaded module, and the rest of it
+        for number in range(len(parts), 0, -1):
+            module = sys.modules.get('.'.join(parts[:number]))
+            if module is not None:
+                break
+        else:
+            return []
+        _obj = module
+        if number < len(parts):
+            _obj = attributes.resolve_name(
+                '.'.join(parts[number:]),
+                vars(module)
+            )
+            if _obj is None:
+                return []
+        return attributes.attribute_names(_obj)
+
     def complete_variables(self):
         """
-        Complete variable names in
-        global scope.
-        TODO: Substring matching
+        Complete variable names with the best ranked
+        names defined in the scope of the cursor and
+        at module level (from the source index), words
+        of the document, __main__ and builtins,
+        followed by fuzzy matches (see
+        utils.completion.nonconsec_find).
         """
-        cp = self.completer
-        variables = list(__main__.__dict__.keys())
-
-        # add words except the word under the cursor
-        word = self.word_under_cursor()
-        text = self.editor.toPlainText()
-        words = [
-            w for w in re.findall(r'\w+', text)
-            if w != word
-        ]
+        # the word under the cursor is not
+        # offered unless it appears elsewhere
+        with latency.stage('words'):
+            exclude = self.word_under_cursor()
+            word = exclude
+            if re.match('[a-zA-Z0-9_]', word) is None:
+                word = self.word_before_cursor(
+                    regex=r'\w+'
+                    )
+        if not word:
+            return
 
-        variables = [
-            variables
-            + list(keyword.kwlist)
-            + list(SNIPPETS.keys())
-            + dir(__builtins__)
-            + list(KEYWORDS)
-            + list(words)
-        ]
+        engine = self.engine
 
-        variables = sorted(
-            list(
-                set().union(*variables)
+        def document_provider(completions):
+            self.set_document_sources()
+            # ranked with the globals of the last request
+            yield engine.complete(word, exclude=exclude)
+
+        def globals_provider(completions):
+            engine.set_words(
+                completion.GLOBAL,
+                __main__.__dict__.keys()
             )
+            yield engine.complete(word, exclude=exclude)
+
+        self.completing_variables = True
+        self.completing_imports = False
+        self.variable_prefix = word
+        self.pipeline.start(
+            [
+                providers.Provider(
+                    'document', document_provider, cheap=True
+                ),
+                providers.Provider('globals', globals_provider),
+            ],
+            self.show_variable_completions
         )
-        self.set_list(variables)
-        word = self.word_under_cursor()
 
-        if re.match('[a-zA-Z0-9_]', word) is None:
-            word = self.word_before_cursor(
-                regex=r'\w+'
-                )
+    def set_document_sources(self):
+        """
+        Set the words of the document, the names
+        defined in it and the static words as the
+        sources of the completion engine.
+        """
+        index = self.word_index.index
+        source_index = self.source_index.index
+        engine = self.engine
+        engine.set_source(
+            completion.LOCAL,
+            source_index.local_names(self.cursor_line()),
+            index.count
+        )
+        engine.set_source(
+            completion.MODULE,
+            source_index.module_names,
+            index.count
+        )
+        engine.set_source(
+            completion.DOCUMENT,
+            index.sorted_words(),
+            index.count,
+            index.version,
+            index.changes_since
+        )
+        engine.set_source(
+            completion.BUILTIN,
+            static_words()
+        )
 
-        char_len = len(word)
-        cp.setCompletionPrefix(word)
+    @QtCore.Slot(object)
+    def prepare_completions(self, source_index=None):
+        """
+        Make the fuzzy indexes of the words to complete
+        once the document has been indexed (after it
+        stopped changing), so that the next key press
+        only updates them with what changed since.
+        """
+        self.set_document_sources()
+        self.engine.set_words(
+            completion.GLOBAL,
+            __main__.__dict__.keys()
+        )
+        self.engine.prepare()
+
+    def complete_imports(self):
+        """
+        Complete the module names of an import
+        statement, and the names in the module
+        after "from module import", from the module
+        index, without importing anything. Return
+        False if the cursor is not in an import.
+        """
+        with latency.stage('words'):
+            text = self.text_before_cursor()
+            context = moduleindex.import_context(text)
+        if context is None:
+            return False
+        index = self.module_index
+        # index again if sys.path changed
+        index.start()
+
+        def index_provider(completions):
+            # modules in packages are listed, and their
+            # sources parsed, on the index's reader
+            # thread, after which this runs again.
+            yield index.complete(text, self._modules_read)
+
+        self.completing_variables = True
+        self.completing_imports = True
+        self.variable_prefix = context[1].rpartition('.')[2]
+        self.pipeline.start(
+            [
+                providers.Provider(
+                    'modules', index_provider, cheap=True
+                ),
+            ],
+            self.show_variable_completions
+        )
+        return True
+
+    @QtCore.Slot()
+    def complete_imports_again(self):
+        """
+        Complete the import statement again with the
+        modules and names the index has just read,
+        if the cursor is still in it.
+        """
+        if not (self.completing_imports and self.editor.hasFocus()):
+            return
+        self.complete_imports()
+
+    def show_variable_completions(self, variables):
+        """
+        Show the ranked variable names found so far.
+        """
+        # fuzzy matches do not start with the word,
+        # so the completer is not left to filter them.
+        cp = self.completer
+        self.set_list(variables)
+        cp.setCompletionPrefix('')
         popup = cp.popup()
         popup.setCurrentIndex(
             cp.completionModel().index(0, 0)
         )
 
-        # TODO: substring matching
+        if variables:
+            self.show_popup()
+        else:
+            popup.hide()
+
+    def show_knob_completions(self, knob_names):
         """
-        for var in variables:
-            found = nonconsec_find(
-                word,
-                var,
-                anchored=True
-            )
-            if found:
-                print(word, var)
+        Show the knob names of a node.
         """
-
-        if char_len and any(
-                w[:char_len] == word
-                for w in variables
-            ):
-            self.show_popup()
+        if not knob_names:
+            self.completer.popup().hide()
+            return
+        self.set_list(knob_names)
+        self.show_popup()
 
     def set_list(self, stringlist):
         """
         Sets the list of completions.
         """
-        qslm = QtCore.QStringListModel()
-        qslm.setStringList(stringlist)
-        self.completer.setModel(qslm)
+        with latency.stage('set_list'):
+            qslm = QtCore.QStringListModel()
+            qslm.setStringList(stringlist)
+            self.completer.setModel(qslm)
 
     def show_popup(self):
         """
         Show the completer list.
         """
-        cursorRect = self.editor.cursorRect()
-        pop = self.completer.popup()
-        cursorRect.setWidth(
-            pop.sizeHintForColumn(0)
-            + pop.verticalScrollBar(
-                ).sizeHint(
-                ).width()
-        )
-        self.completer.complete(cursorRect)
+        with latency.stage('show_popup'):
+            cursorRect = self.editor.cursorRect()
+            pop = self.completer.popup()
+            cursorRect.setWidth(
+                pop.sizeHintForColumn(0)
+                + pop.verticalScrollBar(
+                    ).sizeHint(
+                    ).width()
+            )
+            self.completer.complete(cursorRect)
+        latency.popup_shown()
+
+    def completion_prefix(self):
+        """
+        Returns the text before the cursor
+        that a completion replaces.
+        """
+        if self.completing_variables:
+            return self.variable_prefix
+        return self.completer.completionPrefix()
 
     def insert_completion(self, completion):
         """
         Inserts a completion,
         replacing current word.
         """
+        self.engine.accept(completion)
         if '[snippet]' in completion:
             return self.insert_snippet_completion(
                 completion
                 )
 
         textCursor = self.editor.textCursor()
-        prefix = self.completer.completionPrefix()
+        prefix = self.completion_prefix()
         pos = textCursor.position()
 
         textCursor.setPosition(
@@ -550,11 +853,25 @@ class AutoCompleter(QtCore.QObject):
         class_attribute = search[0]
         return class_attribute
 
+    def current_scope(self, kind):
+        """
+        Return the innermost scope of kind ('class'
+        or 'function') around the text cursor in the
+        source index, or None.
+        """
+        return self.source_index.index.scope_at(
+            self.cursor_line(),
+            kind
+        )
+
     def get_inherited_class(self):
         """
         Return the name of the inherited class,
         e.g.: class ClassName(Inherited.Class)
         """
+        scope = self.current_scope('class')
+        if scope is not None:
+            return scope.bases[0] if scope.bases else ''
         return self.get_object_text(
             r'(?:\()([a-zA-Z0-9_\.]+)',
             _type='class',
@@ -566,6 +883,9 @@ class AutoCompleter(QtCore.QObject):
         defined above the text cursor.
         e.g.: class ClassName()
         """
+        scope = self.current_scope('class')
+        if scope is not None:
+            return scope.name
         return self.get_object_text(
             r'(?:class\s+)(\w+)(?:\()',
             _type='class',
@@ -577,6 +897,9 @@ class AutoCompleter(QtCore.QObject):
         function defined above the text cursor.
         e.g.: def function_name()
         """
+        scope = self.current_scope('function')
+        if scope is not None:
+            return scope.name
         return self.get_object_text(
             r'(?:def\s+)([a-zA-Z0-9_]+)(?:\()',
             _type='def',
@@ -592,6 +915,9 @@ class AutoCompleter(QtCore.QObject):
         argument, parameter='value'
         )
         """
+        scope = self.current_scope('function')
+        if scope is not None:
+            return ', '.join(scope.arguments)
         return self.get_object_text(
             r'(?:def\s+\w+\()(.+)(?:\)\:)',
             _type='def',
@@ -607,6 +933,9 @@ class AutoCompleter(QtCore.QObject):
         self, argument, parameter='value'
         )
         """
+        scope = self.current_scope('function')
+        if scope is not None:
+            return ', '.join(scope.arguments[1:])
         return self.get_object_text(
             r'(?:def\s+\w+\(\s*self,\s*)(.+)(?:\)\:)',
             _type='def',
@@ -648,7 +977,7 @@ class AutoCompleter(QtCore.QObject):
             )
 
         textCursor = self.editor.textCursor()
-        prefix = self.completer.completionPrefix()
+        prefix = self.completion_prefix()
         pos = textCursor.position()
         textCursor.setPosition(
             pos-len(prefix),
@@ -676,6 +1005,9 @@ class AutoCompleter(QtCore.QObject):
           (parse for "self.")
         """
         # print('  Autocomplete: pre keypress')
+        # the completions of the previous key
+        # press are out of date.
+        self.interrupted = self.pipeline.cancel()
         cp = self.completer
         completing = (
             cp
@@ -715,6 +1047,9 @@ class AutoCompleter(QtCore.QObject):
             shift_held = (event.modifiers() == SHIFT)
             if (not textCursor.hasSelection()
                 and not shift_held):
+                if self.complete_imports():
+                    self.set_override(True)
+                    return True
                 text = self.line_under_cursor()
                 if text.endswith('.'):
                     self.complete_object()
@@ -740,7 +1075,8 @@ class AutoCompleter(QtCore.QObject):
             # on a lot more characters!
             if cp.popup():
                 cp.popup().hide()
-            self.complete_object()
+            if not self.complete_imports():
+                self.complete_object()
             self.set_override(True)
             return True
         elif event.text() in ['"', "'"]:
@@ -762,47 +1098,65 @@ class AutoCompleter(QtCore.QObject):
             node = __main__.__dict__.get(word)
             if node is None:
                 return False
-            if not hasattr(node, 'allKnobs'):
-                return False
-            try:
-                knob_names = [
+
+            def knob_provider(completions):
+                # nodes with many knobs are slow to list,
+                # and errors are kept by the request.
+                if not hasattr(node, 'allKnobs'):
+                    return
+                yield [
                     knob.name() for knob in node.allKnobs()
                     if knob.name().strip()
                 ]
-            except Exception as e:
-                print(e)
-                return False
-            self.set_list(knob_names)
-            self.show_popup()
+
+            self.completing_variables = False
+            self.completing_imports = False
+            self.pipeline.start(
+                [providers.Provider('knobs', knob_provider)],
+                self.show_knob_completions
+            )
         elif (
             cp and cp.popup()
             and cp.popup().isVisible()
             and not cp.completionCount() == 0
             ):
 
-            current_word = self.word_under_cursor()
+            if self.completing_imports:
+                if not self.complete_imports():
+                    cp.popup().hide()
+            elif self.completing_variables:
+                # the popup only has the best completions
+                # for the previous prefix, so look again.
+                self.complete_variables()
+            elif (self.interrupted
+                  and self.get_word_before_char('.') is not None):
+                # the live attributes were not all
+                # found before this key was pressed.
+                self.complete_object()
+            else:
+                current_word = self.word_under_cursor()
 
-            word_match = re.match(
-                '[a-zA-Z0-9_]',
-                current_word
-            )
-            if word_match is None:
-                text_match = re.match(
+                word_match = re.match(
                     '[a-zA-Z0-9_]',
-                    event.text()
+                    current_word
                 )
-                if text_match is None:
-                    cp.popup().hide()
-
-                current_word = self.word_before_cursor(
-                    regex=r'\w+'
+                if word_match is None:
+                    text_match = re.match(
+                        '[a-zA-Z0-9_]',
+                        event.text()
+                    )
+                    if text_match is None:
+                        cp.popup().hide()
+
+                    current_word = self.word_before_cursor(
+                        regex=r'\w+'
+                    )
+
+                cp.setCompletionPrefix(current_word)
+                cp.popup().setCurrentIndex(
+                    cp.completionModel().index(0, 0)
                 )
 
-            cp.setCompletionPrefix(current_word)
-            cp.popup().setCurrentIndex(
-                cp.completionModel().index(0, 0)
-            )
-
         elif (
             event.text().isalnum()
             or event.text() in ['_']
@@ -814,105 +1168,11 @@ class AutoCompleter(QtCore.QObject):
             block = document.findBlockByNumber(
                 block_number
             )
-            if '.' in block.text().split(' ')[-1]:
+            if self.complete_imports():
+                pass
+            elif '.' in block.text().split(' ')[-1]:
                 self.complete_object()
             else:
                 self.complete_variables()
 
         self.set_override(True)
-
-
-
-# from tabtabtab by Ben Dickson
-def nonconsec_find(needle, haystack, anchored=False):
-    """checks if each character of "needle" can be
-    found in order (but not
-    necessarily consecutivly) in haystack.
-    For example, "mm" can be found in "matchmove",
-    but not "move2d"
-    "m2" can be found in "move2d", but not "matchmove"
-
-    >>> nonconsec_find("m2", "move2d")
-    True
-    >>> nonconsec_find("m2", "matchmove")
-    False
-
-    Anchored ensures the first letter matches
-
-    >>> nonconsec_find(
-    "atch", "matchmove", anchored = False)
-    True
-    >>> nonconsec_find(
-    "atch", "matchmove", anchored = True)
-    False
-    >>> nonconsec_find(
-    "match", "matchmove", anchored = True)
-    True
-
-    If needle starts with a string,
-    non-consecutive searching is disabled:
-
-    >>> nonconsec_find(
-    " mt", "matchmove", anchored = True)
-    False
-    >>> nonconsec_find(
-    " ma", "matchmove", anchored = True)
-    True
-    >>> nonconsec_find(
-    " oe", "matchmove", anchored = False)
-    False
-    >>> nonconsec_find(
-    " ov", "matchmove", anchored = False)
-    True
-    """
-
-    if "[" not in needle:
-        haystack = haystack.rpartition(" [")[0]
-
-    if len(haystack) == 0 and len(needle) > 0:
-        # "a" is not in ""
-        return False
-
-    elif len(needle) == 0 and len(haystack) > 0:
-        # "" is in "blah"
-        return True
-
-    elif len(needle) == 0 and len(haystack) == 0:
-        # ..?
-        return True
-
-    # Turn haystack into list of characters
-    # (as strings are immutable)
-    haystack = [hay for hay in str(haystack)]
-
-    if needle.startswith(" "):
-        # "[space]abc" does consecutive
-        # search for "abc" in "abcdef"
-        if anchored:
-            if "".join(
-                haystack).startswith(
-                needle.lstrip(" ")):
-                return True
-        else:
-            if needle.lstrip(" ") in "".join(haystack):
-                return True
-
-    if anchored:
-        if needle[0] != haystack[0]:
-            return False
-        else:
-            # First letter matches, remove it
-            # for further matches
-            needle = needle[1:]
-            del haystack[0]
-
-    for needle_atom in needle:
-        try:
-            needle_pos = haystack.index(needle_atom)
-        except ValueError:
-            return False
-        else:
-            # Dont find string in same pos or
-            # backwards again
-            del haystack[:needle_pos + 1]
-    return True
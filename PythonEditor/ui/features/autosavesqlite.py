@@ -0,0 +1,260 @@
+"""
+SQLite storage for tab contents, as an
+alternative to the PythonEditorHistory.xml file.
+
+Enable it by setting the environment variable
+PYTHONEDITOR_AUTOSAVE_BACKEND=sqlite. The database
+path can be set with PYTHONEDITOR_AUTOSAVE_DB and
+defaults to PythonEditorHistory.db next to the xml
+file. Tabs found in the xml file are copied into the
+database the first time it is created.
+
+Each tab is one row, so saving a tab is a single
+row update inside a transaction. The database uses
+WAL mode, which requires a local filesystem: on
+network drives, prefer the xml backend.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import uuid
+import sqlite3
+import threading
+from xml.etree import cElementTree as ETree
+
+from PythonEditor.ui.features import autosavexml
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscripts (
+    uuid      TEXT PRIMARY KEY,
+    name      TEXT,
+    tab_index TEXT,
+    path      TEXT,
+    text      TEXT
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+COLUMNS = ('name', 'tab_index', 'path')
+
+
+def define_database_path():
+    """ Allow users to define a custom
+    database path via an environment
+    variable.
+    """
+    path = os.getenv('PYTHONEDITOR_AUTOSAVE_DB')
+    if (path is None
+        or not autosavexml.parent_isdir(path)
+        ):
+        name, ext = os.path.splitext(
+            autosavexml.AUTOSAVE_FILE
+        )
+        path = name+'.db'
+    os.environ['PYTHONEDITOR_AUTOSAVE_DB'] = path
+    return path
+
+
+def execute_record(connection, record):
+    """ Apply a journal record (see
+    autosavexml.apply_journal_record)
+    to the database.
+    """
+    op = record.get('op')
+    uid = record.get('uuid')
+    attrib = dict(
+        (k, v) for k, v in record.get('attrib', {}).items()
+        if k in COLUMNS
+    )
+    if op == 'save':
+        connection.execute(
+            'INSERT OR IGNORE INTO subscripts (uuid) VALUES (?)',
+            (uid,)
+        )
+        if 'text' in record:
+            attrib['text'] = record['text']
+    if op in ('save', 'attrib') and attrib:
+        names = sorted(attrib)
+        assignments = ', '.join('{0} = ?'.format(n) for n in names)
+        connection.execute(
+            'UPDATE subscripts SET {0} WHERE uuid IS ?'.format(assignments),
+            [attrib[n] for n in names]+[uid]
+        )
+    elif op == 'remove':
+        connection.execute(
+            'DELETE FROM subscripts WHERE uuid IS ?',
+            (uid,)
+        )
+    elif op == 'clear':
+        connection.execute('DELETE FROM subscripts')
+    elif op == 'current_index':
+        connection.execute(
+            'INSERT OR REPLACE INTO settings VALUES (?, ?)',
+            ('current_index', record.get('text'))
+        )
+
+
+def migrate_from_xml(connection, xml_path):
+    """ Copy the subscripts and current index
+    from the xml file into the database, once.
+    """
+    done = connection.execute(
+        'SELECT value FROM settings WHERE key = ?',
+        ('migrated_from',)
+    ).fetchone()
+    if done is not None:
+        return
+    records = []
+    subscripts = []
+    if os.path.isfile(xml_path):
+        root, subscripts = autosavexml.parsexml(
+            'subscript',
+            path=xml_path
+        )
+        for s in subscripts:
+            attrib = dict(s.attrib)
+            if not attrib.get('uuid'):
+                # rows are found by uuid, so a tab
+                # without one is given its own.
+                attrib['uuid'] = str(uuid.uuid4())
+            records.append({
+                'op'     : 'save',
+                'uuid'   : attrib['uuid'],
+                'attrib' : attrib,
+                'text'   : s.text,
+            })
+        for ci in root.findall('current_index'):
+            records.append({
+                'op'   : 'current_index',
+                'text' : ci.text,
+            })
+    with connection:
+        for record in records:
+            execute_record(connection, record)
+        connection.execute(
+            'INSERT INTO settings VALUES (?, ?)',
+            ('migrated_from', xml_path)
+        )
+    if subscripts:
+        print('Copied {0} autosaved tabs from {1}'.format(
+            len(subscripts), xml_path)
+        )
+
+
+class SQLiteStore(autosavexml.AutoSaveStore):
+    """ AutoSaveStore that keeps tabs in an
+    SQLite database instead of the xml file.
+
+    The in-memory tree is built from the
+    database rows, and is only rebuilt when
+    another process has committed a change
+    (detected via PRAGMA data_version).
+    """
+    def __init__(self, path=None, xml_path=None):
+        if path is None:
+            path = define_database_path()
+        super(SQLiteStore, self).__init__(path)
+        if xml_path is None:
+            xml_path = autosavexml.AUTOSAVE_FILE
+        self.xml_path = xml_path
+        # the connection is used by both the GUI
+        # and writer threads, one at a time.
+        self.db_lock = threading.Lock()
+        self.connection = None
+        self._data_version = None
+
+    def connect(self):
+        """ Open the database, creating
+        and migrating it if necessary.
+        Call with self.db_lock held.
+        """
+        if self.connection is not None:
+            return self.connection
+        connection = sqlite3.connect(
+            self.path,
+            timeout=10,
+            check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        migrate_from_xml(connection, self.xml_path)
+        self.connection = connection
+        return connection
+
+    def watched_paths(self):
+        # commits land in the WAL file
+        # until it is checkpointed.
+        return [self.path, self.path+'-wal']
+
+    def data_version(self):
+        connection = self.connect()
+        return connection.execute(
+            'PRAGMA data_version'
+        ).fetchone()[0]
+
+    def load(self):
+        with self.lock:
+            with self.db_lock:
+                connection = self.connect()
+                self._data_version = self.data_version()
+                rows = connection.execute(
+                    'SELECT uuid, name, tab_index, path, text '
+                    'FROM subscripts ORDER BY rowid'
+                ).fetchall()
+                index = connection.execute(
+                    'SELECT value FROM settings WHERE key = ?',
+                    ('current_index',)
+                ).fetchone()
+
+            root = ETree.Element('script')
+            for uid, name, tab_index, path, text in rows:
+                sub = ETree.SubElement(root, 'subscript')
+                sub.attrib['uuid'] = uid
+                for key, value in zip(COLUMNS, (name, tab_index, path)):
+                    if value is not None:
+                        sub.attrib[key] = value
+                sub.text = text
+            if index is not None:
+                ci = ETree.SubElement(root, 'current_index')
+                ci.text = index[0]
+            self.set_root(root)
+            self.forget()
+            self.apply_queued()
+
+    def refresh(self):
+        with self.lock:
+            if self.root is None:
+                return self.load()
+            # if the writer is busy, our tree is
+            # already ahead of the database.
+            if not self.db_lock.acquire(False):
+                return
+            try:
+                version = self.data_version()
+            finally:
+                self.db_lock.release()
+            if version != self._data_version:
+                self.load()
+
+    def append(self, records):
+        """ Write records in a single transaction.
+        Called from the writer thread.
+        """
+        with self.db_lock:
+            connection = self.connect()
+            with connection:
+                for record in records:
+                    execute_record(connection, record)
+
+    def compact(self):
+        """ Move the WAL contents into the database.
+        """
+        with self.db_lock:
+            self.connect().execute(
+                'PRAGMA wal_checkpoint(PASSIVE)'
+            )
@@ -6,21 +6,41 @@ Functions that write to the autosave file:
 - create_empty_autosave
 - writexml
 - fix_broken_xml
+- append_journal
+
+The xml file is always replaced atomically (see
+write_atomically), keeping the previous versions
+as numbered generations that fix_broken_xml can
+fall back to.
+
+Changes to single tabs are appended to a
+journal file next to the xml (see
+AutoSaveStore), which is folded back into
+the xml by writexml once it grows too big.
 """
 from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
 import io
+import re
+import copy
+import hashlib
+import shutil
+import json
+import time
+import atexit
+import threading
 import unicodedata
 import warnings
 import tempfile
-import difflib
 from functools import partial
+from collections import OrderedDict
 from xml.etree import cElementTree as ETree
 
-from PythonEditor.ui.Qt import QtCore, QtWidgets
+from PythonEditor.ui.Qt import QtCore, QtGui, QtWidgets
 from PythonEditor.ui import editor
+from PythonEditor.utils import diff
 from PythonEditor.utils.signals import connect
 from PythonEditor.utils.debug import debug
 from PythonEditor.utils.constants import NUKE_DIR
@@ -76,6 +96,17 @@ def define_autosave_path():
 AUTOSAVE_FILE = define_autosave_path()
 XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>'
 
+# number of previous versions of the xml file to keep,
+# as PythonEditorHistory.xml.1, .2, etc (newest first).
+AUTOSAVE_GENERATIONS = int(os.getenv(
+    'PYTHONEDITOR_AUTOSAVE_GENERATIONS', 3
+))
+
+# characters that cannot appear in an xml 1.0 document.
+INVALID_XML_CHARACTERS = re.compile(
+    '[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]'
+)
+
 
 class AutoSaveManager(QtCore.QObject):
     """ Simple xml text storage.
@@ -112,17 +143,60 @@ class AutoSaveManager(QtCore.QObject):
             return None
 
         self.setObjectName('AutoSaveManager')
+        self.store = get_store()
+        from PythonEditor.ui.features import revisions
+        self.revisions = revisions.get_revision_store()
         self.autosave_timer_waiting = False
         self.setup_save_timer(interval=1000)
+        # {uuid: store version} of tabs whose
+        # text matched the autosave when checked.
+        self.synced_versions = {}
 
         self.tabeditor = tabs
         self.editor = tabs.editor
         self.tabs = tabs.tabs
+        self.tabs.text_loader = self.load_tab_text
+        self.tabs.text_unloadable = self.tab_text_unloadable
         self.setParent(tabs)
 
         self.readautosave()
+        self.setup_file_watcher()
         self.connect_signals()
 
+    def setup_file_watcher(self):
+        """ Watch the autosave files so that changes
+        made by other sessions are noticed when
+        they happen, rather than by re-reading the
+        autosave each time the editor gets focus.
+        """
+        self.file_watcher = QtCore.QFileSystemWatcher(self)
+        self.watch_autosave_files()
+        self.file_watcher.fileChanged.connect(
+            self.autosave_file_changed
+        )
+        # the journal may not exist yet, and a
+        # replaced xml file is no longer watched.
+        self.file_watcher.directoryChanged.connect(
+            self.watch_autosave_files
+        )
+
+    def watch_autosave_files(self, *args):
+        watcher = self.file_watcher
+        watched = watcher.files()
+        for path in self.store.watched_paths():
+            if path not in watched and os.path.isfile(path):
+                watcher.addPath(path)
+        folder = os.path.dirname(self.store.path)
+        if (folder not in watcher.directories()
+            and os.path.isdir(folder)
+            ):
+            watcher.addPath(folder)
+
+    def autosave_file_changed(self, path):
+        self.watch_autosave_files()
+        if self.editor.hasFocus():
+            self.check_autosave_modified(check_document=False)
+
     def connect_signals(self):
         """ Connects the editor, tabeditor
         and tab signals to this class
@@ -158,6 +232,16 @@ class AutoSaveManager(QtCore.QObject):
             self.check_autosave_modified
         )
 
+        # make sure queued autosaves are
+        # written before the app exits.
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            from PythonEditor.ui.features import revisions
+            app.aboutToQuit.connect(flush_stores)
+            app.aboutToQuit.connect(
+                revisions.flush_revision_stores
+            )
+
     def save_timer(self):
         """ Start a timer that will trigger the
         autosave after a brief pause in typing.
@@ -191,8 +275,12 @@ class AutoSaveManager(QtCore.QObject):
         """ Sets editor text content. First checks the
         autosave file for <subscript> elements and
         creates a tab per element.
+
+        Only the tab attributes are read here. The
+        text of each tab is fetched by load_tab_text
+        when the tab is first shown.
         """
-        root, subscripts = parsexml('subscript')
+        subscripts = self.store.subscripts()
         if len(subscripts) == 0:
             return
         subscripts = sorted(
@@ -214,22 +302,8 @@ class AutoSaveManager(QtCore.QObject):
             name = s.attrib.get('name')
             data = s.attrib.copy()
 
-            data['text'] = s.text
-            # if there's no text saved,
-            # but there is a path, try and
-            # get the file contents
-            if not s.text:
-                path = s.attrib.get('path')
-                if is_file(path):
-                    with open(path, 'r') as f:
-                        text = f.read()
-                    data['text'] = text
-                    # set original text property
-                    # to allow reverting back to
-                    # the original, or comparison
-                    # on file save/tab close.
-                    data['original_text'] = text
-                    data['saved'] = True
+            # not loaded yet, see load_tab_text
+            data['text'] = None
 
             tab_name = name
             self.tabs.new_tab(tab_name=tab_name, tab_data=data)
@@ -240,17 +314,55 @@ class AutoSaveManager(QtCore.QObject):
 
         # try and get the index of the current tab from the last session
         index = self.tabs.count()-1
-        root, index_elements = parsexml('current_index')
-        for index_element in index_elements:
-            current_index = int(index_element.text)
-            if current_index in range(0, index):
-                index = current_index
-                break
+        current_index = self.store.current_index()
+        if current_index in range(0, index):
+            index = current_index
 
         # set tab and editor contents.
         self.tabs.setCurrentIndex(index)
         self.tabeditor.set_editor_contents(index)
 
+    def load_tab_text(self, data):
+        """ Set the 'text' of a tab's data from the
+        autosave, or from the file at the tab's
+        path if no text was autosaved.
+        """
+        s = self.store.find(data.get('uuid'))
+        text = None if s is None else s.text
+        data['text'] = text
+
+        # if there's no text saved,
+        # but there is a path, try and
+        # get the file contents
+        if not text:
+            path = data.get('path')
+            if is_file(path):
+                with open(path, 'r') as f:
+                    text = f.read()
+                data['text'] = text
+                # set original text property
+                # to allow reverting back to
+                # the original, or comparison
+                # on file save/tab close.
+                data['original_text'] = text
+                data['saved'] = True
+
+    def tab_text_unloadable(self, data):
+        """ Return True if load_tab_text would give
+        back the tab's current text, so that it is
+        safe to drop it from the tab's data.
+        """
+        text = data.get('text')
+        s = self.store.find(data.get('uuid'))
+        if s is None:
+            return False
+        if s.text:
+            return s.text == text
+        return (
+            data.get('saved') is True
+            and data.get('original_text') == text
+        )
+
     def read_current_tab_file(self):
         """
         Reads the file contents from the current tab's
@@ -274,13 +386,20 @@ class AutoSaveManager(QtCore.QObject):
         self.tabs['text'] = text
         self.tabs['saved'] = True
 
-    def check_autosave_modified(self):
+    def check_autosave_modified(self, check_document=True):
         """
         On focus in event, check the xml (or
         the saved file if present) to see if
         there are any differences. If there
         are, ask the user if they want to update
         their tab.
+
+        The autosave is only compared with the
+        editor if the current tab's subscript has
+        been changed by another session since it
+        was last found to match (see
+        AutoSaveStore.version), so usually this
+        costs no more than a stat of the files.
         """
         # remove any popup windows that
         # were previously showing
@@ -289,10 +408,11 @@ class AutoSaveManager(QtCore.QObject):
         )
 
         # first check against saved files,
-        self.check_document_modified(
-            self.tabs.currentIndex(),
-            self.tabs.get('path')
-        )
+        if check_document:
+            self.check_document_modified(
+                self.tabs.currentIndex(),
+                self.tabs.get('path')
+            )
 
         # safety: do not autosave if current
         # index is -1. this should not happen
@@ -301,15 +421,17 @@ class AutoSaveManager(QtCore.QObject):
         if tabs.currentIndex() == -1:
             return
 
+        tab_uid = tabs['uuid']
+        version = self.store.version(tab_uid)
+        if self.synced_versions.get(tab_uid) == version:
+            return
+
         # read the autosave file
-        root, subscripts = parsexml('subscript')
+        with self.store.lock:
+            subscripts = find_subscripts(self.store.tree(), tab_uid)
 
         # sync tab names from the autosave
-        tab_uid = tabs['uuid']
         for s in subscripts:
-            uid = s.attrib.get('uuid')
-            if uid != tab_uid:
-                continue
             xml_tab_name = s.attrib.get('name')
             if xml_tab_name == tabs['name']:
                 continue
@@ -324,11 +446,11 @@ class AutoSaveManager(QtCore.QObject):
         for s in subscripts:
             if s.text is None:
                 continue
-            uid = s.attrib.get('uuid')
-            if uid != tab_uid:
-                continue
             if s.text != editor_text:
-                not_matching.append((s, uid))
+                not_matching.append((s, tab_uid))
+
+        if not not_matching:
+            self.synced_versions[tab_uid] = version
 
         mismatch_count = len(not_matching)
         if mismatch_count == 0:
@@ -508,23 +630,41 @@ class AutoSaveManager(QtCore.QObject):
             widget.deleteLater()
 
     def show_diff_text(self, text):
+        """ Show the diff between text and the
+        editor's text in a new window. The diff is
+        computed on a background thread and shown as
+        it arrives, so large tabs do not block the UI.
+        """
+        self.cancel_diff()
         editor_text = self.editor.toPlainText()
-        l1 = text.splitlines(True)
-        l2 = editor_text.splitlines(True)
-
-        ctx_diff = difflib.context_diff(l1, l2)
-        diff_text = ''
-        for i in ctx_diff:
-            diff_text += i
 
         self.diff_editor = editor.Editor()
-        self.diff_editor.setPlainText(diff_text)
         self.diff_editor.setWindowFlags(
             QtCore.Qt.WindowStaysOnTopHint
         )
-
         self.diff_editor.show()
 
+        worker = DiffWorker(text, editor_text)
+        worker.chunk_ready.connect(self.append_diff_text)
+        self.diff_worker = worker
+        worker.start()
+
+    def append_diff_text(self, worker, chunk):
+        if worker is not getattr(self, 'diff_worker', None):
+            return
+        if not self.diff_editor.isVisible():
+            # the window was closed
+            return self.cancel_diff()
+        cursor = QtGui.QTextCursor(self.diff_editor.document())
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(chunk)
+
+    def cancel_diff(self):
+        worker = getattr(self, 'diff_worker', None)
+        if worker is not None:
+            worker.cancel()
+        self.diff_worker = None
+
     def load_into_new_tab(self, s):
         text = self.editor.toPlainText()
         self.editor.replace_text(s.text)
@@ -541,8 +681,11 @@ class AutoSaveManager(QtCore.QObject):
         self.autosave()
 
     def save_this_version(self, subscript):
+        # the subscript is the store's own element, so
+        # its text is left for the save to replace;
+        # setting it here would make the save look
+        # like it changes nothing, and be skipped.
         text = self.editor.toPlainText()
-        subscript.text = text
         self.tabs['text'] = text
         self.autosave()
 
@@ -562,15 +705,11 @@ class AutoSaveManager(QtCore.QObject):
         Synchronise the tab_index saved in <subscript>
         elements and the tab indices of all tabs in the QTabBar.
         """
-        root, subscripts = parsexml('subscript')
+        changes = {}
         for i in range(self.tabs.count()):
             data = self.tabs.tabData(i)
-            for s in subscripts:
-                if s.attrib.get('uuid') != data['uuid']:
-                    continue
-                s.attrib['tab_index'] = str(i)
-                break
-        writexml(root)
+            changes[data['uuid']] = {'tab_index': str(i)}
+        self.store.update_attribs(changes)
 
     @QtCore.Slot()
     def autosave(self):
@@ -587,32 +726,17 @@ class AutoSaveManager(QtCore.QObject):
             str(tabs.currentIndex()),
             tabs.get('path')
             )
+        self.revisions.record(tabs['uuid'], tabs['text'])
         self.editor.document().setModified(False)
         self.sync_tab_indices()
 
     @QtCore.Slot(str, str, str, str, object)
     def save_by_uuid(self, uid, name, text, index, path=None):
         """ Only update a specific subscript given by uuid.
+        If text is None (the tab's text is not loaded),
+        the stored text is left as it is.
         """
-        root, subscripts = parsexml('subscript')
-
-        for s in subscripts:
-            if s.attrib.get('uuid') == uid:
-                sub = s
-                break
-        else:
-            sub = ETree.Element('subscript')
-            root.append(sub)
-
-        sub.attrib['uuid'] = uid
-        sub.attrib['name'] = name
-        sub.text = text
-        sub.attrib['tab_index'] = index
-
-        if path is not None:
-            sub.attrib['path'] = path
-
-        writexml(root)
+        self.store.save_subscript(uid, name, text, index, path)
 
     def store_current_index(self):
         """
@@ -620,14 +744,9 @@ class AutoSaveManager(QtCore.QObject):
         to restore the current index on readautosave.
         (if present, for backwards compatibility).
         """
-        root, index_elements = parsexml('current_index')
-        if len(index_elements) == 0:
-            ci = ETree.Element('current_index')
-            root.append(ci)
-        else:
-            ci = index_elements[0]
-        ci.text = str(self.tabs.currentIndex())
-        writexml(root)
+        self.store.set_current_index(
+            self.tabs.currentIndex()
+        )
 
     @QtCore.Slot(int, int)
     def update_tab_index(self, from_index, to_index):
@@ -679,15 +798,9 @@ class AutoSaveManager(QtCore.QObject):
         if not is_file(path):
             return
 
-        root, subscripts = parsexml('subscript')
         # we first look for an existing
         # subscript that matches the uid
-        for s in subscripts:
-            if s.attrib.get('uuid') != uid:
-                continue
-            s.attrib['path'] = path
-            break
-        else:
+        if self.store.find(uid) is None:
             # if none is found we create
             # a new subscript
             index = self.tabs.currentIndex()
@@ -704,9 +817,9 @@ class AutoSaveManager(QtCore.QObject):
             # FIXME: 'saved' attrib of the tab is modified by self.tabs.save_text_in_tab after this, triggered by the editor text_changed_signal
             self.tabs.setTabData(index, data)
             return
+        self.store.update_attribs({uid: {'path': path}})
         data['saved'] = True
         self.tabs.setTabData(index, data)
-        writexml(root)
 
     @QtCore.Slot(object, int)
     def handle_tab_moved(self, editor, tab_index):
@@ -725,15 +838,14 @@ class AutoSaveManager(QtCore.QObject):
         """
         Remove subscripts if they are empty.
         """
-        root, subscripts = parsexml('subscript')
-
-        for s in subscripts:
+        uids = []
+        for s in self.store.subscripts():
             notext = not s.text
             nopath = s.attrib.get('path') is None
             if notext and nopath:
-                root.remove(s)
+                uids.append(s.attrib.get('uuid'))
 
-        writexml(root)
+        self.store.remove_subscripts(uids)
 
     @QtCore.Slot(str)
     def remove_subscript(self, uid):
@@ -749,28 +861,61 @@ class AutoSaveManager(QtCore.QObject):
         :param uid: Unique Identifier of
                     subscript to remove
         """
-        root, subscripts = parsexml('subscript')
-
-        item_removed = False
-        for s in subscripts:
-            if s.attrib.get('uuid') == uid:
-                root.remove(s)
-                item_removed = True
-
-        if item_removed:
-            writexml(root)
+        self.store.remove_subscripts([uid])
 
     @QtCore.Slot()
     def clear_subscripts(self):
         """
         Remove all subscripts.
         """
-        root, subscripts = parsexml('subscript')
+        self.store.clear()
 
-        for s in subscripts:
-            root.remove(s)
 
-        writexml(root)
+# number of diff lines shown at a time
+# while a diff is being computed.
+DIFF_CHUNK_LINES = 500
+
+
+class DiffWorker(QtCore.QObject):
+    """ Computes a context diff of two texts on a
+    background thread, emitting the diff text in
+    chunks of DIFF_CHUNK_LINES lines.
+    """
+    chunk_ready = QtCore.Signal(object, str)
+
+    def __init__(self, old_text, new_text):
+        super(DiffWorker, self).__init__()
+        self.old_lines = old_text.splitlines(True)
+        self.new_lines = new_text.splitlines(True)
+        self.cancel_event = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(
+            target=self.run,
+            name='PythonEditorDiff'
+        )
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        lines = []
+        try:
+            for line in diff.context_diff(
+                self.old_lines,
+                self.new_lines,
+                cancel=self.cancel_event
+                ):
+                lines.append(line)
+                if len(lines) >= DIFF_CHUNK_LINES:
+                    self.chunk_ready.emit(self, ''.join(lines))
+                    lines = []
+        except diff.DiffCancelled:
+            return
+        if lines:
+            self.chunk_ready.emit(self, ''.join(lines))
 
 
 class CouldNotCreateAutosave(Exception):
@@ -846,17 +991,15 @@ def create_empty_autosave():
     """ Write the default file header into the xml file.
     Overwrites any existing file.
     """
-    with open(AUTOSAVE_FILE, 'w') as f:
-        f.write(XML_HEADER+'<script></script>')
+    write_atomically(
+        AUTOSAVE_FILE,
+        XML_HEADER+'<script></script>',
+        keep_generation=False
+    )
 
 
 def get_editor_xml():
-    if not create_autosave_file():
-        return
-    parser = ETree.parse(AUTOSAVE_FILE)
-    root = parser.getroot()
-    editor_elements = root.findall('external_editor_path')
-    return root, editor_elements
+    return parsexml('external_editor_path')
 
 
 def get_external_editor_path():
@@ -972,6 +1115,7 @@ def parsexml(element_name, path=AUTOSAVE_FILE):
         parser = fix_broken_xml(path)
 
     root = parser.getroot()
+    replay_journal(root, path)
     elements = root.findall(element_name)
     return root, elements
 
@@ -995,12 +1139,15 @@ def writexml(root, path=AUTOSAVE_FILE):
     data = data.replace('><subscript', '>\n<subscript')
     data = data.replace('</subscript><', '</subscript>\n<')
 
+    # ETree writes these as they are, which
+    # would leave a file that cannot be parsed.
+    data = INVALID_XML_CHARACTERS.sub('', data)
+
     try:
-        with io.open(
-            path, 'wt', encoding='utf8', errors='ignore'
-        ) as f:
-            f.write(XML_HEADER+data)
-    except IOError as e:
+        write_atomically(path, XML_HEADER+data)
+        # the journal's records are now in the xml.
+        truncate_journal(path)
+    except (IOError, OSError) as e:
         msg = "Couldn't write to {0}\n".format(path)
         msg += "due to the following error:\n{0}".format(e)
         print(msg)
@@ -1020,32 +1167,115 @@ def writexml(root, path=AUTOSAVE_FILE):
 
 
 def fix_broken_xml(path=AUTOSAVE_FILE):
-    """ Removes unwanted characters and
-    (in case necessary in future
-    implementations..) fixes other
-    parsing errors with the xml file.
+    """ Removes unwanted characters (which files
+    written by earlier versions may contain) and,
+    if the xml structure itself is broken, e.g. by
+    an interrupted write, restores the newest
+    generation of the file that can be parsed.
     """
-    with io.open(path, 'r', encoding='utf-8') as f:
+    with io.open(path, 'r', encoding='utf-8', errors='replace') as f:
         content = f.read()
 
     safe_string = remove_control_characters(content)
 
-    with open(path, 'wt') as f:
-        f.write(safe_string)
-
     xmlp = ETree.XMLParser(encoding="utf-8")
     try:
-        parser = ETree.parse(path, xmlp)
+        ETree.fromstring(safe_string.encode('utf-8'), xmlp)
     except ETree.ParseError:
         print('Fatal Error with xml structure. A backup of your autosave has been made.')
         backup_autosave_file(path, content)
-        create_empty_autosave()
-        xmlp = ETree.XMLParser(encoding="utf-8")
-        parser = ETree.parse(path, xmlp)
-        print(parser)
+        generation = last_good_generation(path)
+        if generation is None:
+            create_empty_autosave()
+        else:
+            print('Restoring autosave from {0}'.format(generation))
+            with io.open(generation, 'rb') as f:
+                write_atomically(path, f.read(), keep_generation=False)
+    else:
+        write_atomically(path, safe_string, keep_generation=False)
+
+    xmlp = ETree.XMLParser(encoding="utf-8")
+    parser = ETree.parse(path, xmlp)
     return parser
 
 
+def generation_path(path, number):
+    return '{0}.{1}'.format(path, number)
+
+
+def last_good_generation(path=AUTOSAVE_FILE):
+    """ Return the path of the newest
+    generation that can be parsed, or None.
+    """
+    for number in range(1, AUTOSAVE_GENERATIONS+1):
+        generation = generation_path(path, number)
+        if not os.path.isfile(generation):
+            continue
+        try:
+            xmlp = ETree.XMLParser(encoding="utf-8")
+            ETree.parse(generation, xmlp)
+        except ETree.ParseError:
+            continue
+        return generation
+
+
+def replace_file(src, dst):
+    """ Rename src to dst, replacing dst.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    if os.name == 'nt' and os.path.exists(dst):
+        # python 2 on windows cannot rename over a file
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+def rotate_generations(path):
+    """ Shift the numbered generations of path
+    up by one, dropping the oldest, and keep the
+    current file as generation 1.
+    """
+    if AUTOSAVE_GENERATIONS < 1 or not os.path.isfile(path):
+        return
+    for number in range(AUTOSAVE_GENERATIONS-1, 0, -1):
+        generation = generation_path(path, number)
+        if os.path.isfile(generation):
+            replace_file(
+                generation,
+                generation_path(path, number+1)
+            )
+    first = generation_path(path, 1)
+    try:
+        # a hard link keeps the current
+        # file in place while we do this.
+        os.link(path, first)
+    except (AttributeError, OSError):
+        shutil.copyfile(path, first)
+
+
+def write_atomically(path, data, keep_generation=True):
+    """ Write data to a temporary file next to path,
+    flush it to disk and rename it over path, so that
+    path holds either the old or the new contents
+    even if writing is interrupted.
+
+    :param data: `str` (written as utf-8) or `bytes`
+    :param keep_generation: keep the replaced file
+                            (see rotate_generations)
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8', 'ignore')
+    temp_path = path+'.tmp'
+    with io.open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if keep_generation:
+        rotate_generations(path)
+    replace_file(temp_path, path)
+
+
 def backup_autosave_file(path, content):
     handle, temp_path = tempfile.mkstemp()
     with open(temp_path, 'w') as f:
@@ -1084,3 +1314,733 @@ def get_element_tab_index(subscript):
         return int(tab_index)
     except (TypeError, ValueError):
         return 1
+
+
+JOURNAL_SUFFIX = '.journal'
+# the journal is compacted into the xml once it
+# grows larger than the xml, or this many bytes.
+JOURNAL_MIN_COMPACT_SIZE = 1024*1024
+
+
+def journal_path(path=AUTOSAVE_FILE):
+    """ The journal file that sits next
+    to the xml file at the given path.
+    """
+    return path+JOURNAL_SUFFIX
+
+
+def append_journal(records, path=AUTOSAVE_FILE):
+    """ Append records to the journal in a single
+    write. Each record is a json object on its own
+    line. A newline is also written before each
+    record so that a record torn by a crash can
+    never swallow the one that follows it.
+
+    :param records: list of `dict` journal records.
+    :return: `int` number of bytes written.
+    """
+    data = ''.join(
+        '\n'+json.dumps(record)+'\n'
+        for record in records
+    ).encode('utf-8')
+    with io.open(journal_path(path), 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data)
+
+
+def read_journal(path=AUTOSAVE_FILE, offset=0):
+    """ Read complete records from the journal,
+    starting at byte offset. Lines that cannot be
+    decoded (e.g. torn by a crash) are skipped.
+
+    :return: `tuple` (records, offset) where offset
+             points past the last complete line.
+    """
+    try:
+        with io.open(journal_path(path), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except IOError:
+        return [], offset
+
+    lines = data.split(b'\n')
+    # the last piece has no newline after it,
+    # so it may still be being written.
+    remainder = lines.pop()
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records, offset+len(data)-len(remainder)
+
+
+def truncate_journal(path=AUTOSAVE_FILE):
+    """ Empty the journal once its records
+    have been written into the xml file.
+    """
+    jpath = journal_path(path)
+    if not os.path.isfile(jpath):
+        return
+    with io.open(jpath, 'wb'):
+        pass
+
+
+def replay_journal(root, path=AUTOSAVE_FILE, offset=0):
+    """ Apply the journal records found after
+    offset to the root element.
+
+    :return: `int` the new journal offset.
+    """
+    records, offset = read_journal(path, offset)
+    for record in records:
+        apply_journal_record(root, record)
+    return offset
+
+
+def find_subscripts(root, uid):
+    return [
+        s for s in root.findall('subscript')
+        if s.attrib.get('uuid') == uid
+    ]
+
+
+def apply_journal_record(root, record):
+    """ Apply a single journal record to the
+    root element. Records describe the state
+    a subscript should end up in rather than
+    a change to it, so replaying a record twice
+    gives the same result.
+
+    Record types ('op' key):
+    - save:          set attributes and text (if given) of a subscript
+    - attrib:        set attributes of an existing subscript
+    - remove:        remove subscripts by uuid
+    - clear:         remove all subscripts
+    - current_index: set the <current_index> element
+    """
+    op = record.get('op')
+    uid = record.get('uuid')
+    if op == 'save':
+        subscripts = find_subscripts(root, uid)
+        if subscripts:
+            sub = subscripts[0]
+        else:
+            sub = ETree.Element('subscript')
+            root.append(sub)
+        sub.attrib.update(record.get('attrib', {}))
+        sub.attrib['uuid'] = uid
+        if 'text' in record:
+            sub.text = record['text']
+    elif op == 'attrib':
+        for sub in find_subscripts(root, uid)[:1]:
+            sub.attrib.update(record.get('attrib', {}))
+    elif op == 'remove':
+        for sub in find_subscripts(root, uid):
+            root.remove(sub)
+    elif op == 'clear':
+        for sub in root.findall('subscript'):
+            root.remove(sub)
+    elif op == 'current_index':
+        index_elements = root.findall('current_index')
+        if len(index_elements) == 0:
+            ci = ETree.Element('current_index')
+            root.append(ci)
+        else:
+            ci = index_elements[0]
+        ci.text = record.get('text')
+
+
+def text_digest(*values):
+    """ Return a digest of the given strings,
+    used to tell whether a save would change
+    anything without comparing whole texts.
+    """
+    try:
+        h = hashlib.blake2b(digest_size=16)
+    except AttributeError:
+        # python 2
+        h = hashlib.sha1()
+    for value in values:
+        if value is None:
+            h.update(b'\x01')
+            continue
+        h.update(b'\x00')
+        h.update(value.encode('utf-8', 'ignore'))
+    return h.digest()
+
+
+STORES = {}
+def get_store():
+    """ Return the store for the backend chosen
+    by the PYTHONEDITOR_AUTOSAVE_BACKEND environment
+    variable ('xml', the default, or 'sqlite'), so
+    that all editors in this session share one copy
+    of the autosave.
+    """
+    backend = os.getenv('PYTHONEDITOR_AUTOSAVE_BACKEND', 'xml')
+    store_class, path = AutoSaveStore, AUTOSAVE_FILE
+    if backend.lower() == 'sqlite':
+        try:
+            from PythonEditor.ui.features import autosavesqlite
+            store_class = autosavesqlite.SQLiteStore
+            path = autosavesqlite.define_database_path()
+        except ImportError as e:
+            warnings.warn(
+                'Could not use sqlite autosave: {0}'.format(e)
+            )
+
+    store = STORES.get(path)
+    if store is None:
+        store = STORES[path] = store_class(path)
+    return store
+
+
+def flush_stores():
+    """ Wait for all queued autosave
+    writes to reach the disk.
+    """
+    for store in list(STORES.values()):
+        store.flush()
+
+
+atexit.register(flush_stores)
+
+
+def merge_records(records, record):
+    """ Merge a record into a list of queued
+    records for the same key, so that repeated
+    saves of a tab result in a single write.
+
+    :return: `list` of records with the same
+             end result as records+[record].
+    """
+    if not records:
+        return [record]
+    last = records[-1]
+    op, last_op = record.get('op'), last.get('op')
+
+    if op in ('remove', 'clear', 'current_index', 'revision'):
+        return records[:-1]+[record]
+
+    if last_op == 'remove':
+        if op == 'attrib':
+            # nothing left to set attributes on
+            return records
+        return records+[record]
+
+    if last_op in ('save', 'attrib'):
+        attrib = dict(last.get('attrib', {}))
+        attrib.update(record.get('attrib', {}))
+        merged = dict(last)
+        merged.update(record)
+        merged['attrib'] = attrib
+        if 'save' in (op, last_op):
+            merged['op'] = 'save'
+        return records[:-1]+[merged]
+
+    return records+[record]
+
+
+def record_key(record):
+    """ Records sharing a key are merged
+    while they wait to be written.
+    """
+    op = record.get('op')
+    if op in ('save', 'attrib', 'remove'):
+        return ('subscript', record.get('uuid'))
+    return (op, record.get('uuid'))
+
+
+class AutoSaveWriter(object):
+    """ Writes queued journal records on a
+    background thread, so that slow disks
+    do not block the GUI. The records are
+    passed to store.append.
+
+    Records are queued under a key (see
+    record_key) and merged with any record
+    already waiting under the same key.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.condition = threading.Condition()
+        self.pending = OrderedDict()
+        self.in_flight = []
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(
+            target=self.run,
+            name='PythonEditorAutoSaveWriter'
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def enqueue(self, records):
+        with self.condition:
+            for record in records:
+                if record.get('op') == 'clear':
+                    for key in list(self.pending.keys()):
+                        if key[0] == 'subscript':
+                            del self.pending[key]
+                key = record_key(record)
+                queued = self.pending.pop(key, [])
+                self.pending[key] = merge_records(queued, record)
+            self.condition.notify_all()
+        self.start()
+
+    def queued_records(self):
+        """ Records that have not yet been
+        written to the journal, in order.
+        """
+        with self.condition:
+            records = list(self.in_flight)
+            for queued in self.pending.values():
+                records.extend(queued)
+        return records
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                records = []
+                for queued in self.pending.values():
+                    records.extend(queued)
+                self.pending.clear()
+                self.in_flight = records
+
+            try:
+                self.store.append(records)
+            except Exception as e:
+                print('Autosave could not be written:', e)
+            else:
+                saves = len([
+                    r for r in records if r.get('op') == 'save'
+                ])
+                if saves:
+                    self.store.saves_performed += saves
+
+            with self.condition:
+                self.in_flight = []
+                self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """ Block until all queued records have been
+        written, or timeout (in seconds) has passed.
+
+        :return: `bool` True if nothing is left to write.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            # e.g. at interpreter shutdown; write here instead.
+            records = self.queued_records()
+            with self.condition:
+                self.pending.clear()
+            if records:
+                self.store.append(records)
+            return True
+
+        deadline = None if timeout is None else time.time()+timeout
+        with self.condition:
+            while self.pending or self.in_flight:
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline-time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+
+class AutoSaveStore(object):
+    """ Keeps the parsed autosave file in memory
+    so that saving a tab does not mean parsing
+    and rewriting the whole xml file.
+
+    Changes are applied to the in-memory tree
+    and queued for the AutoSaveWriter, which
+    appends them to the journal on a background
+    thread. Reads check the xml and journal with
+    os.stat, so changes made by other sessions are
+    picked up, reading only the new journal records
+    if the xml itself has not been rewritten.
+
+    The in-memory tree is shared with the writer
+    thread, so it is only touched while holding
+    self.lock.
+
+    Each subscript changed on disk by another session
+    gets its version counter incremented (see version),
+    so that only the tabs that were actually changed
+    need to be compared with the editor.
+
+    A digest of the last save of each tab is kept,
+    so saves that would not change anything are
+    dropped before any work is done. The counters
+    saves_requested and saves_performed (saves
+    written to disk) show how many (see stats).
+    """
+    def __init__(self, path=AUTOSAVE_FILE):
+        self.path = path
+        self.root = None
+        self.lock = threading.RLock()
+        self.writer = AutoSaveWriter(self)
+        self.digests = {}
+        self.versions = {}
+        self.saves_requested = 0
+        self.saves_performed = 0
+        self._signature = None
+        self._journal_offset = 0
+        self._compacting = False
+
+    def stats(self):
+        return {
+            'saves_requested' : self.saves_requested,
+            'saves_performed' : self.saves_performed,
+        }
+
+    def forget(self, records=None):
+        """ Drop the digests of subscripts changed by
+        records, or all of them if records is None.
+        """
+        if records is None:
+            self.digests.clear()
+            return
+        for record in records:
+            if record.get('op') == 'clear':
+                self.digests.clear()
+            self.digests.pop(record.get('uuid'), None)
+
+    def bump_versions(self, uids):
+        for uid in uids:
+            self.versions[uid] = self.versions.get(uid, 0)+1
+
+    def version(self, uid):
+        """ Return the number of times the subscript
+        with the given uuid has been changed on disk
+        by another session. Only stats the files,
+        unless they have changed.
+        """
+        self.refresh()
+        return self.versions.get(uid, 0)
+
+    def set_root(self, root):
+        """ Replace the in-memory tree with one read
+        from disk, incrementing the versions of the
+        subscripts that differ between the two.
+        """
+        def contents(root):
+            if root is None:
+                return {}
+            return dict(
+                (s.attrib.get('uuid'), (sorted(s.attrib.items()), s.text))
+                for s in root.findall('subscript')
+            )
+        old, new = contents(self.root), contents(root)
+        self.bump_versions(
+            uid for uid in set(old) | set(new)
+            if old.get(uid) != new.get(uid)
+        )
+        self.root = root
+
+    def watched_paths(self):
+        """ The files that change when
+        another session saves a tab.
+        """
+        return [self.path, journal_path(self.path)]
+
+    def signature(self):
+        """ Return the (mtime, size) of the
+        xml and journal files.
+        """
+        def stat(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            return (st.st_mtime, st.st_size)
+        return (
+            stat(self.path),
+            stat(journal_path(self.path))
+        )
+
+    def load(self):
+        """ Parse the xml file and replay the journal.
+        """
+        with self.lock:
+            # stat before reading, so that a change
+            # made while reading is seen by refresh.
+            signature = self.signature()
+            create_autosave_file()
+            try:
+                xmlp = ETree.XMLParser(encoding="utf-8")
+                parser = ETree.parse(self.path, xmlp)
+            except ETree.ParseError as e:
+                print('ETree.ParseError', e)
+                parser = fix_broken_xml(self.path)
+                signature = self.signature()
+            root = parser.getroot()
+            self._journal_offset = replay_journal(
+                root,
+                self.path
+            )
+            self.set_root(root)
+            self._signature = signature
+            self.forget()
+            self.apply_queued()
+
+    def apply_queued(self):
+        """ Re-apply records the writer has not yet
+        written, so that reading the disk never
+        takes the tree back to an older state.
+        """
+        for record in self.writer.queued_records():
+            apply_journal_record(self.root, record)
+
+    def refresh(self):
+        """ Bring the in-memory tree up to date
+        with the files on disk.
+        """
+        with self.lock:
+            if self.root is None:
+                return self.load()
+            if self._compacting:
+                # the xml is being written by us.
+                return
+
+            signature = self.signature()
+            if signature == self._signature:
+                return
+
+            xml_stat, journal_stat = signature
+            if (xml_stat != self._signature[0]
+                or journal_stat is None
+                or journal_stat[1] < self._journal_offset
+                ):
+                # the xml has been rewritten
+                return self.load()
+
+            self._signature = signature
+            records, self._journal_offset = read_journal(
+                self.path,
+                self._journal_offset
+            )
+            for record in records:
+                if record.get('op') == 'clear':
+                    self.bump_versions(
+                        s.attrib.get('uuid')
+                        for s in self.root.findall('subscript')
+                    )
+                elif 'uuid' in record:
+                    self.bump_versions([record['uuid']])
+                apply_journal_record(self.root, record)
+            self.forget(records)
+            self.apply_queued()
+
+    def tree(self):
+        """ Return the in-memory root element,
+        loading it if necessary, without
+        checking the disk for changes.
+        """
+        if self.root is None:
+            self.load()
+        return self.root
+
+    def subscripts(self):
+        self.refresh()
+        with self.lock:
+            return self.root.findall('subscript')
+
+    def find(self, uid):
+        """ Return the first subscript
+        with the given uuid, or None.
+        """
+        self.refresh()
+        with self.lock:
+            for s in find_subscripts(self.root, uid)[:1]:
+                return s
+
+    def current_index(self):
+        """ Return the stored current
+        tab index, or None.
+        """
+        self.refresh()
+        with self.lock:
+            for ci in self.root.findall('current_index'):
+                try:
+                    return int(ci.text)
+                except (TypeError, ValueError):
+                    return None
+
+    def write(self, records):
+        """ Apply records to the in-memory tree
+        and queue them to be written to the journal.
+        """
+        if not records:
+            return
+        with self.lock:
+            root = self.tree()
+            for record in records:
+                apply_journal_record(root, record)
+            self.forget(records)
+        self.writer.enqueue(records)
+
+    def append(self, records):
+        """ Append records to the journal, compacting
+        it into the xml if it has grown too large.
+        Called from the writer thread.
+        """
+        try:
+            size = append_journal(records, self.path)
+        except IOError as e:
+            # the change is kept in memory,
+            # so try to write the whole file.
+            print(e)
+            return self.compact()
+
+        with self.lock:
+            signature = self.signature()
+            journal_stat = signature[1]
+            expected = self._journal_offset+size
+            if (self._signature is not None
+                and journal_stat is not None
+                and journal_stat[1] == expected
+                ):
+                # nobody else wrote to the journal in the
+                # meantime, so skip reading our own records.
+                self._journal_offset = expected
+                self._signature = signature
+
+        xml_stat = signature[0]
+        xml_size = 0 if xml_stat is None else xml_stat[1]
+        journal_size = 0 if journal_stat is None else journal_stat[1]
+        if journal_size > max(xml_size, JOURNAL_MIN_COMPACT_SIZE):
+            self.compact()
+
+    def compact(self):
+        """ Write the in-memory tree to the
+        xml file and empty the journal.
+        """
+        # pick up other sessions' journal
+        # records before emptying it.
+        self.refresh()
+        with self.lock:
+            if self.root is None:
+                return
+            # work on a copy so the tree can keep
+            # changing while the file is written.
+            root = copy.deepcopy(self.root)
+            self._compacting = True
+        try:
+            writexml(root, self.path)
+        finally:
+            with self.lock:
+                self._compacting = False
+                self._signature = self.signature()
+                self._journal_offset = 0
+
+    def flush(self, timeout=None):
+        return self.writer.flush(timeout=timeout)
+
+    def save_subscript(self, uid, name, text, index, path=None):
+        """ Save a subscript, unless the save
+        would not change what is stored.
+        """
+        self.saves_requested += 1
+        attrib = {
+            'name'      : name,
+            'tab_index' : index,
+        }
+        if path is not None:
+            attrib['path'] = path
+
+        digest = None
+        if text is not None:
+            digest = text_digest(name, index, path, text)
+
+        with self.lock:
+            # drops the digests of tabs another session
+            # has changed since; only a stat otherwise.
+            self.refresh()
+            if digest is not None and self.digests.get(uid) == digest:
+                return
+            for sub in find_subscripts(self.root, uid)[:1]:
+                same = all(
+                    sub.attrib.get(k) == v
+                    for k, v in attrib.items()
+                )
+                # if the text is not loaded,
+                # only the attributes can change.
+                if same and text in (None, sub.text):
+                    if digest is not None:
+                        self.digests[uid] = digest
+                    return
+
+        record = {
+            'op'     : 'save',
+            'uuid'   : uid,
+            'attrib' : attrib,
+        }
+        if text is not None:
+            record['text'] = text
+        self.write([record])
+        if digest is not None:
+            self.digests[uid] = digest
+
+    def update_attribs(self, changes):
+        """ Set attributes on existing subscripts,
+        writing only the ones that differ.
+
+        :param changes: `dict` of {uuid: {name: value}}
+        """
+        records = []
+        with self.lock:
+            root = self.tree()
+            for uid, attrib in changes.items():
+                for sub in find_subscripts(root, uid)[:1]:
+                    attrib = dict(
+                        (k, v) for k, v in attrib.items()
+                        if sub.attrib.get(k) != v
+                    )
+                    if not attrib:
+                        continue
+                    records.append({
+                        'op'     : 'attrib',
+                        'uuid'   : uid,
+                        'attrib' : attrib,
+                    })
+        self.write(records)
+
+    def remove_subscripts(self, uids):
+        with self.lock:
+            root = self.tree()
+            records = [
+                {'op': 'remove', 'uuid': uid}
+                for uid in uids
+                if find_subscripts(root, uid)
+            ]
+        self.write(records)
+
+    def clear(self):
+        self.write([{'op': 'clear'}])
+
+    def set_current_index(self, index):
+        with self.lock:
+            for ci in self.tree().findall('current_index'):
+                if ci.text == str(index):
+                    return
+        self.write([{
+            'op'   : 'current_index',
+            'text' : str(index),
+        }])
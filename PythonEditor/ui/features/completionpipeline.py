@@ -0,0 +1,81 @@
+"""
+Running completion Requests (see utils.providers)
+from the event loop, so that slow providers do not
+hold up typing.
+"""
+from PythonEditor.ui.Qt import QtCore
+from PythonEditor.utils import providers
+from PythonEditor.utils import latency
+
+
+# milliseconds between the steps of the deferred
+# providers, during which key presses are handled.
+STEP_INTERVAL = 0
+
+
+class CompletionPipeline(QtCore.QObject):
+    """ Runs one Request at a time: its cheap providers
+    when it is started, and the rest a step at a time
+    from a timer. The callback is called with the
+    completions of the cheap providers (even if there
+    are none, so that what was shown for the previous
+    request can be hidden) and again each time the
+    deferred providers change them. Starting a new
+    request cancels the previous one.
+    """
+    def __init__(self, parent=None):
+        super(CompletionPipeline, self).__init__(parent)
+        self.request = None
+        self.callback = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(STEP_INTERVAL)
+        self.timer.timeout.connect(self.step)
+
+    def start(self, provider_list, callback):
+        """ Start a request for the completions of
+        provider_list, calling callback with them.
+        """
+        self.cancel()
+        request = providers.Request(provider_list)
+        self.request = request
+        self.callback = callback
+        with latency.stage('candidates'):
+            request.run_cheap()
+        callback(request.completions)
+        self.schedule(request)
+
+    def cancel(self):
+        """ Cancel the current request. Return True
+        if it had providers left to run.
+        """
+        request = self.request
+        self.request = None
+        self.timer.stop()
+        if request is None or request.done:
+            return False
+        request.cancel()
+        return True
+
+    @QtCore.Slot()
+    def step(self):
+        request = self.request
+        if request is None:
+            return
+        with latency.stage('candidates'):
+            changed = request.step()
+        if changed:
+            self.callback(request.completions)
+        self.schedule(request)
+
+    def schedule(self, request):
+        """ Run the next step of request, if it is
+        still the current one and is not done.
+        """
+        if self.request is not request:
+            # cancelled by the callback
+            return
+        if request.done:
+            self.request = None
+        else:
+            self.timer.start()
@@ -0,0 +1,217 @@
+"""
+Opening large files without blocking the UI.
+
+A FileLoader reads files and lexes their lines on
+a background thread, with the highlighter's pure
+python lexer (no Qt objects are touched off the
+GUI thread). The lexer results are sent back in
+chunks and put into the highlighter's style cache
+for the tab the file is opened into, so that once
+the text is set on the editor, highlighting it is
+mostly a matter of cache lookups.
+"""
+from __future__ import print_function
+import os
+import threading
+
+from PythonEditor.ui.Qt import QtGui
+from PythonEditor.ui.Qt import QtCore
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.utils import lexer
+
+
+# files larger than this (in bytes) are
+# loaded on a background thread.
+BACKGROUND_LOAD_SIZE = int(os.getenv(
+    'PYTHONEDITOR_BACKGROUND_LOAD_SIZE', 512*1024
+))
+# characters read from a file at a time.
+READ_CHUNK_SIZE = 256*1024
+# number of lexed lines sent to the GUI thread at a time.
+LEX_CHUNK_LINES = 2000
+
+
+def is_large_file(paths):
+    """ Return True if the files should be
+    loaded on a background thread.
+    """
+    size = 0
+    for path in paths:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            continue
+    return size > BACKGROUND_LOAD_SIZE
+
+
+def get_highlighter(editor):
+    return editor.document().findChild(
+        QtGui.QSyntaxHighlighter,
+        'Highlight'
+    )
+
+
+class FileLoader(QtCore.QObject):
+    """ Reads files and lexes their text on a
+    background thread. Emits progress (a percentage),
+    chunk_ready with lists of (line, previous state,
+    lexer result) for the style cache, then loaded
+    with the list of the files' texts, or failed.
+    """
+    progress    = QtCore.Signal(int)
+    chunk_ready = QtCore.Signal(object)
+    loaded      = QtCore.Signal(object)
+    failed      = QtCore.Signal(str)
+
+    def __init__(self, paths, line_lexer=None, max_lines=0, parent=None):
+        super(FileLoader, self).__init__(parent)
+        self.paths = paths
+        self.line_lexer = line_lexer
+        self.max_lines = max_lines
+        self.cancel_event = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(
+            target=self.run,
+            name='PythonEditorFileLoader'
+        )
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            texts = self.read()
+            if texts is None:
+                return
+            if self.line_lexer is not None:
+                if not self.lex('\n'.join(texts)):
+                    return
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        self.progress.emit(100)
+        self.loaded.emit(texts)
+
+    def read(self):
+        """ Read the files, emitting progress from 0 to
+        50%. Returns None if cancelled.
+        """
+        total = max(sum(os.path.getsize(p) for p in self.paths), 1)
+        done = 0
+        texts = []
+        for path in self.paths:
+            parts = []
+            with open(path, 'rt') as f:
+                while True:
+                    if self.cancel_event.is_set():
+                        return None
+                    part = f.read(READ_CHUNK_SIZE)
+                    if not part:
+                        break
+                    parts.append(part)
+                    done += len(part)
+                    self.progress.emit(min(done*50//total, 50))
+            texts.append(''.join(parts))
+        return texts
+
+    def lex(self, text):
+        """ Lex the lines of text, up to max_lines,
+        emitting them in chunks and progress from
+        50 to 100%. Returns False if cancelled.
+        """
+        lines = text.split('\n')
+        if self.max_lines:
+            lines = lines[:self.max_lines]
+        total = max(len(lines), 1)
+        state = lexer.NORMAL
+        chunk = []
+        for number, line in enumerate(lines):
+            result = self.line_lexer.line_styles(line, state)
+            chunk.append((line, state, result))
+            state = result[1]
+            if len(chunk) >= LEX_CHUNK_LINES:
+                if self.cancel_event.is_set():
+                    return False
+                self.chunk_ready.emit(chunk)
+                self.progress.emit(50+number*50//total)
+                chunk = []
+        if chunk:
+            self.chunk_ready.emit(chunk)
+        return True
+
+
+def load_files(paths, editor, callback, cache_key=None):
+    """ Read the files on a background thread, showing
+    the progress, then call callback with the list of
+    their texts. If cache_key is given, the lines are
+    lexed as well and their styles put in the
+    highlighter's cache for that key (e.g. the uuid of
+    the tab the text will be set on).
+
+    :return: `FileLoader`
+    """
+    highlighter = get_highlighter(editor)
+    line_lexer = None
+    cache = None
+    if highlighter is not None and cache_key is not None:
+        line_lexer = highlighter.lexer
+        cache = highlighter.get_cache(cache_key)
+
+    loader = FileLoader(
+        paths,
+        line_lexer=line_lexer,
+        max_lines=cache.size if cache is not None else 0,
+        parent=editor
+    )
+
+    names = ', '.join(os.path.basename(path) for path in paths)
+    dialog = QtWidgets.QProgressDialog(
+        'Opening {0}'.format(names),
+        'Cancel',
+        0,
+        100,
+        editor
+    )
+    dialog.setWindowTitle('Opening')
+    dialog.setWindowModality(QtCore.Qt.NonModal)
+    dialog.setMinimumDuration(500)
+    dialog.setValue(0)
+
+    def fill_cache(chunk):
+        for line, state, result in chunk:
+            cache.set(line, state, result)
+
+    def finish(texts):
+        if loader.cancel_event.is_set():
+            return
+        dialog.close()
+        dialog.deleteLater()
+        loader.deleteLater()
+        callback(texts)
+
+    def fail(error):
+        if loader.cancel_event.is_set():
+            return
+        dialog.close()
+        dialog.deleteLater()
+        loader.deleteLater()
+        print('Could not open {0}: {1}'.format(names, error))
+
+    def cancel():
+        # the thread stops at its next check,
+        # and its last signals are ignored.
+        loader.cancel()
+        loader.progress.disconnect(dialog.setValue)
+        dialog.deleteLater()
+
+    loader.progress.connect(dialog.setValue)
+    if cache is not None:
+        loader.chunk_ready.connect(fill_cache)
+    loader.loaded.connect(finish)
+    loader.failed.connect(fail)
+    dialog.canceled.connect(cancel)
+    loader.start()
+    return loader
@@ -0,0 +1,127 @@
+"""
+Highlighting of the other occurrences
+of the word selected in the editor.
+"""
+from PythonEditor.ui.Qt import QtGui
+from PythonEditor.ui.Qt import QtCore
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui.features import wordindex
+
+
+# marks the extra selections that belong to
+# the OccurrenceHighlighter, so that those of
+# other features (e.g. the current line) are kept.
+OCCURRENCE_PROPERTY = QtGui.QTextFormat.UserProperty+1
+
+
+class OccurrenceHighlighter(QtCore.QObject):
+    """ When a whole word is selected, highlights its
+    other occurrences in the visible part of the editor,
+    using the editor's word index to skip the lines it
+    is not on. Scrolling or editing updates only this
+    layer of the editor's extra selections.
+    """
+    def __init__(self, editor, color):
+        super(OccurrenceHighlighter, self).__init__(editor)
+        self.setObjectName('OccurrenceHighlighter')
+        self.editor = editor
+        self.color = color
+        self.word = ''
+        self.word_index = wordindex.get_word_index(editor)
+
+        # edits and rehighlighting change the contents
+        # block by block, so update once they are done.
+        self.update_timer = QtCore.QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(0)
+        self.update_timer.timeout.connect(
+            self.update_selections
+        )
+
+        editor.verticalScrollBar().valueChanged.connect(
+            self.update_selections
+        )
+        editor.resize_signal.connect(
+            self.update_selections
+        )
+        editor.document().contentsChange.connect(
+            self.handle_contents_change
+        )
+
+    def highlight_selected_word(self):
+        """ Set the word to highlight from
+        the editor's selection.
+        """
+        word = ''
+        cursor = self.editor.textCursor()
+        if cursor.hasSelection():
+            text = cursor.selectedText()
+            if len(text) > 1 and text in self.word_index.index:
+                word = text
+        if not word and not self.word:
+            return
+        self.word = word
+        self.update_selections()
+
+    def handle_contents_change(self, position, removed, added):
+        if self.word and (removed or added):
+            self.update_timer.start()
+
+    def visible_blocks(self):
+        editor = self.editor
+        bottom = editor.viewport().rect().bottom()
+        offset = editor.contentOffset()
+        block = editor.firstVisibleBlock()
+        while block.isValid():
+            top = editor.blockBoundingGeometry(
+                block
+            ).translated(offset).top()
+            if top > bottom:
+                break
+            if block.isVisible():
+                yield block
+            block = block.next()
+
+    def occurrences(self):
+        """ Return the (start, end) positions of
+        the word in the visible blocks.
+        """
+        word = self.word
+        index = self.word_index.index
+        positions = []
+        for block in self.visible_blocks():
+            number = block.blockNumber()
+            if number >= len(index):
+                break
+            if not index.line_has_word(number, word):
+                continue
+            position = block.position()
+            for match in wordindex.WORD.finditer(block.text()):
+                if match.group() == word:
+                    positions.append((
+                        position+match.start(),
+                        position+match.end()
+                    ))
+        return positions
+
+    def update_selections(self, *args):
+        """ Replace the occurrence selections in the
+        editor's extra selections.
+        """
+        selections = [
+            s for s in self.editor.extraSelections()
+            if not s.format.boolProperty(OCCURRENCE_PROPERTY)
+        ]
+        if self.word:
+            cursor = self.editor.textCursor()
+            for start, end in self.occurrences():
+                selection = QtWidgets.QTextEdit.ExtraSelection()
+                cursor.setPosition(start, QtGui.QTextCursor.MoveAnchor)
+                cursor.setPosition(end, QtGui.QTextCursor.KeepAnchor)
+                selection.cursor = QtGui.QTextCursor(cursor)
+                selection.format.setForeground(QtCore.Qt.white)
+                selection.format.setBackground(self.color)
+                selection.format.setProperty(OCCURRENCE_PROPERTY, True)
+                selections.append(selection)
+        self.editor.setExtraSelections(selections)
+
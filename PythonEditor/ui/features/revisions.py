@@ -0,0 +1,442 @@
+"""
+Revision history for each tab.
+
+Alongside the autosave, snapshots of each tab's
+text are kept in a PythonEditorRevisions folder
+next to the autosave file, one file per tab.
+
+Most snapshots are stored as a delta against the
+previous one (the line ranges it shares with it,
+plus the new text), so the history grows with what
+was edited rather than with the number of saves.
+Every KEYFRAME_INTERVAL revisions a full copy is
+stored, so any revision can be rebuilt quickly.
+
+A revision file is a sequence of entries, each a
+header (time, kind, payload size) followed by the
+zlib-compressed json payload: the text for FULL
+entries, and for DELTA entries a list of ops with
+the hash of the text they apply to (their base).
+
+The file of a tab is shared by every session using
+the same autosave. A session only writes a delta
+against its own last revision while the file ends
+with it; otherwise it writes a full copy. Should two
+sessions append at once, rebuilding a delta uses the
+earlier revision matching its base.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import io
+import re
+import json
+import zlib
+import time
+import struct
+import atexit
+import hashlib
+import binascii
+import threading
+
+from PythonEditor.ui.features import autosavexml
+from PythonEditor.utils import diff
+
+
+REVISIONS_DIR = os.path.join(
+    os.path.dirname(autosavexml.AUTOSAVE_FILE),
+    'PythonEditorRevisions'
+)
+# minimum number of seconds between two
+# revisions of the same tab.
+REVISION_INTERVAL = float(os.getenv(
+    'PYTHONEDITOR_REVISION_INTERVAL', 60
+))
+# each tab's history is trimmed to this many bytes
+REVISIONS_MAX_SIZE = int(os.getenv(
+    'PYTHONEDITOR_REVISIONS_MAX_SIZE', 1024*1024
+))
+# and to revisions younger than this many days.
+REVISIONS_MAX_AGE = float(os.getenv(
+    'PYTHONEDITOR_REVISIONS_MAX_AGE', 30
+))*24*60*60
+KEYFRAME_INTERVAL = 20
+
+HEADER = struct.Struct('<dBI')
+FULL, DELTA = 0, 1
+
+
+def make_delta(old_lines, new_lines):
+    """ Describe new_lines in terms of old_lines.
+
+    :return: `list` of ops, where a [start, end] pair
+             copies old_lines[start:end] and a string
+             is inserted as it is.
+    """
+    ops = []
+    for tag, i1, i2, j1, j2 in diff.opcodes(old_lines, new_lines):
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(new_lines[j1:j2]))
+    return ops
+
+
+def text_hash(text):
+    """ Return the hash of a revision's text
+    stored as the base of a delta.
+    """
+    return binascii.hexlify(
+        autosavexml.text_digest(text)
+    ).decode('ascii')
+
+
+def apply_delta(old_lines, ops):
+    """ Rebuild the text described by
+    make_delta(old_lines, new_lines).
+    """
+    pieces = []
+    for op in ops:
+        if isinstance(op, list):
+            start, end = op
+            pieces.extend(old_lines[start:end])
+        else:
+            pieces.append(op)
+    return ''.join(pieces)
+
+
+def encode_entry(when, kind, body):
+    payload = zlib.compress(
+        json.dumps(body).encode('utf-8')
+    )
+    return HEADER.pack(when, kind, len(payload))+payload
+
+
+def decode_payload(payload):
+    return json.loads(
+        zlib.decompress(payload).decode('utf-8')
+    )
+
+
+def read_data(path):
+    try:
+        with io.open(path, 'rb') as f:
+            return f.read()
+    except IOError:
+        return b''
+
+
+def read_entries(path):
+    """ Return a list of (time, kind, payload)
+    from a revision file.
+    """
+    return parse_entries(read_data(path))
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def parse_entries(data):
+    """ Return a list of (time, kind, payload) from
+    the contents of a revision file. An entry torn by
+    a crash at the end of the file is ignored.
+    """
+    entries = []
+    offset = 0
+    while offset+HEADER.size <= len(data):
+        when, kind, size = HEADER.unpack_from(data, offset)
+        start = offset+HEADER.size
+        if start+size > len(data):
+            break
+        entries.append((when, kind, data[start:start+size]))
+        offset = start+size
+    return entries
+
+
+def previous_full(entries, index):
+    """ Return the index of the closest
+    full entry at or before index.
+    """
+    while index > 0 and entries[index][1] != FULL:
+        index -= 1
+    return index
+
+
+def rebuild_text(entries, index):
+    """ Return the text of entries[index], starting
+    from the closest full entry before it, or from
+    earlier ones if a delta's base is not found
+    after it.
+    """
+    nearest = start = previous_full(entries, index)
+    while True:
+        text = rebuild_from(entries, start, index)
+        if text is not None:
+            return text
+        if start == 0:
+            break
+        start = previous_full(entries, start-1)
+    # the base is gone (e.g. pruned), so
+    # apply the delta to the text before it.
+    return rebuild_from(entries, nearest, index, strict=False)
+
+
+def rebuild_from(entries, start, index, strict=True):
+    """ Return the text of entries[index], starting
+    from entries[start]. Return None if a delta's base
+    is not among the texts rebuilt, unless strict is
+    False, in which case it is applied to the last.
+    """
+    # {hash: text} of the texts rebuilt so far.
+    texts = {}
+    text = ''
+    current = None
+    for when, kind, payload in entries[start:index+1]:
+        body = decode_payload(payload)
+        if kind == FULL:
+            text = body
+        else:
+            if isinstance(body, list):
+                # written before bases were stored
+                base, ops = None, body
+            else:
+                base, ops = body['base'], body['ops']
+            if base is not None and base != current:
+                if base in texts:
+                    text = texts[base]
+                elif strict:
+                    return None
+            text = apply_delta(text.splitlines(True), ops)
+        current = text_hash(text)
+        texts[current] = text
+    return text
+
+
+REVISION_STORES = {}
+def get_revision_store(folder=REVISIONS_DIR):
+    store = REVISION_STORES.get(folder)
+    if store is None:
+        store = REVISION_STORES[folder] = RevisionStore(folder)
+    return store
+
+
+def flush_revision_stores():
+    for store in list(REVISION_STORES.values()):
+        store.flush()
+
+
+atexit.register(flush_revision_stores)
+
+
+class RevisionStore(object):
+    """ Records revisions of tab texts, at most one
+    per tab every REVISION_INTERVAL seconds, and
+    writes them on a background thread.
+    """
+    def __init__(self, folder=REVISIONS_DIR):
+        self.folder = folder
+        self.writer = autosavexml.AutoSaveWriter(self)
+        # used on the GUI thread
+        self.last_recorded = {}
+        # used on the writer thread, only for
+        # tabs that have been edited.
+        self.newest_lines = {}
+        self.since_keyframe = {}
+        # {uuid: size of the file} after this session
+        # last wrote to it, to tell whether another
+        # session has written to it since.
+        self.file_sizes = {}
+        # file access is shared between the
+        # writer thread and revision browsing.
+        self.lock = threading.RLock()
+        self._pruned_folder = False
+
+    def path(self, uid):
+        """ Return the revision file for a tab uuid.
+        """
+        name = uid or ''
+        if not re.match(r'^[\w\-]+$', name):
+            name = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, name+'.rev')
+
+    def record(self, uid, text, force=False):
+        """ Queue a revision of the tab's text, unless
+        one was recorded less than REVISION_INTERVAL
+        seconds ago.
+        """
+        if text is None:
+            return
+        now = time.time()
+        last = self.last_recorded.get(uid, 0)
+        if not force and now-last < REVISION_INTERVAL:
+            return
+        self.last_recorded[uid] = now
+        self.writer.enqueue([{
+            'op'   : 'revision',
+            'uuid' : uid,
+            'text' : text,
+            'time' : now,
+        }])
+
+    def flush(self, timeout=None):
+        return self.writer.flush(timeout=timeout)
+
+    def append(self, records):
+        """ Write queued revisions.
+        Called from the writer thread.
+        """
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        if not self._pruned_folder:
+            self._pruned_folder = True
+            self.prune_folder()
+        for record in records:
+            self.add_revision(
+                record['uuid'],
+                record['text'],
+                record['time']
+            )
+
+    def add_revision(self, uid, text, when):
+        lines = text.splitlines(True)
+        with self.lock:
+            path = self.path(uid)
+            previous = self.newest_lines.get(uid)
+            count = self.since_keyframe.get(uid, 0)
+            if previous is None:
+                entries = read_entries(path)
+                if entries:
+                    previous = rebuild_text(
+                        entries, len(entries)-1
+                    ).splitlines(True)
+                    count = self.count_deltas(entries)
+            elif file_size(path) != self.file_sizes.get(uid):
+                # another session has written to the file,
+                # so its last entry is not previous.
+                previous = None
+            if previous == lines:
+                return
+
+            if previous is None or count >= KEYFRAME_INTERVAL:
+                entry = encode_entry(when, FULL, text)
+                count = 0
+            else:
+                entry = encode_entry(when, DELTA, {
+                    'base' : text_hash(''.join(previous)),
+                    'ops'  : make_delta(previous, lines),
+                })
+                count += 1
+
+            with io.open(path, 'ab') as f:
+                f.write(entry)
+                # the end of this entry, which is the
+                # end of the file unless another session
+                # appended after it.
+                self.file_sizes[uid] = f.tell()
+            self.newest_lines[uid] = lines
+            self.since_keyframe[uid] = count
+            self.prune(uid)
+
+    def count_deltas(self, entries):
+        """ Number of delta entries
+        after the last full entry.
+        """
+        count = 0
+        for when, kind, payload in reversed(entries):
+            if kind == FULL:
+                break
+            count += 1
+        return count
+
+    def revisions(self, uid):
+        """ Return the times of a tab's
+        revisions, oldest first.
+        """
+        with self.lock:
+            entries = read_entries(self.path(uid))
+        return [when for when, kind, payload in entries]
+
+    def text_at(self, uid, index):
+        """ Return the text of a tab's
+        revision at index.
+        """
+        with self.lock:
+            entries = read_entries(self.path(uid))
+        return rebuild_text(entries, index)
+
+    def prune(self, uid):
+        """ Drop the oldest revisions of a tab once its
+        file is larger than REVISIONS_MAX_SIZE or they are
+        older than REVISIONS_MAX_AGE. Trims to 3/4 of the
+        size so that this does not happen on every save.
+        """
+        path = self.path(uid)
+        oldest_allowed = time.time()-REVISIONS_MAX_AGE
+        with self.lock:
+            data = read_data(path)
+            entries = parse_entries(data)
+            if not entries:
+                return
+            size = len(data)
+            if (size <= REVISIONS_MAX_SIZE
+                and entries[0][0] >= oldest_allowed):
+                return
+
+            target = REVISIONS_MAX_SIZE*3//4
+            start = 0
+            while start < len(entries)-1:
+                when, kind, payload = entries[start]
+                if when >= oldest_allowed and size <= target:
+                    break
+                size -= HEADER.size+len(payload)
+                start += 1
+
+            # the first revision kept must be a full one.
+            when, kind, payload = entries[start]
+            first = encode_entry(
+                when, FULL, rebuild_text(entries, start)
+            )
+            pruned = first+b''.join(
+                HEADER.pack(w, k, len(p))+p
+                for w, k, p in entries[start+1:]
+            )
+            # keep what other sessions appended
+            # since the file was read.
+            latest = read_data(path)
+            if not latest.startswith(data):
+                # pruned by another session
+                return
+            pruned += latest[len(data):]
+            autosavexml.write_atomically(
+                path, pruned, keep_generation=False
+            )
+            if (latest == data
+                and len(data) == self.file_sizes.get(uid)):
+                # the file still ends with this session's
+                # last revision, so the next can be a delta.
+                self.file_sizes[uid] = len(pruned)
+            else:
+                # other sessions' revisions are last,
+                # so the next one is written in full.
+                self.file_sizes[uid] = None
+            self.since_keyframe[uid] = self.count_deltas(
+                parse_entries(pruned)
+            )
+
+    def prune_folder(self):
+        """ Remove the histories of tabs that have
+        not been saved for REVISIONS_MAX_AGE.
+        """
+        oldest_allowed = time.time()-REVISIONS_MAX_AGE
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                if os.path.getmtime(path) < oldest_allowed:
+                    os.remove(path)
+            except OSError:
+                continue
@@ -0,0 +1,99 @@
+"""
+A static index of the names defined in a document
+(see utils.astindex), for completing classes,
+functions and variables that have not been run.
+
+The document's text is indexed on a background
+thread a short while after it stops changing, so
+that typing only restarts a timer. Only the
+top-level statements that changed since the last
+index are parsed again.
+"""
+import threading
+
+from PythonEditor.ui.Qt import QtCore
+from PythonEditor.utils import astindex
+
+
+# milliseconds after the last change
+# before the document is indexed.
+INDEX_DELAY = 300
+
+
+class DocumentSourceIndex(QtCore.QObject):
+    """ Keeps a SourceIndex of a QTextDocument,
+    indexing it again on a background thread
+    when its contents change. Until the first
+    index is made, the index is empty.
+    """
+    indexed = QtCore.Signal(object)
+
+    def __init__(self, document):
+        super(DocumentSourceIndex, self).__init__(document)
+        self.setObjectName('DocumentSourceIndex')
+        self._document = document
+        self.index = astindex.SourceIndex()
+        # only used by one thread at a time.
+        self.parser = astindex.StatementParser()
+        self._running = False
+        self._pending = False
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(INDEX_DELAY)
+        self.timer.timeout.connect(self.start)
+
+        self.indexed.connect(self.set_index)
+        document.contentsChange.connect(self.schedule)
+        self.schedule()
+
+    def schedule(self, *args):
+        """ Index the document when it has not
+        changed for INDEX_DELAY milliseconds.
+        """
+        self.timer.start()
+
+    def start(self):
+        if self._running:
+            # index again when the current one is done.
+            self._pending = True
+            return
+        self._running = True
+        thread = threading.Thread(
+            target=self.run,
+            args=(self._document.toPlainText(),),
+            name='PythonEditorSourceIndex'
+        )
+        thread.daemon = True
+        thread.start()
+
+    def run(self, text):
+        try:
+            index = self.parser.index(text)
+        except Exception:
+            # e.g. a RecursionError from deeply nested source
+            index = None
+        self.indexed.emit(index)
+
+    @QtCore.Slot(object)
+    def set_index(self, index):
+        self._running = False
+        if index is not None:
+            self.index = index
+        if self._pending:
+            self._pending = False
+            self.start()
+
+
+def get_source_index(editor):
+    """ Return the DocumentSourceIndex of the
+    editor's document, creating it if needed.
+    """
+    document = editor.document()
+    source_index = document.findChild(
+        DocumentSourceIndex,
+        'DocumentSourceIndex'
+    )
+    if source_index is None:
+        source_index = DocumentSourceIndex(document)
+    return source_index
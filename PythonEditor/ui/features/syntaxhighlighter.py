@@ -1,14 +1,56 @@
-import tokenize
-try:
-    from StringIO import StringIO ## for Python 2
-except ImportError:
-    from io import StringIO ## for Python 3
-import re
+import os
+import time
+from collections import OrderedDict
 
 from PythonEditor.ui.Qt import QtGui
 from PythonEditor.ui.Qt import QtCore
-from PythonEditor.ui.Qt import QtWidgets
 from PythonEditor.utils.debug import debug
+from PythonEditor.utils import lexer
+from PythonEditor.ui.features import occurrences
+
+
+# documents with more lines than this are highlighted
+# lazily: the blocks in and near the viewport straight
+# away, the others a few at a time when the editor is idle.
+LARGE_DOCUMENT_LINES = int(os.getenv(
+    'PYTHONEDITOR_LARGE_DOCUMENT_LINES', 3000
+))
+# number of blocks above and below the
+# viewport that are highlighted straight away.
+VISIBLE_MARGIN = 50
+# milliseconds spent highlighting per idle timer tick.
+IDLE_SLICE = 10
+# added to the state of blocks that have
+# not been highlighted yet (see Highlight).
+LAZY_BLOCK = 0x10000
+# number of lines whose styles are cached for each
+# tab, and the number of tabs whose caches are kept.
+CACHE_LINES = int(os.getenv(
+    'PYTHONEDITOR_HIGHLIGHT_CACHE_LINES', 20000
+))
+CACHED_TABS = 5
+
+
+class StyleCache(object):
+    """ Least recently used cache of the lexer's results
+    for a line, keyed by the line's text and the state
+    at the end of the previous line.
+    """
+    def __init__(self, size=CACHE_LINES):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, text, state):
+        key = (text, state)
+        result = self.entries.pop(key, None)
+        if result is not None:
+            self.entries[key] = result
+        return result
+
+    def set(self, text, state, result):
+        self.entries[(text, state)] = result
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
 
 
 themes = {
@@ -53,6 +95,20 @@ class Highlight(QtGui.QSyntaxHighlighter):
     """ Modified, simplified version of some code
     that Wouter Gilsing found and modified when researching.
     wiki.python.org/moin/PyQt/Python%20syntax%20highlighting
+
+    Strings and comments are found by lexer.scan_strings,
+    and the block state is the lexer state at the end of
+    the block (e.g. lexer.IN_TRIPLE_DOUBLE).
+
+    The lexer results are cached per tab (see
+    select_cache), so switching back to a tab does
+    not mean lexing all of its lines again.
+
+    In documents with more than LARGE_DOCUMENT_LINES
+    lines, blocks outside the viewport are only scanned
+    for strings, so that the block states stay correct,
+    and marked with LAZY_BLOCK. They are
+    highlighted when scrolled into view, or in idle time.
     """
     arguments = [
         'self', 'cls', 'args', 'kwargs'
@@ -136,6 +192,15 @@ class Highlight(QtGui.QSyntaxHighlighter):
         self.set_style(self.theme)
         self.make_rules()
         self.selected_word = ''
+        rgb, weight = self.theme['selected_word']
+        self.occurrences = occurrences.OccurrenceHighlighter(
+            editor,
+            QtGui.QColor(*rgb)
+        )
+        self._visible_range = None
+        self._forced_block_number = None
+        self._lazy_block_number = 0
+        self._clean_blocks = 0
         self.connect_timers()
 
     def set_style(self, theme):
@@ -143,16 +208,6 @@ class Highlight(QtGui.QSyntaxHighlighter):
           feature: self.format(*style)
           for feature, style in theme.items()
         }
-        self.tri_single = (
-            QtCore.QRegExp("'''"),
-            1,
-            self.styles['comment']
-        )
-        self.tri_double = (
-            QtCore.QRegExp('"""'),
-            2,
-            self.styles['comment']
-        )
 
     def make_rules(self):
         # rules
@@ -160,47 +215,72 @@ class Highlight(QtGui.QSyntaxHighlighter):
 
         # function args/kwargs TODO: find correct regex pattern for separate
         # args and kwargs (words) between parentheses
-        # rules += [('(?:def \w+\()([^)]+)', 1, self.styles['args'])]
+        # rules += [('(?:def \w+\()([^)]+)', 1, 'args')]
 
         class_regex = r'(?:class\s+\w+\()([a-zA-Z\.]+)(?:\))'
-        rules += [(class_regex, 1, self.styles['inherited'])]
-        rules += [(r'\b%s\b' % i, 0, self.styles['arguments'])
-                  for i in self.arguments]
-        rules += [(r'\b%s\b' % i, 0, self.styles['keyword'])
-                  for i in self.keywords]
-        rules += [(i, 0, self.styles['keyword'])
-                  for i in self.operatorKeywords]
-        rules += [(r'\b%s\b' % i, 0, self.styles['numbers'])
-                  for i in self.truthy]
-        rules += [(r'\b%s\b' % i, 0, self.styles['instantiators'])
-                  for i in self.instantiators]
-        rules += [(r'\b%s\b' % i, 0, self.styles['exceptions'])
-                  for i in self.exceptions]
+        rules += [(class_regex, 1, 'inherited')]
+
+        # whole words are looked up in a single pass
+        # instead of searching for each of them.
+        words = {}
+        for names, style in [
+            (self.arguments, 'arguments'),
+            (self.keywords, 'keyword'),
+            (self.truthy, 'numbers'),
+            (self.instantiators, 'instantiators'),
+            (self.exceptions, 'exceptions'),
+        ]:
+            for name in names:
+                words[name] = style
+        rules += [(r'\w+', 0, words)]
+        operators = '|'.join(
+            '(?:%s)' % i for i in self.operatorKeywords
+        )
+        rules += [(operators, 0, 'keyword')]
 
         rules += [
             # function names
-            (r'(?:def\s+|)(\w+)(?:\()', 1, self.styles['function_names']),
+            (r'(?:def\s+|)(\w+)(?:\()', 1, 'function_names'),
             # class names
-            (r'(?:class\s+)(\w+)(?:\()', 1, self.styles['class_names']),
+            (r'(?:class\s+)(\w+)(?:\()', 1, 'class_names'),
             # methods
-            (r'(?:\.)([a-zA-Z\.]+)(?:\()', 1, self.styles['methods']),
+            (r'(?:\.)([a-zA-Z\.]+)(?:\()', 1, 'methods'),
             # decorators
-            (r'(?:@)(\w+)', 1, self.styles['function_names']),
+            (r'(?:@)(\w+)', 1, 'function_names'),
             # string formatters
-            (r'([rfb])(?:\'|\")', 0, self.styles['formatters']),
+            (r'([rfb])(?:\'|\")', 0, 'formatters'),
             # integers
-            (r'\b[0-9]+\b', 0, self.styles['numbers']),
-            # Double-quoted string, possibly containing escape sequences
-            (r'"[^"\\]*(\\.[^"\\]*)*"', 0, self.styles['string']),
-            # Single-quoted string, possibly containing escape sequences
-            (r"'[^'\\]*(\\.[^'\\]*)*'", 0, self.styles['string']),
+            (r'\b[0-9]+\b', 0, 'numbers'),
         ]
 
-        # Build a QRegExp for each pattern
-        self.rules = [
-            (QtCore.QRegExp(pat), index, fmt)
-            for (pat, index, fmt) in rules
-        ]
+        # later rules override earlier ones, and strings
+        # and comments override the rules, see lexer.Lexer
+        self.rules = rules
+        self.lexer = lexer.Lexer(rules)
+
+        # cached results of the previous rules
+        self.caches = OrderedDict()
+        self.cache = StyleCache()
+
+    def select_cache(self, key):
+        """ Use the style cache for key (e.g. a
+        tab's uuid), keeping the caches of the
+        CACHED_TABS most recently used keys.
+        """
+        self.cache = self.get_cache(key)
+
+    def get_cache(self, key):
+        """ Return the style cache for key, creating
+        it if needed, without selecting it (e.g. to
+        fill it before the key's text is set).
+        """
+        cache = self.caches.pop(key, None)
+        if cache is None:
+            cache = StyleCache()
+        self.caches[key] = cache
+        while len(self.caches) > CACHED_TABS:
+            self.caches.popitem(last=False)
+        return cache
 
     def connect_timers(self):
         """
@@ -214,6 +294,18 @@ class Highlight(QtGui.QSyntaxHighlighter):
             self.delayed_word_highlight
         )
 
+        self.lazy_timer = QtCore.QTimer(self)
+        self.lazy_timer.setInterval(0)
+        self.lazy_timer.timeout.connect(
+            self.highlight_lazy_blocks
+        )
+        self.editor.verticalScrollBar().valueChanged.connect(
+            self.highlight_visible_blocks
+        )
+        self.editor.resize_signal.connect(
+            self.highlight_visible_blocks
+        )
+
     def delayed_word_highlight(self):
         if self._word_highlight_block:
             return
@@ -236,122 +328,130 @@ class Highlight(QtGui.QSyntaxHighlighter):
 
         return textFormat
 
+    def is_large_document(self):
+        return self.document().blockCount() > LARGE_DOCUMENT_LINES
+
+    def visible_range(self):
+        """ Return the numbers of the first and last
+        blocks in or near the viewport.
+        """
+        if self._visible_range is None:
+            editor = self.editor
+            first = editor.firstVisibleBlock().blockNumber()
+            line_height = max(editor.fontMetrics().lineSpacing(), 1)
+            count = editor.viewport().height()//line_height
+            self._visible_range = (
+                first-VISIBLE_MARGIN,
+                first+count+VISIBLE_MARGIN
+            )
+        return self._visible_range
+
+    def is_lazy(self, state):
+        return state != -1 and bool(state & LAZY_BLOCK)
+
+    def previous_state(self):
+        """ The lexer state at the end of the
+        previous block.
+        """
+        state = self.previousBlockState()
+        if state == -1:
+            return lexer.NORMAL
+        return state & ~LAZY_BLOCK
+
+    def skip_block(self):
+        """ Return True if the current block can be
+        left for later: the document is large, the
+        block is not near the viewport, and it has
+        not already been highlighted.
+        """
+        block = self.currentBlock()
+        number = block.blockNumber()
+        if number == self._forced_block_number:
+            return False
+        state = self.currentBlockState()
+        if state != -1 and not self.is_lazy(state):
+            # keep blocks that were highlighted before
+            # highlighted, otherwise a state change
+            # would undo the highlighting of all the
+            # blocks that follow it.
+            return False
+        if not self.is_large_document():
+            return False
+        first, last = self.visible_range()
+        return not (first <= number <= last)
+
     def highlightBlock(self, text):
         """
         Apply syntax highlighting to the given block of text.
         """
-        # Do other syntax formatting
-        for expression, nth, format in self.rules:
-            index = expression.indexIn(text, 0)
-
-            while index >= 0:
-                # We actually want the index of the nth match
-                index = expression.pos(nth)
-                length = len(expression.cap(nth))
-                self.setFormat(index, length, format)
-                index = expression.indexIn(text, index + length)
-
-        if '#' in text:
-            s = StringIO(text)
-            g = tokenize.generate_tokens(s.readline)
-            try:
-                for toktype, tok, start, end, line in g:
-                    if toktype == tokenize.COMMENT:
-                        _, i = start
-                        _, e = end
-                        length = e-i
-                        self.setFormat(
-                            i,
-                            length,
-                            self.styles['comment']
-                        )
-                        # break to prevent tokenize EOF
-                        # errors on multi-line statements.
-                        break
-            except tokenize.TokenError:
-                pass
-                # triple-quoted strings before a comment
-                # will cause a multi-line error.
-
-        self.setCurrentBlockState(0)
-
-        # Do multi-line strings
-        in_multiline = self.match_multiline(text, *self.tri_single)
-        if not in_multiline:
-            in_multiline = self.match_multiline(text, *self.tri_double)
-
-        self.highlight_selected_word(text)
-
-    def highlight_selected_word(self, text):
+        previous_state = self.previous_state()
+        result = self.cache.get(text, previous_state)
+        if result is None:
+            if self.skip_block():
+                strings, state = lexer.scan_strings(
+                    text,
+                    previous_state
+                )
+                self.setCurrentBlockState(state | LAZY_BLOCK)
+                if not self.lazy_timer.isActive():
+                    self._clean_blocks = 0
+                    self.lazy_timer.start()
+                return
+            result = self.lexer.line_styles(text, previous_state)
+            self.cache.set(text, previous_state, result)
+
+        styles = self.styles
+        ranges, state = result
+        for start, length, style in ranges:
+            self.setFormat(start, length, styles[style])
+        self.setCurrentBlockState(state)
+
+    def highlight_lazy_block(self, block):
+        """ Highlight a block marked with LAZY_BLOCK.
         """
-        Highlight other occurences of
-        the selected word in the text.
-        """
-        if not self.selected_word:
-            return
-        word = self.selected_word
-        if word not in text:
-            return
-
-        extraSelections = self.editor.extraSelections()
-        rgb, weight = self.theme['selected_word']
-        color = QtGui.QColor(*rgb)
-
-        block = self.currentBlock()
-        if not block.isVisible():
+        if not self.is_lazy(block.userState()):
             return
-
-        pos = block.position()
-
-        cursor = self.editor.textCursor()
-        for m in re.finditer(word, text):
-            start = m.start()+pos
-            end = m.end()+pos
-
-            selection = QtWidgets.QTextEdit.ExtraSelection()
-            cursor.setPosition(start, QtGui.QTextCursor.MoveAnchor)
-            cursor.setPosition(end, QtGui.QTextCursor.KeepAnchor)
-            selection.cursor = cursor
-
-            selection.format.setForeground(QtCore.Qt.white)
-            selection.format.setBackground(color)
-            extraSelections.append(selection)
-
-        self.editor.setExtraSelections(extraSelections)
-
-    def match_multiline(self, text, delimiter, in_state, style):
+        self._forced_block_number = block.blockNumber()
+        try:
+            self.rehighlightBlock(block)
+        finally:
+            self._forced_block_number = None
+
+    def highlight_visible_blocks(self, *args):
+        """ On scroll or resize, highlight the
+        lazy blocks that have come into view.
         """
-        Check whether highlighting requires multiple lines.
+        self._visible_range = None
+        if not self.is_large_document():
+            return
+        first, last = self.visible_range()
+        block = self.document().findBlockByNumber(max(first, 0))
+        while block.isValid() and block.blockNumber() <= last:
+            self.highlight_lazy_block(block)
+            block = block.next()
+
+    def highlight_lazy_blocks(self):
+        """ Highlight lazy blocks for IDLE_SLICE
+        milliseconds, carrying on from where the
+        last call stopped. Stops the timer once a
+        whole pass over the document found none.
         """
-        # If inside triple-single quotes, start at 0
-        if self.previousBlockState() == in_state:
-            start = 0
-            add = 0
-        # Otherwise, look for the delimiter on this line
-        else:
-            start = delimiter.indexIn(text)
-            # Move past this match
-            add = delimiter.matchedLength()
-
-        # As long as there's a delimiter match on this line...
-        while start >= 0:
-            # Look for the ending delimiter
-            end = delimiter.indexIn(text, start + add)
-            # Ending delimiter on this line?
-            if end >= add:
-                length = end - start + add + delimiter.matchedLength()
-                self.setCurrentBlockState(0)
-            # No; multi-line string
+        document = self.document()
+        block = document.findBlockByNumber(self._lazy_block_number)
+        deadline = time.time()+IDLE_SLICE/1000.0
+        while time.time() < deadline:
+            if not block.isValid():
+                block = document.firstBlock()
+            if self.is_lazy(block.userState()):
+                self.highlight_lazy_block(block)
+                self._clean_blocks = 0
             else:
-                self.setCurrentBlockState(in_state)
-                length = len(text) - start + add
-            # Apply formatting
-            self.setFormat(start, length, style)
-            # Look for the next match
-            start = delimiter.indexIn(text, start + length)
-
-        # Return True if still inside a multi-line string
-        return self.currentBlockState() == in_state
+                self._clean_blocks += 1
+            if self._clean_blocks > document.blockCount():
+                self.lazy_timer.stop()
+                break
+            block = block.next()
+        self._lazy_block_number = max(block.blockNumber(), 0)
 
     def highlight_same_words(self):
         """
@@ -362,15 +462,5 @@ class Highlight(QtGui.QSyntaxHighlighter):
         those words.
         """
         self._word_highlight_block = False
-        editor = self.editor
-        cursor = editor.textCursor()
-        self.selected_word = ''
-        if cursor.hasSelection():
-            text = cursor.selectedText()
-            words = re.findall(
-                r'\w\w+',
-                self.editor.toPlainText()
-            )
-            if text in words:
-                self.selected_word = text
-        self.rehighlight()
+        self.occurrences.highlight_selected_word()
+        self.selected_word = self.occurrences.word
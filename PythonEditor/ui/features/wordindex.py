@@ -0,0 +1,241 @@
+"""
+An index of the words in a document, kept
+up to date line by line as the document is
+edited, so that finding out whether a word
+is in the document, or which lines it is on,
+does not mean searching the whole text.
+"""
+import re
+from bisect import bisect_left
+from collections import deque
+
+from PythonEditor.ui.Qt import QtCore
+
+
+WORD = re.compile(r'\w+')
+# changes spanning more lines than this drop the
+# index, which is rebuilt when next needed.
+REBUILD_LINES = 1000
+# sorted_words sorts all the words again, rather than
+# inserting and removing them, past this many changes.
+RESORT_CHANGES = 64
+# number of versions of the sorted words whose
+# changes are kept for changes_since.
+MAX_CHANGES = 64
+
+
+class WordIndex(object):
+    """ The words on each line of a text,
+    and the number of times each word
+    appears in the whole text.
+    """
+    def __init__(self, lines=()):
+        self.texts = []
+        self.lines = []
+        self.counts = {}
+        # words added to and removed from counts
+        # since _sorted_words was last updated.
+        self._sorted_words = []
+        self._added = set()
+        self._removed = set()
+        # incremented when the sorted words change.
+        self.version = 0
+        # (version, added, removed) of the last changes.
+        self.changes = deque(maxlen=MAX_CHANGES)
+        self.replace_lines(0, 0, list(lines))
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def __len__(self):
+        return len(self.lines)
+
+    def count(self, word):
+        return self.counts.get(word, 0)
+
+    def words(self):
+        return self.counts.keys()
+
+    def line_has_word(self, number, word):
+        return word in self.lines[number]
+
+    def sorted_words(self):
+        """ Return the words in sorted order,
+        for finding them by prefix.
+        """
+        added, removed = self._added, self._removed
+        if not (added or removed):
+            return self._sorted_words
+        counts = self.counts
+        words = self._sorted_words
+        self.version += 1
+        if len(added)+len(removed) > RESORT_CHANGES:
+            words[:] = sorted(counts)
+            # too many to be worth keeping.
+            self.changes.clear()
+        else:
+            for word in removed:
+                if word in counts:
+                    continue
+                index = bisect_left(words, word)
+                if index < len(words) and words[index] == word:
+                    del words[index]
+            for word in added:
+                if word not in counts:
+                    continue
+                index = bisect_left(words, word)
+                if index == len(words) or words[index] != word:
+                    words.insert(index, word)
+            self.changes.append(
+                (self.version, list(added), list(removed))
+            )
+        added.clear()
+        removed.clear()
+        return words
+
+    def changes_since(self, version):
+        """ Return the words (added, removed) to and
+        from the sorted words since version, or None
+        if the changes are no longer kept.
+        """
+        if version == self.version:
+            return [], []
+        changes = self.changes
+        if version is None or not changes or changes[0][0] > version+1:
+            return None
+        added, removed = set(), set()
+        for number, new, old in changes:
+            if number <= version:
+                continue
+            for word in old:
+                if word in added:
+                    added.discard(word)
+                else:
+                    removed.add(word)
+            for word in new:
+                if word in removed:
+                    removed.discard(word)
+                else:
+                    added.add(word)
+        return added, removed
+
+    def remove_words(self, words):
+        counts = self.counts
+        for word in words:
+            remaining = counts[word]-1
+            if remaining:
+                counts[word] = remaining
+            else:
+                del counts[word]
+                if word in self._added:
+                    self._added.discard(word)
+                else:
+                    self._removed.add(word)
+
+    def add_words(self, words):
+        counts = self.counts
+        for word in words:
+            count = counts.get(word, 0)
+            if not count:
+                if word in self._removed:
+                    self._removed.discard(word)
+                else:
+                    self._added.add(word)
+            counts[word] = count+1
+
+    def replace_lines(self, start, count, texts):
+        """ Replace count lines from line
+        number start with the given texts.
+        """
+        if count == len(texts):
+            # most often, lines have been edited or
+            # rehighlighted rather than added or removed.
+            for offset, text in enumerate(texts):
+                number = start+offset
+                if self.texts[number] != text:
+                    self.set_line(number, text)
+            return
+
+        for words in self.lines[start:start+count]:
+            self.remove_words(words)
+
+        lines = [tuple(WORD.findall(text)) for text in texts]
+        for words in lines:
+            self.add_words(words)
+        self.texts[start:start+count] = texts
+        self.lines[start:start+count] = lines
+
+    def set_line(self, number, text):
+        self.remove_words(self.lines[number])
+        words = tuple(WORD.findall(text))
+        self.add_words(words)
+        self.texts[number] = text
+        self.lines[number] = words
+
+
+class DocumentWordIndex(QtCore.QObject):
+    """ Keeps a WordIndex of a QTextDocument up to date,
+    re-reading only the blocks touched by each change.
+    After large changes (such as setPlainText) the index
+    is rebuilt the next time it is used.
+    """
+    def __init__(self, document):
+        super(DocumentWordIndex, self).__init__(document)
+        self.setObjectName('DocumentWordIndex')
+        self._document = document
+        self._index = None
+        self._block_count = document.blockCount()
+        document.contentsChange.connect(self.update)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = WordIndex(
+                self._document.toPlainText().split('\n')
+            )
+        return self._index
+
+    def update(self, position, removed, added):
+        document = self._document
+        block_count = document.blockCount()
+        added_blocks = block_count-self._block_count
+        self._block_count = block_count
+        if self._index is None:
+            return
+
+        first = document.findBlock(position)
+        last = document.findBlock(position+added)
+        if not last.isValid():
+            last = document.lastBlock()
+        first_number = first.blockNumber()
+        new_count = last.blockNumber()-first_number+1
+        if new_count > REBUILD_LINES:
+            self._index = None
+            return
+
+        texts = []
+        block = first
+        while block.isValid():
+            texts.append(block.text())
+            if block == last:
+                break
+            block = block.next()
+        self._index.replace_lines(
+            first_number,
+            new_count-added_blocks,
+            texts
+        )
+
+
+def get_word_index(editor):
+    """ Return the DocumentWordIndex of the
+    editor's document, creating it if needed.
+    """
+    document = editor.document()
+    word_index = document.findChild(
+        DocumentWordIndex,
+        'DocumentWordIndex'
+    )
+    if word_index is None:
+        word_index = DocumentWordIndex(document)
+    return word_index
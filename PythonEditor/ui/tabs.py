@@ -19,6 +19,15 @@ from PythonEditor.ui.features import autosavexml
 from PythonEditor.ui import editor
 
 
+# tabs restored from the autosave only load their text
+# when needed. once the text of all tabs exceeds this many
+# characters, the least recently viewed ones are unloaded.
+LOADED_TEXT_LIMIT = int(os.getenv(
+    'PYTHONEDITOR_LOADED_TEXT_LIMIT',
+    32*1024*1024
+))
+
+
 TAB_STYLESHEET = """
 QTabBar::tab {
     height: 24px;
@@ -205,6 +214,12 @@ class Tabs(QtWidgets.QTabBar):
         self.pressed_uid = ''
         self._hovered_index = -2
 
+        # callables set by the autosave to fetch the text
+        # of a tab whose 'text' is None, and to tell whether
+        # a tab's text can be fetched again once unloaded.
+        self.text_loader = None
+        self.text_unloadable = None
+
         # # a stack for navigating positions
         # # `list` of `tuples`
         # # [(`str` tab_uid, `int` cursor_pos),]
@@ -276,6 +291,62 @@ class Tabs(QtWidgets.QTabBar):
         tab_data[name] = value
         return self.setTabData(index, tab_data)
 
+    def load_text(self, index):
+        """
+        Return the text of the tab at index, loading
+        it first if it has not been loaded yet (its
+        'text' is None).
+        """
+        data = self.tabData(index)
+        if data is None:
+            return None
+        text = data.get('text')
+        if text is not None:
+            return text
+
+        if self.text_loader is not None:
+            self.text_loader(data)
+        text = data.get('text')
+        if text is None:
+            text = ''
+            path = data.get('path')
+            if path and os.path.isfile(path):
+                with open(path, 'r') as f:
+                    text = f.read()
+            data['text'] = text
+        self.setTabData(index, data)
+        return text
+
+    def unload_cold_tabs(self, limit=LOADED_TEXT_LIMIT):
+        """
+        Drop the text of the least recently viewed
+        tabs until the loaded text is within limit.
+        Only tabs whose text can be loaded again
+        unchanged are unloaded.
+        """
+        if self.text_unloadable is None:
+            return
+        current = self.currentIndex()
+        loaded = []
+        total = 0
+        for i in range(self.count()):
+            data = self.tabData(i)
+            if data is None or data.get('text') is None:
+                continue
+            total += len(data['text'])
+            if i != current:
+                loaded.append((data.get('viewed', 0), i))
+
+        for viewed, i in sorted(loaded):
+            if total <= limit:
+                break
+            data = self.tabData(i)
+            if not self.text_unloadable(data):
+                continue
+            total -= len(data['text'])
+            data['text'] = None
+            self.setTabData(i, data)
+
     def tab_only_rect(self):
         """
         self.rect() without the <> buttons.
@@ -643,6 +714,7 @@ class Tabs(QtWidgets.QTabBar):
         # this can cause a jump.
         self.setTabText(index, label)
 
+        self.load_text(index)
         data = self.tabData(index)
         data['name'] = label
         self.tab_renamed_signal.emit(
@@ -685,7 +757,8 @@ class Tabs(QtWidgets.QTabBar):
         if not isinstance(data, dict):
             return
 
-        text = data.get('text')
+        text = self.load_text(index)
+        data = self.tabData(index)
         has_text = False
         if hasattr(text, 'strip'):
             has_text = bool(text.strip())
@@ -911,9 +984,10 @@ class TabEditor(QtWidgets.QWidget):
             # empty tab, ignore.
             return
 
-        text = data['text']
+        text = self.tabs.load_text(index)
+        data = self.tabs.tabData(index)
 
-        if text is None or not text.strip():
+        if not text.strip():
             path = data.get('path')
             if path is None:
                 text = ''
@@ -924,10 +998,22 @@ class TabEditor(QtWidgets.QWidget):
                     text = f.read()
                 data['text'] = text
 
+        data['viewed'] = time.time()
+        self.tabs.setTabData(index, data)
+        self.tabs.unload_cold_tabs()
+
         # collect data before setting editor text
         cursor_pos = self.tabs.get('cursor_pos')
         selection = self.tabs.get('selection')
 
+        # reuse the highlighting of recently viewed tabs
+        highlighter = self.editor.document().findChild(
+            QtGui.QSyntaxHighlighter,
+            'Highlight'
+        )
+        if highlighter is not None:
+            highlighter.select_cache(data.get('uuid'))
+
         self.editor.setPlainText(text)
 
         if cursor_pos is not None:
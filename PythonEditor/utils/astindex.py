@@ -0,0 +1,535 @@
+"""
+A static index of the names defined in python source,
+for completing names that have not been executed yet.
+
+The source is split into its top-level statements,
+each of which is parsed on its own with the ast module
+and kept, keyed by its text, so that after an edit only
+the statements that changed are parsed again. Statements
+that do not parse (e.g. the one being typed) are parsed
+together with the statements that follow them if the
+error is at their end, or with the lines in error
+replaced by pass.
+
+The index records, for the module and for each class
+and function, the lines it spans and the names defined
+in it (assignments, imports, definitions, parameters),
+the bases and members of classes (including attributes
+assigned to self in their methods) and the parameters
+of functions. Line numbers start at 1.
+
+No Qt objects are used, so the index can be built on
+a background thread.
+"""
+import ast
+import re
+from bisect import bisect_right
+from collections import OrderedDict
+
+
+# the start of lines that begin a new top-level
+# statement: not indented, not blank or a comment,
+# and not continuing the previous statement.
+STATEMENT_START = re.compile(
+    r'^(?![\s#)\]}]|$|(?:else|elif|except|finally)\b)',
+    re.MULTILINE
+)
+# syntax errors of statements that end early, in a
+# string or brackets left open (e.g. "EOF while scanning
+# triple-quoted string literal" or "'(' was never closed").
+# From python 3.10 their line is where the string or
+# bracket opens, rather than the end of the statement.
+INCOMPLETE_ERROR = re.compile(r'EOF|triple-quoted|was never closed')
+# number of following statements that a statement
+# which does not parse on its own is joined with.
+MAX_JOINED = 20
+# number of lines replaced by pass in a
+# statement that does not parse otherwise.
+MAX_REPAIRS = 5
+# number of parsed statements kept.
+MAX_STATEMENTS = 5000
+
+
+class Scope(object):
+    """ The module, a class or a function: the lines it
+    spans and the names defined in it, as {name: kind},
+    where kind is 'import module.name' for imports.
+    """
+    def __init__(self, kind, name='', first=1, last=1):
+        self.kind = kind
+        self.name = name
+        self.first = first
+        self.last = last
+        self.names = OrderedDict()
+        self.children = []
+        # classes
+        self.bases = []
+        self.attributes = OrderedDict()
+        # functions: the names of the parameters
+        # and the parameters as they are written.
+        self.parameters = []
+        self.arguments = []
+
+    def __repr__(self):
+        return '<Scope {0} {1} {2}-{3}>'.format(
+            self.kind, self.name, self.first, self.last
+        )
+
+    def members(self):
+        """ Return the names of the attributes of a
+        class: those defined in its body and those
+        assigned to self in its methods.
+        """
+        members = list(self.names)
+        members.extend(
+            name for name in self.attributes
+            if name not in self.names
+        )
+        return members
+
+    def moved(self, offset):
+        """ Return a copy of the scope (and of its
+        children) with its lines moved by offset.
+        """
+        scope = Scope(
+            self.kind,
+            self.name,
+            self.first+offset,
+            self.last+offset
+        )
+        scope.names = self.names
+        scope.bases = self.bases
+        scope.attributes = self.attributes
+        scope.parameters = self.parameters
+        scope.arguments = self.arguments
+        scope.children = [
+            child.moved(offset) for child in self.children
+        ]
+        return scope
+
+
+def split_statements(text):
+    """ Return a list of (first line, text) of the
+    top-level statements in text. Statements are
+    split at unindented lines, so a statement with
+    unindented lines inside it (e.g. in a string)
+    or decorators is split into several.
+    """
+    starts = [match.start() for match in STATEMENT_START.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    statements = []
+    line = 1
+    previous = 0
+    for index, start in enumerate(starts):
+        line += text.count('\n', previous, start)
+        previous = start
+        if index+1 < len(starts):
+            end = starts[index+1]
+        else:
+            end = len(text)
+        statements.append((line, text[start:end]))
+    return statements
+
+
+def dotted_name(node):
+    """ Return the dotted name of a Name or
+    Attribute node, or None.
+    """
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return '.'.join(reversed(parts))
+    return None
+
+
+def target_names(node):
+    """ Yield the names assigned to by a target node. """
+    if isinstance(node, ast.Name):
+        yield node.id
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        for element in node.elts:
+            for name in target_names(element):
+                yield name
+    elif type(node).__name__ == 'Starred':
+        for name in target_names(node.value):
+            yield name
+
+
+def target_attributes(node, name):
+    """ Yield the attributes of name
+    assigned to by a target node.
+    """
+    if isinstance(node, (ast.Tuple, ast.List)):
+        for element in node.elts:
+            for attribute in target_attributes(element, name):
+                yield attribute
+    elif (isinstance(node, ast.Attribute)
+          and isinstance(node.value, ast.Name)
+          and node.value.id == name):
+        yield node.attr
+
+
+def parameter_name(node):
+    # python 2 parameters are Name nodes
+    return getattr(node, 'arg', None) or getattr(node, 'id', None)
+
+
+def format_parameters(arguments, source_lines):
+    """ Return the list of the parameters of a function
+    as they would be written, with their default values.
+    """
+    positional = list(getattr(arguments, 'posonlyargs', []))
+    positional += arguments.args
+    defaults = [None]*(len(positional)-len(arguments.defaults))
+    defaults += arguments.defaults
+
+    parts = []
+    for node, default in zip(positional, defaults):
+        parts.append(parameter_name(node) or '')
+        if default is not None:
+            parts[-1] += '='+node_source(default, source_lines)
+    vararg = arguments.vararg
+    if vararg is not None:
+        parts.append('*'+(parameter_name(vararg) or vararg))
+    elif getattr(arguments, 'kwonlyargs', None):
+        parts.append('*')
+    kw_defaults = getattr(arguments, 'kw_defaults', [])
+    for node, default in zip(getattr(arguments, 'kwonlyargs', []), kw_defaults):
+        parts.append(parameter_name(node))
+        if default is not None:
+            parts[-1] += '='+node_source(default, source_lines)
+    kwarg = arguments.kwarg
+    if kwarg is not None:
+        parts.append('**'+(parameter_name(kwarg) or kwarg))
+    return parts
+
+
+def parameter_names(arguments):
+    names = [
+        parameter_name(node) for node in
+        list(getattr(arguments, 'posonlyargs', []))
+        + arguments.args
+        + list(getattr(arguments, 'kwonlyargs', []))
+    ]
+    for node in (arguments.vararg, arguments.kwarg):
+        if node is not None:
+            names.append(parameter_name(node) or node)
+    return [name for name in names if name]
+
+
+def node_source(node, source_lines):
+    """ Return the source of a (single line) node. """
+    end_line = getattr(node, 'end_lineno', None)
+    end = getattr(node, 'end_col_offset', None)
+    if end_line != node.lineno or end is None:
+        return '...'
+    line = source_lines[node.lineno-1]
+    return line[node.col_offset:end]
+
+
+def last_line(node):
+    last = getattr(node, 'end_lineno', None)
+    if last is not None:
+        return last
+    return max(
+        getattr(child, 'lineno', node.lineno)
+        for child in ast.walk(node)
+    )
+
+
+class ScopeBuilder(object):
+    """ Fills Scopes from the statements of an ast. """
+    def __init__(self, source_lines):
+        self.source_lines = source_lines
+
+    def body(self, statements, scope, last, method_self=None, owner=None):
+        """ Add the names defined by statements to scope.
+
+        :param last: the last line of the enclosing scope,
+                     which the last child scope extends to.
+        :param method_self: the name of the first parameter,
+                            if scope is a method.
+        :param owner: the class scope, if scope is a method.
+        """
+        for index, node in enumerate(statements):
+            if index+1 < len(statements):
+                node_last = statements[index+1].lineno-1
+            else:
+                node_last = last
+            self.statement(node, scope, node_last, method_self, owner)
+
+    def statement(self, node, scope, last, method_self, owner):
+        names = scope.names
+        if isinstance(node, (ast.FunctionDef, getattr(ast, 'AsyncFunctionDef', ast.FunctionDef))):
+            names[node.name] = 'def'
+            function = Scope('function', node.name, node.lineno, max(last, last_line(node)))
+            function.parameters = parameter_names(node.args)
+            function.arguments = format_parameters(node.args, self.source_lines)
+            for name in function.parameters:
+                function.names[name] = 'parameter'
+            scope.children.append(function)
+            first = None
+            if scope.kind == 'class' and function.parameters:
+                first = function.parameters[0]
+            self.body(
+                node.body,
+                function,
+                function.last,
+                method_self=first,
+                owner=scope if first else owner,
+            )
+            return
+        if isinstance(node, ast.ClassDef):
+            names[node.name] = 'class'
+            cls = Scope('class', node.name, node.lineno, max(last, last_line(node)))
+            cls.bases = [
+                name for name in map(dotted_name, node.bases)
+                if name is not None
+            ]
+            scope.children.append(cls)
+            self.body(node.body, cls, cls.last)
+            return
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = 'import '+alias.name
+                else:
+                    name = alias.name.split('.')[0]
+                    names[name] = 'import '+name
+            return
+        if isinstance(node, ast.ImportFrom):
+            module = '.'*(node.level or 0)+(node.module or '')
+            for alias in node.names:
+                if alias.name == '*':
+                    continue
+                names[alias.asname or alias.name] = (
+                    'import '+module+'.'+alias.name
+                )
+            return
+
+        targets = []
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, (ast.AugAssign, getattr(ast, 'AnnAssign', ast.AugAssign))):
+            targets = [node.target]
+        elif isinstance(node, (ast.For, getattr(ast, 'AsyncFor', ast.For))):
+            targets = [node.target]
+        elif isinstance(node, (ast.With, getattr(ast, 'AsyncWith', ast.With))):
+            items = getattr(node, 'items', None)
+            if items is None:
+                # python 2
+                items = [node]
+            targets = [
+                item.optional_vars for item in items
+                if item.optional_vars is not None
+            ]
+        for target in targets:
+            for name in target_names(target):
+                names.setdefault(name, 'variable')
+            if method_self is None:
+                continue
+            for attribute in target_attributes(target, method_self):
+                owner.attributes.setdefault(attribute, 'attribute')
+
+        handlers = getattr(node, 'handlers', [])
+        for handler in handlers:
+            if isinstance(handler.name, str):
+                names.setdefault(handler.name, 'variable')
+            elif handler.name is not None:
+                for name in target_names(handler.name):
+                    names.setdefault(name, 'variable')
+
+        # the blocks of compound statements
+        # are in the same scope
+        blocks = [
+            getattr(node, field, None)
+            for field in ('body', 'orelse', 'finalbody')
+        ]
+        blocks += [handler.body for handler in handlers]
+        for block in blocks:
+            if isinstance(block, list) and block:
+                self.body(block, scope, last, method_self, owner)
+
+
+class StatementParser(object):
+    """ Parses top-level statements, keeping the
+    Scopes of the MAX_STATEMENTS most recent ones.
+    """
+    def __init__(self):
+        # {(text, repair): (scope or None, error at end)}
+        self.cache = OrderedDict()
+
+    def parse(self, text, repair=True):
+        """ Return the module Scope of a statement (with
+        lines counted from 1), or None if it does not
+        parse, and the line of the syntax error, or 0.
+
+        :param repair: if True, lines in error are
+                       replaced by pass (up to
+                       MAX_REPAIRS of them).
+        """
+        key = (text, repair)
+        result = self.cache.pop(key, None)
+        if result is None:
+            result = self.parse_uncached(text, repair)
+        self.cache[key] = result
+        while len(self.cache) > MAX_STATEMENTS:
+            self.cache.popitem(last=False)
+        return result
+
+    def parse_uncached(self, text, repair):
+        lines = text.split('\n')
+        error_line = 0
+        for attempt in range(MAX_REPAIRS+1):
+            try:
+                tree = ast.parse('\n'.join(lines))
+            except (SyntaxError, ValueError) as error:
+                number = getattr(error, 'lineno', None) or len(lines)
+                if not error_line:
+                    error_line = number
+                    if INCOMPLETE_ERROR.search(str(error)):
+                        error_line = max(number, len(lines))
+                if not repair or number > len(lines):
+                    return None, error_line
+                line = lines[number-1]
+                indent = line[:len(line)-len(line.lstrip())]
+                repaired = indent+'pass'
+                if line == repaired:
+                    return None, error_line
+                lines[number-1] = repaired
+                continue
+            scope = Scope('module', '', 1, max(len(lines), 1))
+            ScopeBuilder(lines).body(tree.body, scope, scope.last)
+            return scope, error_line
+        return None, error_line
+
+    def index(self, text):
+        """ Return a SourceIndex of text. """
+        statements = split_statements(text)
+        parsed = []
+        index = 0
+        while index < len(statements):
+            line, statement = statements[index]
+            scope, error_line = self.parse(statement, repair=False)
+            joined = 1
+            if scope is None and error_line >= line_count(statement):
+                # it ends early (e.g. in a string or brackets),
+                # so try it with the statements that follow.
+                candidate = statement
+                for count in range(2, MAX_JOINED+2):
+                    if index+count > len(statements):
+                        break
+                    candidate += statements[index+count-1][1]
+                    scope, error_line = self.parse(candidate, repair=False)
+                    if scope is None and error_line < line_count(candidate):
+                        if error_line > line_count(statement):
+                            # it ends in this candidate, which
+                            # has an error after it.
+                            scope, error_line = self.parse(candidate)
+                        if scope is None:
+                            break
+                    if scope is not None:
+                        joined = count
+                        break
+            if scope is None:
+                scope, error_line = self.parse(statement)
+            if scope is not None:
+                parsed.append((line, scope))
+            index += joined
+        return SourceIndex(parsed, text.count('\n')+1)
+
+
+def line_count(text):
+    """ Return the number of lines in
+    text, ignoring trailing newlines.
+    """
+    return text.rstrip('\n').count('\n')+1
+
+
+class SourceIndex(object):
+    """ The scopes of a source, found with the
+    line numbers of the statements they are in.
+    """
+    def __init__(self, statements=(), line_count=1):
+        self.statements = list(statements)
+        self.first_lines = [line for line, scope in self.statements]
+        self.module = Scope('module', '', 1, line_count)
+        for line, scope in self.statements:
+            for name, kind in scope.names.items():
+                self.module.names.setdefault(name, kind)
+        self.module_names = sorted(self.module.names)
+        self._scopes = {}
+        self._local_names = {}
+
+    def scopes_at(self, line):
+        """ Return the scopes containing line, innermost
+        first, ending with the module scope.
+        """
+        scopes = []
+        number = bisect_right(self.first_lines, line)-1
+        if number >= 0:
+            first, statement = self.statements[number]
+            relative = line-first+1
+            children = statement.children
+            while True:
+                for child in children:
+                    if child.first <= relative <= child.last:
+                        scopes.append((first, child))
+                        children = child.children
+                        break
+                else:
+                    break
+        result = [
+            self.moved(first, scope)
+            for first, scope in reversed(scopes)
+        ]
+        result.append(self.module)
+        return result
+
+    def moved(self, first, scope):
+        key = (first, id(scope))
+        moved = self._scopes.get(key)
+        if moved is None:
+            moved = self._scopes[key] = scope.moved(first-1)
+        return moved
+
+    def scope_at(self, line, kind):
+        """ Return the innermost scope of
+        kind containing line, or None.
+        """
+        for scope in self.scopes_at(line):
+            if scope.kind == kind:
+                return scope
+        return None
+
+    def local_names(self, line):
+        """ Return the sorted names defined in the
+        functions containing line.
+        """
+        functions = tuple(
+            scope for scope in self.scopes_at(line)
+            if scope.kind == 'function'
+        )
+        key = tuple(map(id, functions))
+        names = self._local_names.get(key)
+        if names is None:
+            names = set()
+            for scope in functions:
+                names.update(scope.names)
+            names = self._local_names[key] = sorted(names)
+        return names
+
+    def find_class(self, name):
+        """ Return the Scope of the top-level
+        class called name, or None.
+        """
+        for first, statement in self.statements:
+            for child in statement.children:
+                if child.kind == 'class' and child.name == name:
+                    return self.moved(first, child)
+        return None
@@ -0,0 +1,211 @@
+"""
+Finding objects by their dotted names and listing
+their attributes, for completion after a dot.
+
+dir() of an object walks its class hierarchy and
+sorts the names, which for large extension types
+such as nuke.Node is slow to repeat on every
+keystroke. The names of each type are listed once
+and kept, keyed by the type object itself, so
+reloading a module (which makes new classes) or
+running a script again gets a new listing. A cached
+listing is also made again if the number of
+attributes defined on the type or any of its bases
+changes (e.g. if a method is added to a class).
+
+The names of modules are kept too, until the module
+is reloaded (which gives it a new __spec__) or the
+number of names in it changes.
+"""
+import re
+import types
+import weakref
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+IDENTIFIER = re.compile(r'^[A-Za-z_]\w*$')
+# {type: (fingerprint, names, set of names)}
+TYPE_ATTRIBUTES = weakref.WeakKeyDictionary()
+# {module name: (module, number of names, __spec__, names)},
+# keyed by name as python 2 modules cannot be weakly referenced.
+MODULE_ATTRIBUTES = {}
+MISSING = object()
+
+
+def resolve_name(text, namespace):
+    """ Return the object named by the dotted name text
+    in namespace (falling back to the builtins) by getting
+    each attribute in turn, or None if there is none.
+    """
+    obj = None
+    for obj in resolve_steps(text, namespace):
+        pass
+    return obj
+
+
+def resolve_steps(text, namespace):
+    """ Find the object named by the dotted name text as
+    resolve_name does, yielding the object found so far
+    (or None, if there is none) after each attribute, so
+    that the caller can stop between slow attributes.
+    The last item is the object.
+    """
+    names = text.split('.')
+    for name in names:
+        if IDENTIFIER.match(name) is None:
+            yield None
+            return
+
+    name = names[0]
+    obj = namespace.get(name, MISSING)
+    if obj is MISSING:
+        obj = getattr(builtins, name, None)
+    yield obj
+    for name in names[1:]:
+        if obj is None:
+            return
+        try:
+            obj = getattr(obj, name)
+        except Exception:
+            # properties can raise anything
+            obj = None
+        yield obj
+
+
+def order(names):
+    """ Sort names, putting those starting
+    with a lowercase letter first.
+    """
+    names = sorted(names)
+    return (
+        [n for n in names if n[:1].islower()]
+        + [n for n in names if not n[:1].islower()]
+    )
+
+
+def fingerprint(cls):
+    """ Return a value that changes when attributes
+    are added to or removed from cls or its bases,
+    or None if it cannot be worked out.
+    """
+    mro = getattr(cls, '__mro__', None)
+    if mro is None:
+        return None
+    try:
+        return tuple(len(vars(base)) for base in mro)
+    except TypeError:
+        return None
+
+
+def has_default_dir(obj):
+    """ Return True if dir(obj) only lists the
+    attributes of obj's class hierarchy and
+    obj's __dict__, so it can be cached.
+    """
+    if isinstance(obj, type):
+        default = getattr(type, '__dir__', None)
+    else:
+        default = getattr(object, '__dir__', None)
+    return getattr(type(obj), '__dir__', None) is default
+
+
+def uncached_dir(obj):
+    try:
+        return dir(obj)
+    except TypeError:
+        # found a case where __getattr__
+        # on an obj instance returned a
+        # string, rendering it uncallable.
+        # as a last resort, try the class.
+        try:
+            return dir(obj.__class__)
+        except Exception:
+            return []
+
+
+def class_dir(cls):
+    """ Return the names dir() lists for the instances
+    of cls, ignoring any __dir__ of its metaclass.
+    """
+    type_dir = getattr(type, '__dir__', None)
+    if type_dir is None:
+        return uncached_dir(cls)
+    return type_dir(cls)
+
+
+def module_attributes(module):
+    """ Return the ordered names in module,
+    listing them again if it was reloaded.
+    """
+    names = vars(module)
+    spec = names.get('__spec__')
+    key = names.get('__name__')
+    cached = MODULE_ATTRIBUTES.get(key)
+    if (cached is not None
+        and cached[0] is module
+        and cached[1] == len(names)
+        and cached[2] is spec):
+        return cached[3]
+    result = order(uncached_dir(module))
+    MODULE_ATTRIBUTES[key] = (module, len(names), spec, result)
+    return result
+
+
+def type_attributes(cls):
+    """ Return the ordered attribute names of the class
+    cls and their set, listing them only the first time.
+    """
+    key = fingerprint(cls)
+    cached = None
+    if key is not None:
+        try:
+            cached = TYPE_ATTRIBUTES.get(cls)
+        except TypeError:
+            # not weakly referenceable
+            key = None
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    names = order(class_dir(cls))
+    name_set = frozenset(names)
+    if key is not None:
+        TYPE_ATTRIBUTES[cls] = (key, names, name_set)
+    return names, name_set
+
+
+def attribute_names(obj):
+    """ Return the names dir(obj) would, ordered for
+    completion, using the cached listing of its type.
+    """
+    if isinstance(obj, types.ModuleType):
+        if '__dir__' in vars(obj):
+            # the module lists its own names
+            return order(uncached_dir(obj))
+        return module_attributes(obj)
+    if not has_default_dir(obj):
+        return order(uncached_dir(obj))
+    if isinstance(obj, type):
+        return type_attributes(obj)[0]
+
+    names, name_set = type_attributes(type(obj))
+    try:
+        instance_dict = object.__getattribute__(obj, '__dict__')
+    except AttributeError:
+        return names
+    if not isinstance(instance_dict, dict):
+        return names
+    extra = [name for name in instance_dict if name not in name_set]
+    if not extra:
+        return names
+    return order(name_set.union(extra))
+
+
+def clear_cache():
+    """ Forget the listed attributes
+    of all types and modules.
+    """
+    TYPE_ATTRIBUTES.clear()
+    MODULE_ATTRIBUTES.clear()
@@ -0,0 +1,763 @@
+"""
+Ranked completion of words from sorted lists.
+
+The words of each source (the names defined in the
+scope of the cursor and at module level, found by
+the astindex, the words of the document, the
+__main__ namespace, keywords and builtins) are
+kept sorted, so that those starting with a prefix
+are found with a binary search rather than by
+filtering every word. Only the best MAX_RESULTS
+candidates are returned, ranked by:
+- how recently the word was accepted as a completion,
+- the scope of its source: LOCAL, MODULE, DOCUMENT,
+  GLOBAL, then BUILTIN,
+- the number of times it appears in the document.
+
+Words that contain the characters of the prefix in
+order, but do not start with it, are found by a
+FuzzyIndex and ranked by their fuzzy match score.
+The FuzzyIndex of a source is updated with the words
+added to and removed from it, when the source can
+tell which they are, rather than made again, and can
+be made ahead of the first search (see prepare).
+
+No Qt objects are used.
+"""
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from heapq import nsmallest
+
+
+# scopes of the sources, in order of preference.
+LOCAL = 0
+MODULE = 1
+DOCUMENT = 2
+GLOBAL = 3
+BUILTIN = 4
+# number of completions returned.
+MAX_RESULTS = 50
+# number of accepted completions remembered.
+MAX_ACCEPTED = 200
+# fuzzy matches are only looked for with prefixes
+# at least this long, if there are not enough
+# words starting with the prefix.
+FUZZY_MIN_LENGTH = 2
+# fuzzy match scores: each matched character scores
+# MATCH_SCORE, plus CONTIGUOUS_BONUS if it follows the
+# previous match (or starts the word) and BOUNDARY_BONUS
+# if it starts a part of the word (see mark_boundaries).
+# Each gap between matched characters costs GAP_PENALTY,
+# and each character of the word LENGTH_PENALTY, so that
+# shorter words come first.
+MATCH_SCORE = 1.0
+CONTIGUOUS_BONUS = 4.0
+BOUNDARY_BONUS = 3.0
+GAP_PENALTY = 1.0
+LENGTH_PENALTY = 0.01
+# number of fuzzy matches scored per search. Matches are
+# found best first (see FuzzyIndex), so this is only a
+# few times the number of completions shown.
+MAX_SCORED = MAX_RESULTS*4
+# words added to a FuzzyIndex are kept apart from the
+# others (which are sorted by length) until there are
+# more than this many, or an eighth of the others.
+MAX_RECENT = 256
+
+# a lowercase letter followed by a capital: a camelCase hump.
+HUMP = re.compile(r'(?<=[a-z])(?=[A-Z])')
+# ends the key of a word in the lines of a
+# FuzzyIndex, and is followed by its slot.
+END = '\x00'
+
+
+def with_prefix(words, prefix):
+    """ Return the words of the sorted
+    list words that start with prefix.
+    """
+    index = bisect_left(words, prefix)
+    result = []
+    length = len(words)
+    while index < length:
+        word = words[index]
+        if not word.startswith(prefix):
+            break
+        result.append(word)
+        index += 1
+    return result
+
+
+def match_key(word, keep_suffix=False):
+    """ Return the part of word that is matched:
+    snippet names such as 'class [snippet]' are
+    matched without their ' [...]' suffix.
+    """
+    if not keep_suffix and ' [' in word:
+        return word.rpartition(' [')[0]
+    return word
+
+
+def mark_boundaries(text):
+    """ Return text lowercased, except for the letters
+    that start a part of a word, which are capitalised:
+    the first letter after anything that is not a letter
+    (such as _ . or a digit, or the start of the text)
+    and each capital following a lowercase letter.
+
+    >>> mark_boundaries('selected_node\\nnameSet\\nx2d')
+    'Selected_Node\\nNameSet\\nX2D'
+    """
+    return HUMP.sub('\x01', text).title().replace('\x01', '')
+
+
+def mark_words(words):
+    """ Return the mark_boundaries key of each of words.
+    A few letters change length with their case, so
+    words with those are marked by a placeholder of
+    their length, which is not matched, to keep the
+    positions in the texts of a FuzzyIndex in line.
+    """
+    if not words:
+        return []
+    text = '\n'.join(words)
+    marks = mark_boundaries(text).split('\n')
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        for index, (word, mark) in enumerate(zip(words, marks)):
+            if not (len(word) == len(mark) == len(mark.lower())):
+                marks[index] = '\x01'*len(word)
+    return marks
+
+
+def index_lines(keys, slots):
+    """ Return the lines of a FuzzyIndex for the
+    keys of slots: a newline, the key, END and the
+    slot of the word.
+
+    >>> index_lines(['NameSet', 'X2D'], [1, 0])
+    '\\nX2D\\x001\\nNameSet\\x000'
+    """
+    return ''.join(
+        '\n'+keys[slot]+END+str(slot) for slot in slots
+    )
+
+
+def class_escape(char):
+    """ Escape char for use in a [character class]. """
+    if char in '\\]^-[':
+        return '\\'+char
+    return char
+
+
+def skip(name, excluded):
+    """ Return a regular expression matching as many
+    characters not in the [character class] excluded
+    as there are, and never fewer: the lookahead is
+    atomic, and the group name is matched again. This
+    saves backtracking where it cannot find a match.
+    """
+    return '(?=(?P<{0}>[^{1}]*))(?P={0})'.format(name, excluded)
+
+
+def ending(keep_suffix):
+    """ Return the characters that end a match
+    key, for a [character class].
+    """
+    if keep_suffix:
+        return END
+    return END+'\\['
+
+
+def slot_pattern():
+    """ Return a regular expression matching the rest
+    of a line of a FuzzyIndex, with its slot as the
+    group named slot.
+    """
+    return '[^'+END+']*'+END+'(?P<slot>\\d+)'
+
+
+def position_group(name, char, positions=True):
+    """ Return a regular expression matching char,
+    as the group name if positions.
+    """
+    if positions:
+        return '(?P<{0}>{1})'.format(name, re.escape(char))
+    return re.escape(char)
+
+
+def boundary_pattern(needle, anchored=False, keep_suffix=False,
+                     positions=True):
+    """ Return a regular expression matching the lines of
+    a mark_boundaries text where each character of the
+    lowercase needle starts a part of the word or follows
+    the previous one. The nth character is the group named
+    cn when it follows the previous one, bn otherwise.
+    """
+    end = ending(keep_suffix)
+    parts = [position_group('b0', needle[0].upper(), positions)]
+    for number, char in enumerate(needle[1:], 1):
+        upper = char.upper()
+        parts.append('(?:{0}|{1}{2})'.format(
+            position_group('c%d' % number, char, positions),
+            skip('s%d' % number, class_escape(upper)+end),
+            position_group('b%d' % number, upper, positions),
+        ))
+    pattern = ''.join(parts)
+    if anchored:
+        pattern = '\n'+pattern
+    return pattern+slot_pattern()
+
+
+def substring_pattern(needle, anchored=False, keep_suffix=False,
+                      positions=True):
+    """ Return a regular expression matching the lines
+    containing needle. The nth character of needle is
+    the group named cn, if positions.
+    """
+    pattern = ''.join(
+        position_group('c%d' % number, char, positions)
+        for number, char in enumerate(needle)
+    )
+    if anchored:
+        pattern = '\n'+pattern
+    return pattern+slot_pattern()
+
+
+def fuzzy_pattern(needle, anchored=False, keep_suffix=False,
+                  positions=True):
+    """ Like substring_pattern, but matching the
+    characters of needle in order rather than next
+    to each other. Each character is preceded by a
+    class excluding it, so it is the first found
+    after the previous one, and backtracking cannot
+    find another match. With positions, the class
+    is atomic (see skip), which is faster with the
+    groups to keep track of.
+    """
+    end = ending(keep_suffix)
+    parts = [position_group('c0', needle[0], positions)]
+    for number, char in enumerate(needle[1:], 1):
+        excluded = class_escape(char)+end
+        if positions:
+            skipped = skip('s%d' % number, excluded)
+        else:
+            skipped = '[^'+excluded+']*'
+        parts.append(
+            skipped+position_group('c%d' % number, char, positions)
+        )
+    pattern = ''.join(parts)
+    if anchored:
+        pattern = '\n'+pattern
+    return pattern+slot_pattern()
+
+
+def compile_pattern(pattern):
+    """ Return pattern compiled, the numbers of its
+    groups matching the characters of the needle, in
+    order, and the number of its slot group.
+    """
+    compiled = re.compile(pattern)
+    groups = sorted(
+        number for name, number in compiled.groupindex.items()
+        if name[0] in 'bc'
+    )
+    return compiled, groups, compiled.groupindex['slot']
+
+
+class FuzzyIndex(object):
+    """ Finds and scores the words of a list that
+    contain the characters of a needle in order.
+
+    Each word is kept lowercased, with the letters
+    starting a part of it capitalised (see
+    mark_boundaries), worked out once, when it is
+    added. These keys are joined into lines of text (see
+    index_lines), as they are and lowercased, as are the
+    words for needles with capitals, so that finding the
+    matching words is a regular expression search rather
+    than a loop over the words, and the groups of the
+    match give the positions that are scored, and the
+    slot of the word.
+
+    At most MAX_SCORED matches are scored: first those
+    where each character of the needle starts a part of
+    the word or follows the previous one, then those
+    containing the needle as it is, then the others.
+    The words added since the index was made are
+    searched first, then the others, shortest first.
+
+    When a search finds fewer matches than that, they
+    are all the words that can match a needle starting
+    with it, so the next search, as the needle is
+    typed, only looks through them.
+    """
+    def __init__(self, words=()):
+        self.rebuild(words)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def rebuild(self, words, marks=None):
+        """ Index words, sorted by length. """
+        if marks is None:
+            words = sorted(words, key=len)
+            marks = mark_words(words)
+        # the word in each slot, and its marked key.
+        # Removed words are left in their slot, which
+        # is not in slots any more.
+        self.words = list(words)
+        self.marks = list(marks)
+        self.slots = dict((word, slot) for slot, word in enumerate(words))
+        self.removed = 0
+        # the words after this slot were added later.
+        self.sorted_count = len(self.words)
+        # {'recent' or 'sorted': {kind: text}}
+        self._texts = {}
+        # (needle, options, slots, {kind: text}) of the
+        # last search that found all its matches.
+        self.narrowed = None
+
+    def update(self, added=(), removed=()):
+        """ Add and remove words. """
+        for word in removed:
+            if self.slots.pop(word, None) is not None:
+                self.removed += 1
+        new = []
+        for word in added:
+            if word not in self.slots:
+                self.slots[word] = len(self.words)+len(new)
+                new.append(word)
+        if new:
+            self.words.extend(new)
+            self.marks.extend(mark_words(new))
+            self._texts.pop('recent', None)
+            self.narrowed = None
+
+        recent = len(self.words)-self.sorted_count
+        if (self.removed > len(self.slots)
+            or recent > max(MAX_RECENT, self.sorted_count//8)):
+            self.compact()
+
+    def compact(self):
+        """ Drop the removed words and sort the
+        added ones with the others.
+        """
+        live = sorted(
+            (len(self.words[slot]), slot)
+            for slot in self.slots.values()
+        )
+        self.rebuild(
+            [self.words[slot] for length, slot in live],
+            [self.marks[slot] for length, slot in live]
+        )
+
+    def texts(self, slots, cache, cased=False):
+        """ Return the marked text of the lines of slots,
+        and their text lowercased, or as they are if cased,
+        made once for each dict cache.
+        """
+        marked = cache.get('marked')
+        if marked is None:
+            marked = cache['marked'] = index_lines(self.marks, slots)
+        kind = 'cased' if cased else 'lowercase'
+        text = cache.get(kind)
+        if text is None:
+            if cased:
+                text = index_lines(self.words, slots)
+            else:
+                text = marked.lower()
+            cache[kind] = text
+        return marked, text
+
+    def segments(self, cased=False):
+        """ Return the texts (see texts) of the words
+        added since the index was made, and of the others.
+        """
+        segments = []
+        for name, first, last in (
+            ('recent', self.sorted_count, len(self.words)),
+            ('sorted', 0, self.sorted_count),
+        ):
+            if first == last:
+                continue
+            cache = self._texts.setdefault(name, {})
+            segments.append(self.texts(range(first, last), cache, cased))
+        return segments
+
+    def narrowed_segments(self, needle, options, cased=False):
+        """ Return the texts of the matches of the last
+        search, if needle starts with its needle and was
+        searched with the same options, or None.
+        """
+        if self.narrowed is None:
+            return None
+        previous, previous_options, slots, cache = self.narrowed
+        if previous_options != options or not needle.startswith(previous):
+            return None
+        return [self.texts(slots, cache, cased)]
+
+    def narrow(self, needle, options, pattern):
+        """ Return the texts of the words whose text,
+        as it is, matches pattern, and keep them for
+        the searches of needle as it is typed. The
+        only group of pattern must be the slot.
+        """
+        pattern = re.compile(pattern)
+        slots = []
+        for marked, text in self.segments(cased=True):
+            slots.extend(map(int, pattern.findall(text)))
+        self.narrowed = (needle, options, slots, {})
+        return self.narrowed_segments(needle, options, cased=True)
+
+    def search(self, needle, limit=MAX_RESULTS, anchored=False):
+        """ Return the best scoring (score, word)
+        for needle, best first. If needle starts
+        with a space, the rest of it must be found
+        as it is (see nonconsec_find). Needles with
+        capitals must match their case.
+        """
+        stripped = needle.lstrip(' ')
+        if not stripped:
+            return []
+        lowered = stripped.lower()
+        cased = stripped != lowered
+        keep_suffix = '[' in stripped
+        exact = needle.startswith(' ')
+
+        # (makes the pattern, whether it searches the marked text)
+        patterns = []
+        if not exact:
+            patterns.append((boundary_pattern, True))
+        patterns.append((substring_pattern, False))
+        if not exact and len(stripped) > 1:
+            patterns.append((fuzzy_pattern, False))
+
+        options = (anchored, keep_suffix, exact)
+        segments = self.narrowed_segments(stripped, options, cased)
+        if segments is None and cased:
+            # needles with capitals match few words, so all
+            # of them are found first, with the last pattern,
+            # which matches any word the others do.
+            segments = self.narrow(stripped, options, patterns[-1][0](
+                stripped, anchored, keep_suffix, positions=False
+            ))
+        if segments is None:
+            segments = self.segments(cased)
+
+        words = self.words
+        slots = self.slots
+        seen = set()
+        scored = []
+        for make_pattern, on_marked in patterns:
+            pattern, groups, slot_group = compile_pattern(make_pattern(
+                lowered if on_marked else stripped, anchored, keep_suffix
+            ))
+            for marked, other in segments:
+                text = marked if on_marked else other
+                for match in pattern.finditer(text):
+                    regs = match.regs
+                    end, slot_end = regs[slot_group]
+                    slot = int(text[end:slot_end])
+                    if slot in seen:
+                        continue
+                    word = words[slot]
+                    # the line is a newline, the key and END.
+                    end -= 1
+                    start = end-len(word)
+                    positions = [
+                        regs[group][0] for group in groups
+                        if regs[group][0] != -1
+                    ]
+                    if cased and on_marked and not same_case(
+                        stripped, word, positions, start
+                    ):
+                        # may match its case in the other text
+                        continue
+                    seen.add(slot)
+                    if slots.get(word) != slot:
+                        # removed
+                        continue
+                    if (not keep_suffix and ' [' in word
+                        and positions[0]-start >= len(match_key(word))):
+                        # found in the ' [...]' suffix
+                        continue
+                    score = position_score(
+                        positions, start, end, marked
+                    )
+                    scored.append((-score, word))
+                    if len(scored) >= MAX_SCORED:
+                        break
+                if len(scored) >= MAX_SCORED:
+                    break
+            if len(scored) >= MAX_SCORED:
+                break
+        else:
+            # every match was seen.
+            self.narrowed = (stripped, options, sorted(seen), {})
+        return [
+            (-score, word)
+            for score, word in nsmallest(limit, scored)
+        ]
+
+
+def same_case(needle, word, positions, start):
+    """ Return True if the characters of word at
+    positions (in a line starting at start) are
+    those of needle, in the same case.
+    """
+    for char, position in zip(needle, positions):
+        if word[position-start] != char:
+            return False
+    return True
+
+
+def position_score(positions, start, end, marked):
+    """ Return the score of a match of the characters at
+    positions in the line of marked from start to end.
+    """
+    score = -(end-start)*LENGTH_PENALTY
+    previous = start-1
+    for position in positions:
+        score += MATCH_SCORE
+        if position == previous+1:
+            score += CONTIGUOUS_BONUS
+        else:
+            score -= GAP_PENALTY
+        if marked[position].isupper():
+            score += BOUNDARY_BONUS
+        previous = position
+    return score
+
+
+def nonconsec_find(needle, haystack, anchored=False):
+    """checks if each character of "needle" can be
+    found in order (but not
+    necessarily consecutivly) in haystack.
+    For example, "mm" can be found in "matchmove",
+    but not "move2d"
+    "m2" can be found in "move2d", but not "matchmove"
+
+    >>> nonconsec_find("m2", "move2d")
+    True
+    >>> nonconsec_find("m2", "matchmove")
+    False
+
+    Anchored ensures the first letter matches
+
+    >>> nonconsec_find(
+    ... "atch", "matchmove", anchored = False)
+    True
+    >>> nonconsec_find(
+    ... "atch", "matchmove", anchored = True)
+    False
+    >>> nonconsec_find(
+    ... "match", "matchmove", anchored = True)
+    True
+
+    If needle starts with a string,
+    non-consecutive searching is disabled:
+
+    >>> nonconsec_find(
+    ... " mt", "matchmove", anchored = True)
+    False
+    >>> nonconsec_find(
+    ... " ma", "matchmove", anchored = True)
+    True
+    >>> nonconsec_find(
+    ... " oe", "matchmove", anchored = False)
+    False
+    >>> nonconsec_find(
+    ... " ov", "matchmove", anchored = False)
+    True
+    """
+    # from tabtabtab by Ben Dickson, finding each
+    # character with str.find instead of copying
+    # and slicing a list of characters.
+    haystack = match_key(haystack, keep_suffix='[' in needle)
+
+    if not needle:
+        return True
+    if not haystack:
+        return False
+
+    if needle.startswith(' '):
+        # "[space]abc" does consecutive
+        # search for "abc" in "abcdef"
+        needle = needle.lstrip(' ')
+        if anchored:
+            return haystack.startswith(needle)
+        return needle in haystack
+
+    index = 0
+    if anchored:
+        if needle[0] != haystack[0]:
+            return False
+        needle = needle[1:]
+        index = 1
+
+    for char in needle:
+        position = haystack.find(char, index)
+        if position == -1:
+            return False
+        # dont find string in same pos or backwards again
+        index = position+1
+    return True
+
+
+class CompletionEngine(object):
+    """ Finds and ranks the words starting with a prefix
+    in the sources set with set_source, each a sorted
+    list of words, with an optional function returning
+    the number of times a word appears.
+
+    Words starting with the prefix come first. If there
+    are fewer than limit of them, they are followed by
+    the best fuzzy matches of the prefix.
+    """
+    def __init__(self, limit=MAX_RESULTS):
+        self.limit = limit
+        self.sources = {}
+        self.fuzzy_indexes = {}
+        self.accepted = OrderedDict()
+        self.tick = 0
+
+    def set_source(self, scope, words, count=None, version=None,
+                   changes=None):
+        """ Set the sorted list of words for scope.
+
+        :param version: changes when the words do, if the
+                        same list is changed in place.
+        :param changes: a function taking an earlier version
+                        and returning the words (added, removed)
+                        since, or None if it cannot tell, so that
+                        the FuzzyIndex can be updated with them.
+        """
+        self.sources[scope] = (words, count, version, changes)
+
+    def set_words(self, scope, words):
+        """ Set the words for scope from an unsorted
+        iterable, sorting them only if they changed.
+        """
+        words = set(words)
+        source = self.sources.get(scope)
+        previous = None
+        if source is not None:
+            previous = getattr(source[0], 'word_set', None)
+            if previous == words:
+                return
+        sorted_words = SortedWords(words)
+        self.sources[scope] = (sorted_words, None, None, None)
+
+        cached = self.fuzzy_indexes.get(scope)
+        if (cached is not None
+            and previous is not None
+            and cached[0] is source[0]):
+            index = cached[2]
+            index.update(words-previous, previous-words)
+            self.fuzzy_indexes[scope] = (sorted_words, None, index)
+
+    def accept(self, word):
+        """ Remember that word was chosen, so
+        that it is ranked first next time.
+        """
+        self.tick += 1
+        self.accepted.pop(word, None)
+        self.accepted[word] = self.tick
+        while len(self.accepted) > MAX_ACCEPTED:
+            self.accepted.popitem(last=False)
+
+    def complete(self, prefix, exclude=None):
+        """ Return the best ranked words starting with prefix.
+
+        :param exclude: a word (e.g. the one being typed)
+                        not to take from sources with a count
+                        unless it is counted more than once.
+        """
+        candidates = {}
+        counts = {}
+        for scope in sorted(self.sources):
+            words, count, version, changes = self.sources[scope]
+            for word in with_prefix(words, prefix):
+                if word in candidates:
+                    continue
+                number = count(word) if count is not None else 0
+                if word == exclude and count is not None and number < 2:
+                    continue
+                candidates[word] = scope
+                counts[word] = number
+
+        accepted = self.accepted
+        def rank(word):
+            return (
+                -accepted.get(word, 0),
+                candidates[word],
+                -counts[word],
+                word,
+            )
+        result = nsmallest(self.limit, candidates, key=rank)
+        if len(result) < self.limit and len(prefix) >= FUZZY_MIN_LENGTH:
+            result += self.fuzzy(
+                prefix,
+                self.limit-len(result),
+                exclude=set(result+[exclude])
+            )
+        return result
+
+    def fuzzy_index(self, scope):
+        """ Return the FuzzyIndex of the words of scope,
+        updated with the words added and removed since it
+        was last used if the source can tell which, or
+        made again when they change otherwise.
+        """
+        words, count, version, changes = self.sources[scope]
+        cached = self.fuzzy_indexes.get(scope)
+        if cached is not None:
+            cached_words, cached_version, index = cached
+            if cached_words is words:
+                if cached_version == version:
+                    return index
+                delta = None
+                if changes is not None:
+                    delta = changes(cached_version)
+                if delta is not None:
+                    index.update(*delta)
+                    self.fuzzy_indexes[scope] = (words, version, index)
+                    return index
+        index = FuzzyIndex(words)
+        self.fuzzy_indexes[scope] = (words, version, index)
+        return index
+
+    def prepare(self):
+        """ Make (or update) the FuzzyIndex of each source
+        and the text it searches, so that the first fuzzy
+        search after the sources change does not.
+        """
+        for scope in sorted(self.sources):
+            self.fuzzy_index(scope).segments()
+
+    def fuzzy(self, needle, limit, exclude=()):
+        """ Return the limit best fuzzy matches
+        of needle in all the sources.
+        """
+        matches = {}
+        for scope in sorted(self.sources):
+            index = self.fuzzy_index(scope)
+            for score, word in index.search(needle, limit):
+                if word in exclude or word in matches:
+                    continue
+                matches[word] = (-score, scope, word)
+        return [
+            word for score, scope, word
+            in nsmallest(limit, matches.values())
+        ]
+
+
+class SortedWords(list):
+    """ A sorted list of words, which
+    remembers the set it was made from.
+    """
+    def __init__(self, words):
+        super(SortedWords, self).__init__(sorted(words))
+        self.word_set = words
@@ -0,0 +1,318 @@
+"""
+Line diffs that stay fast on large texts.
+
+Lines are first interned to integer ids, so that
+comparing two lines is an integer comparison.
+The texts are then matched with a patience diff:
+lines that appear exactly once in both texts are
+used as anchors, and the regions between anchors
+are matched recursively. Regions without any
+unique lines are matched with Myers' O(ND)
+algorithm, giving up (and reporting the whole
+region as replaced) after MYERS_LIMIT edits.
+
+All functions take an optional `cancel` argument,
+an object with an is_set() method (such as a
+threading.Event), which is polled while working so
+that a diff running on a background thread can be
+abandoned. DiffCancelled is raised when it is set.
+"""
+from __future__ import print_function
+
+from bisect import bisect_left
+
+
+# maximum number of edits Myers' algorithm will
+# look for in a region before giving up on it.
+MYERS_LIMIT = 1000
+
+
+class DiffCancelled(Exception):
+    pass
+
+
+def check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise DiffCancelled()
+
+
+def intern_lines(a, b):
+    """ Map the lines of a and b to integer ids,
+    equal lines getting the same id.
+
+    :return: `tuple` of two `list`s of ids
+    """
+    ids = {}
+    def intern(lines):
+        return [ids.setdefault(line, len(ids)) for line in lines]
+    return intern(a), intern(b)
+
+
+def unique_anchors(a, b, a0, a1, b0, b1):
+    """ Return the (i, j) pairs of lines that appear
+    exactly once in a[a0:a1] and in b[b0:b1], keeping
+    the longest run in which both i and j increase.
+    """
+    counts = {}
+    for i in range(a0, a1):
+        line = a[i]
+        count, index = counts.get(line, (0, i))
+        counts[line] = (count+1, index)
+    b_counts = {}
+    for j in range(b0, b1):
+        line = b[j]
+        count, index = b_counts.get(line, (0, j))
+        b_counts[line] = (count+1, index)
+
+    pairs = [
+        (index, b_counts[line][1])
+        for line, (count, index) in counts.items()
+        if count == 1 and b_counts.get(line, (0,))[0] == 1
+    ]
+    if not pairs:
+        return []
+    pairs.sort()
+
+    # longest increasing subsequence of the
+    # j values, found by patience sorting.
+    tops = []
+    top_pairs = []
+    back = []
+    for pair in pairs:
+        position = bisect_left(tops, pair[1])
+        if position == len(tops):
+            tops.append(pair[1])
+            top_pairs.append(len(back))
+        else:
+            tops[position] = pair[1]
+            top_pairs[position] = len(back)
+        previous = top_pairs[position-1] if position else None
+        back.append((pair, previous))
+
+    anchors = []
+    index = top_pairs[-1]
+    while index is not None:
+        pair, index = back[index]
+        anchors.append(pair)
+    anchors.reverse()
+    return anchors
+
+
+def myers_blocks(a, b, a0, a1, b0, b1, cancel=None, limit=MYERS_LIMIT):
+    """ Return the matching blocks (i, j, size) of
+    a[a0:a1] and b[b0:b1] with the fewest edits, or
+    None if more than limit edits are needed.
+    """
+    n = a1-a0
+    m = b1-b0
+    max_d = min(n+m, limit)
+    offset = max_d+1
+    v = [0]*(2*max_d+3)
+    trace = []
+    found = False
+    for d in range(max_d+1):
+        if d % 64 == 0:
+            check_cancelled(cancel)
+        # the values of v that step d reads.
+        trace.append(v[offset-d-1:offset+d+2])
+        for k in range(-d, d+1, 2):
+            if k == -d or (k != d and v[offset+k-1] < v[offset+k+1]):
+                x = v[offset+k+1]
+            else:
+                x = v[offset+k-1]+1
+            y = x-k
+            while x < n and y < m and a[a0+x] == b[b0+y]:
+                x += 1
+                y += 1
+            v[offset+k] = x
+            if x >= n and y >= m:
+                found = True
+                break
+        if found:
+            break
+    if not found:
+        return None
+
+    # walk back through the trace,
+    # collecting the diagonal runs.
+    blocks = []
+    x, y = n, m
+    for d in range(len(trace)-1, -1, -1):
+        previous = trace[d]
+        k = x-y
+        if k == -d or (k != d and previous[k+d] < previous[k+d+2]):
+            previous_k = k+1
+        else:
+            previous_k = k-1
+        previous_x = previous[previous_k+d+1]
+        previous_y = previous_x-previous_k
+        if d == 0:
+            previous_x = previous_y = 0
+        start_x = max(previous_x, previous_y+k) if d else 0
+        size = x-start_x
+        if size > 0:
+            blocks.append((a0+start_x, b0+start_x-k, size))
+        x, y = previous_x, previous_y
+    blocks.reverse()
+    return blocks
+
+
+def matching_blocks(a, b, cancel=None):
+    """ Return the (i, j, size) blocks of lines
+    that a and b have in common, in order, like
+    difflib.SequenceMatcher.get_matching_blocks
+    (without the final dummy block).
+
+    :param a: `list` of hashable lines
+    :param b: `list` of hashable lines
+    """
+    a, b = intern_lines(a, b)
+    blocks = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        check_cancelled(cancel)
+        a0, a1, b0, b1 = regions.pop()
+
+        # common prefix and suffix
+        start = 0
+        limit = min(a1-a0, b1-b0)
+        while start < limit and a[a0+start] == b[b0+start]:
+            start += 1
+        if start:
+            blocks.append((a0, b0, start))
+        limit -= start
+        end = 0
+        while end < limit and a[a1-1-end] == b[b1-1-end]:
+            end += 1
+        if end:
+            blocks.append((a1-end, b1-end, end))
+        a0 += start
+        b0 += start
+        a1 -= end
+        b1 -= end
+        if a0 == a1 or b0 == b1:
+            continue
+
+        anchors = unique_anchors(a, b, a0, a1, b0, b1)
+        if not anchors:
+            found = myers_blocks(a, b, a0, a1, b0, b1, cancel)
+            if found is not None:
+                blocks.extend(found)
+            continue
+
+        for i, j in anchors:
+            blocks.append((i, j, 1))
+            regions.append((a0, i, b0, j))
+            a0, b0 = i+1, j+1
+        regions.append((a0, a1, b0, b1))
+
+    # sort and join adjacent blocks
+    blocks.sort()
+    joined = []
+    for i, j, size in blocks:
+        if joined:
+            last_i, last_j, last_size = joined[-1]
+            if last_i+last_size == i and last_j+last_size == j:
+                joined[-1] = (last_i, last_j, last_size+size)
+                continue
+        joined.append((i, j, size))
+    return joined
+
+
+def opcodes(a, b, cancel=None):
+    """ Return the operations turning a into b,
+    in the format of SequenceMatcher.get_opcodes.
+    """
+    codes = []
+    i = j = 0
+    blocks = matching_blocks(a, b, cancel)
+    for ai, bj, size in blocks+[(len(a), len(b), 0)]:
+        tag = ''
+        if i < ai and j < bj:
+            tag = 'replace'
+        elif i < ai:
+            tag = 'delete'
+        elif j < bj:
+            tag = 'insert'
+        if tag:
+            codes.append((tag, i, ai, j, bj))
+        i, j = ai+size, bj+size
+        if size:
+            codes.append(('equal', ai, i, bj, j))
+    return codes
+
+
+def grouped_opcodes(codes, n=3):
+    """ Split opcodes into groups of changes with
+    up to n lines of context, like
+    SequenceMatcher.get_grouped_opcodes.
+    """
+    codes = list(codes)
+    if not codes:
+        codes = [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2-n), i2, max(j1, j2-n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1+n), j1, min(j2, j1+n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2-i1 > n*2:
+            group.append((tag, i1, min(i2, i1+n), j1, min(j2, j1+n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2-n), max(j1, j2-n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def format_range_context(start, stop):
+    beginning = start+1
+    length = stop-start
+    if not length:
+        beginning -= 1
+    if length <= 1:
+        return '{0}'.format(beginning)
+    return '{0},{1}'.format(beginning, beginning+length-1)
+
+
+def context_diff(a, b, n=3, cancel=None):
+    """ Generate the lines of a context diff
+    between the lists of lines a and b, in the
+    same format as difflib.context_diff(a, b, n=n).
+    """
+    prefix = {
+        'insert'  : '+ ',
+        'delete'  : '- ',
+        'replace' : '! ',
+        'equal'   : '  ',
+    }
+    started = False
+    for group in grouped_opcodes(opcodes(a, b, cancel), n):
+        check_cancelled(cancel)
+        if not started:
+            started = True
+            yield '*** \n'
+            yield '--- \n'
+
+        first, last = group[0], group[-1]
+        yield '***************\n'
+        yield '*** {0} ****\n'.format(
+            format_range_context(first[1], last[2])
+        )
+        if any(tag in ('replace', 'delete') for tag, _, _, _, _ in group):
+            for tag, i1, i2, _, _ in group:
+                if tag != 'insert':
+                    for line in a[i1:i2]:
+                        yield prefix[tag]+line
+        yield '--- {0} ----\n'.format(
+            format_range_context(first[3], last[4])
+        )
+        if any(tag in ('replace', 'insert') for tag, _, _, _, _ in group):
+            for tag, _, _, j1, j2 in group:
+                if tag != 'delete':
+                    for line in b[j1:j2]:
+                        yield prefix[tag]+line
@@ -0,0 +1,191 @@
+"""
+Recording how long completion takes on each key press.
+
+When enabled (by setting PYTHONEDITOR_COMPLETION_TIMING,
+or with enable()), a record is made for each key press
+handled by the AutoCompleter, with:
+- total: the time from the key press to the end of its
+  handling (including inserting the text).
+- popup: the time from the key press until the popup was
+  last shown or updated for it, including completions
+  added by deferred providers after the key press was
+  handled, or None if it was not.
+- stages: the time spent in each of STAGES:
+  words (finding the text to complete), candidates
+  (running the completion providers), set_list and
+  show_popup.
+
+The records (with the key and text of each key press,
+so that they can be replayed) can be saved as json, and
+summarised as percentiles. When disabled, the cost of
+each stage is a function call and a check.
+
+No Qt objects are used.
+"""
+import os
+import json
+import time
+from collections import deque
+
+
+STAGES = ('words', 'candidates', 'set_list', 'show_popup')
+# number of key presses recorded.
+MAX_RECORDS = 10000
+PERCENTILES = (50, 95, 99)
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    # python 2
+    clock = time.time
+
+
+class NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage(object):
+    """ Adds the time spent in a with
+    block to a stage of a record.
+    """
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *args):
+        stages = self.record['stages']
+        stages[self.name] = stages.get(self.name, 0.0)+clock()-self.start
+        return False
+
+
+class LatencyRecorder(object):
+    """ The timings of the last MAX_RECORDS key presses.
+    Stages timed after a key press was handled (by the
+    deferred providers) are added to its record.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = deque(maxlen=MAX_RECORDS)
+        self.current = None
+        self.start = None
+
+    def begin(self, key, text):
+        if not self.enabled:
+            return
+        self.start = clock()
+        self.current = {
+            'key'    : key,
+            'text'   : text,
+            'total'  : None,
+            'popup'  : None,
+            'stages' : {},
+        }
+        self.records.append(self.current)
+
+    def end(self):
+        if self.current is None or self.current['total'] is not None:
+            return
+        self.current['total'] = clock()-self.start
+
+    def stage(self, name):
+        """ Return a context manager timing a
+        stage of the current key press.
+        """
+        if not self.enabled or self.current is None:
+            return NULL_STAGE
+        return Stage(self.current, name)
+
+    def popup_shown(self):
+        if not self.enabled or self.current is None:
+            return
+        self.current['popup'] = clock()-self.start
+
+    def clear(self):
+        self.records.clear()
+        self.current = None
+
+    def save(self, path):
+        """ Write the records as json. """
+        with open(path, 'w') as f:
+            json.dump(list(self.records), f, indent=1)
+
+    def summary(self):
+        """ Return the percentiles (in milliseconds) of
+        the total and popup times, and of each stage
+        over the key presses that ran it.
+        """
+        records = list(self.records)
+        result = {
+            'keys'   : len(records),
+            'total'  : percentiles(
+                [r['total'] for r in records if r['total'] is not None]
+            ),
+            'popup'  : percentiles(
+                [r['popup'] for r in records if r['popup'] is not None]
+            ),
+            'stages' : {},
+        }
+        for name in STAGES:
+            result['stages'][name] = percentiles([
+                r['stages'][name] for r in records
+                if name in r['stages']
+            ])
+        return result
+
+
+def percentile(values, p):
+    """ Return the p-th percentile of the sorted
+    list values, by the nearest rank method.
+    """
+    rank = max(int(-(-len(values)*p//100)), 1)
+    return values[rank-1]
+
+
+def percentiles(times):
+    """ Return {'count': n, 'p50': ms, ...} of times,
+    given in seconds, for each of PERCENTILES.
+    """
+    times = sorted(t*1000 for t in times)
+    result = {'count': len(times)}
+    for p in PERCENTILES:
+        key = 'p{0}'.format(p)
+        result[key] = percentile(times, p) if times else None
+    return result
+
+
+RECORDER = LatencyRecorder(
+    enabled=bool(os.getenv('PYTHONEDITOR_COMPLETION_TIMING'))
+)
+
+
+def enable(enabled=True):
+    RECORDER.enabled = enabled
+    if not enabled:
+        RECORDER.current = None
+
+
+def begin(key, text):
+    RECORDER.begin(key, text)
+
+
+def end():
+    RECORDER.end()
+
+
+def stage(name):
+    return RECORDER.stage(name)
+
+
+def popup_shown():
+    RECORDER.popup_shown()
@@ -0,0 +1,255 @@
+"""
+Pure python line tokenizer for syntax highlighting.
+
+A Lexer is built from an ordered list of rules and
+returns, for a line of text, the ranges of the line
+and the name of the style each range should get.
+Like the QRegExp rules it replaces, a later rule
+overrides the styles set by earlier ones where they
+overlap, so the result is the same as applying each
+rule in turn - but the many keyword rules are
+collapsed into a single lookup of each word, so a
+line is scanned a handful of times rather than once
+per keyword.
+
+Strings and comments are found separately, by
+scan_strings, which carries the state of strings
+that span lines from one line to the next, and
+are applied over the rule styles.
+
+No Qt objects are used, so lines can be lexed on a
+background thread.
+"""
+import re
+from itertools import groupby
+
+
+# line states, see scan_strings. The triple-quoted
+# states match those of the QRegExp highlighter.
+NORMAL = 0
+IN_TRIPLE_SINGLE = 1
+IN_TRIPLE_DOUBLE = 2
+IN_SINGLE = 3
+IN_DOUBLE = 4
+STATE_QUOTES = {
+    IN_TRIPLE_SINGLE : "'''",
+    IN_TRIPLE_DOUBLE : '"""',
+    IN_SINGLE        : "'",
+    IN_DOUBLE        : '"',
+}
+QUOTE_STATES = dict((q, s) for s, q in STATE_QUOTES.items())
+
+# triple-quoted strings are shown as comments
+STRING_STYLES = {
+    "'''" : 'comment',
+    '"""' : 'comment',
+    "'"   : 'string',
+    '"'   : 'string',
+}
+
+STRING_OR_COMMENT = re.compile(r'[#\'"]')
+STRING_PREFIX = re.compile(r'(?<!\w)[rRbBuUfF]{1,2}$')
+
+
+def string_end_patterns():
+    """ For each quote, a pattern finding escapes, the
+    closing quote and, for f-strings, braces.
+    """
+    patterns = {}
+    for quote in STATE_QUOTES.values():
+        closing = re.escape(quote)
+        patterns[quote, False] = re.compile(
+            r'\\.|\\$|'+closing
+        )
+        patterns[quote, True] = re.compile(
+            r'\\.|\\$|'+closing+r'|\{\{|\}\}|\{'
+        )
+    return patterns
+
+
+STRING_END_PATTERNS = string_end_patterns()
+EXPRESSION_PATTERN = re.compile(r'[{}\'"]')
+
+
+def find_string_end(text, start, quote, fstring=False):
+    """ Return the index after the quote closing a
+    string whose contents begin at start, or None if
+    the string does not end on this line. Escaped
+    quotes are skipped and, in f-strings, so are the
+    quotes inside {expressions}.
+    """
+    pattern = STRING_END_PATTERNS[quote, fstring]
+    index = start
+    while True:
+        match = pattern.search(text, index)
+        if match is None:
+            return None
+        token = match.group()
+        if token == quote:
+            return match.end()
+        if token == '\\':
+            # a backslash at the end of the line
+            return None
+        index = match.end()
+        if token == '{':
+            index = skip_expression(text, index)
+            if index is None:
+                return None
+
+
+def skip_expression(text, start):
+    """ Return the index after the brace closing
+    an f-string expression, or None.
+    """
+    depth = 1
+    index = start
+    while True:
+        match = EXPRESSION_PATTERN.search(text, index)
+        if match is None:
+            return None
+        token = match.group()
+        index = match.end()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                return index
+        else:
+            quote = token
+            if text.startswith(token*3, match.start()):
+                quote = token*3
+            index = find_string_end(
+                text, match.start()+len(quote), quote
+            )
+            if index is None:
+                return None
+
+
+def scan_strings(text, state=NORMAL):
+    """ Find the strings and comments in a line.
+
+    :param state: the state at the end of the previous
+                  line, one of NORMAL, IN_TRIPLE_SINGLE,
+                  IN_TRIPLE_DOUBLE, IN_SINGLE or IN_DOUBLE
+                  (for strings continued with a backslash).
+    :return: `tuple` (ranges, state) where ranges is a
+             list of (start, length, style name).
+    """
+    result = []
+    length = len(text)
+    index = 0
+    quote = STATE_QUOTES.get(state)
+    if quote is not None:
+        end = find_string_end(text, 0, quote)
+        if end is None:
+            if length:
+                result.append((0, length, STRING_STYLES[quote]))
+            if len(quote) == 3 or text.endswith('\\'):
+                return result, state
+            return result, NORMAL
+        if end:
+            result.append((0, end, STRING_STYLES[quote]))
+        index = end
+
+    while True:
+        match = STRING_OR_COMMENT.search(text, index)
+        if match is None:
+            return result, NORMAL
+        start = match.start()
+        token = match.group()
+        if token == '#':
+            result.append((start, length-start, 'comment'))
+            return result, NORMAL
+
+        quote = token
+        if text.startswith(token*3, start):
+            quote = token*3
+        prefix = STRING_PREFIX.search(text, max(start-3, 0), start)
+        fstring = prefix is not None and 'f' in prefix.group().lower()
+        end = find_string_end(text, start+len(quote), quote, fstring)
+        if end is None:
+            result.append((start, length-start, STRING_STYLES[quote]))
+            if len(quote) == 3 or text.endswith('\\'):
+                return result, QUOTE_STATES[quote]
+            return result, NORMAL
+        result.append((start, end-start, STRING_STYLES[quote]))
+        index = end
+
+
+class Lexer(object):
+    """ Applies rules of the form (pattern, nth, style),
+    where style is either the name of a style given to
+    group nth of every match of pattern, or a dict of
+    {matched text: style name} for rules that give a
+    different style to each word they match.
+    """
+    def __init__(self, rules):
+        self.rules = [
+            (re.compile(pattern), nth, style)
+            for pattern, nth, style in rules
+        ]
+
+    def styles(self, text):
+        """ Return the styles of a line as a list of
+        (start, length, style name) ranges, in order.
+        """
+        if not text:
+            return []
+        return ranges(self.style_list(text))
+
+    def line_styles(self, text, state=NORMAL):
+        """ Return the styles of a line including its
+        strings and comments, given the state at the
+        end of the previous line.
+
+        :return: `tuple` (ranges, state at the end of the line)
+        """
+        strings, state = scan_strings(text, state)
+        if not strings:
+            return self.styles(text), state
+        start, length, style = strings[0]
+        if length == len(text):
+            # the whole line is inside a string
+            return strings, state
+        styles = self.style_list(text)
+        for start, length, style in strings:
+            styles[start:start+length] = [style]*length
+        return ranges(styles), state
+
+    def style_list(self, text):
+        """ Return a list with the name of the
+        style of each character, or None.
+        """
+        length = len(text)
+        styles = [None]*length
+        for expression, nth, style in self.rules:
+            search = expression.search
+            is_lookup = isinstance(style, dict)
+            match = search(text)
+            while match is not None:
+                start, end = match.span(nth)
+                if is_lookup:
+                    name = style.get(match.group(nth))
+                else:
+                    name = style
+                if name is not None and end > start:
+                    styles[start:end] = [name]*(end-start)
+                # continue from the end of group nth,
+                # as QRegExp.indexIn loops did.
+                match = search(text, max(end, match.start()+1))
+        return styles
+
+
+def ranges(styles):
+    """ Turn a list with a style name (or None)
+    per character into (start, length, style) runs.
+    """
+    result = []
+    start = 0
+    for style, run in groupby(styles):
+        length = len(list(run))
+        if style is not None:
+            result.append((start, length, style))
+        start += length
+    return result
@@ -0,0 +1,469 @@
+"""
+An index of the names of importable modules and of the
+names defined at the top level of each, for completing
+import statements without importing anything.
+
+The modules on each sys.path entry are listed with pkgutil,
+and the source of each top-level module (or package
+__init__.py) is parsed with the astindex, on a background
+thread. The index is saved to MODULE_CACHE, with the
+modification time of each entry (whose listing is kept
+until a module is added to or removed from it) and of each
+source file (whose names are kept until it is changed), so
+that in later sessions only what changed is read again.
+Modules within packages are listed, and their sources
+parsed, when they are first completed: also on a
+background thread, which calls back when they are
+read, so completing never waits for them.
+
+No Qt objects are used.
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import pkgutil
+import tempfile
+import threading
+from bisect import bisect_left
+
+from PythonEditor.utils import astindex
+from PythonEditor.utils import attributes
+from PythonEditor.utils.constants import NUKE_DIR
+
+
+MODULE_CACHE = os.getenv(
+    'PYTHONEDITOR_MODULE_CACHE',
+    os.path.join(
+        NUKE_DIR,
+        'PythonEditor_modules_py{0}.json'.format(sys.version_info[0])
+    )
+)
+# changed when the format of the cache changes.
+CACHE_VERSION = 1
+# source files larger than this (in bytes) are not parsed.
+MAX_SOURCE_SIZE = 1024*1024
+
+# the text before the cursor in an import statement,
+# where module names are completed: e.g. "import a, b.c"
+# or "from b.c"; the group is the dotted name typed so far.
+IMPORT_MODULE = re.compile(
+    r'^\s*(?:import\s+(?:[\w.]+(?:\s+as\s+\w+)?\s*,\s*)*|from\s+)([\w.]*)$'
+)
+# and where names in a module are completed: e.g.
+# "from b.c import d as e, f"; the groups are the
+# module and the name typed so far.
+IMPORT_NAME = re.compile(
+    r'^\s*from\s+([\w.]+)\s+import\s+\(?\s*'
+    r'(?:\w+(?:\s+as\s+\w+)?\s*,\s*)*(\w*)$'
+)
+
+
+def modification_time(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+def replace_file(src, dst):
+    """ Rename src to dst, replacing dst.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    if os.name == 'nt' and os.path.exists(dst):
+        # python 2 on windows cannot rename over a file
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+def source_file(directory, name, is_package):
+    """ Return the python source of the module name
+    in directory, or None (e.g. for extensions).
+    """
+    if is_package:
+        path = os.path.join(directory, name, '__init__.py')
+    else:
+        path = os.path.join(directory, name+'.py')
+    if os.path.isfile(path):
+        return path
+    return None
+
+
+def list_modules(entry):
+    """ Return {name: [source file or None, is package]}
+    of the modules in a sys.path entry or package directory.
+    """
+    modules = {}
+    try:
+        found = list(pkgutil.iter_modules([entry]))
+    except Exception:
+        # e.g. unreadable directories
+        return modules
+    is_directory = os.path.isdir(entry)
+    for info in found:
+        name, is_package = info[1], info[2]
+        path = None
+        if is_directory:
+            path = source_file(entry, name, is_package)
+        modules[name] = [path, bool(is_package)]
+    return modules
+
+
+def read_names(path, parser=None):
+    """ Return the sorted names defined at the top
+    level of the python source file path.
+    """
+    try:
+        if os.path.getsize(path) > MAX_SOURCE_SIZE:
+            return []
+        with io.open(path, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except (IOError, OSError):
+        return []
+    if parser is None:
+        parser = astindex.StatementParser()
+    return parser.index(text).module_names
+
+
+def with_prefix(names, prefix):
+    """ Return the names in the sorted
+    list names that start with prefix.
+    """
+    index = bisect_left(names, prefix)
+    result = []
+    for name in names[index:]:
+        if not name.startswith(prefix):
+            break
+        result.append(name)
+    return result
+
+
+def import_context(text):
+    """ Return (module, prefix) if text (the line before
+    the cursor) is in an import statement, where module
+    is the module whose names are completed, or '' if
+    module names are, and prefix the name typed so far.
+    Return None otherwise.
+    """
+    match = IMPORT_NAME.match(text)
+    if match is not None:
+        return match.group(1), match.group(2)
+    match = IMPORT_MODULE.match(text)
+    if match is not None:
+        return '', match.group(1)
+    return None
+
+
+class ModuleIndex(object):
+    """ The names of importable modules and
+    of the names defined in them.
+    """
+    def __init__(self, cache_path=MODULE_CACHE):
+        self.cache_path = cache_path
+        # {entry: {'mtime': time, 'modules': modules}}
+        self.entries = {}
+        # {source file: {'mtime': time, 'names': names}}
+        self.files = {}
+        # {module name: [source file, is package]}, for the
+        # top-level modules, including builtin modules.
+        self.modules = {}
+        self.names = []
+        # {package: modules}, listed when first completed.
+        self.packages = {}
+        self.path = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        # so that a save started later never
+        # writes an older copy of the index.
+        self._save_lock = threading.Lock()
+        self._thread = None
+        # sources to parse and packages to list on the
+        # reader thread, and what to call when they are.
+        self._jobs = []
+        self._callbacks = []
+        self._jobs_lock = threading.Lock()
+        self._reader = None
+
+    def start(self):
+        """ Index the modules on sys.path on a background
+        thread, unless it is being or has been done.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.path == sys.path:
+            return
+        path = list(sys.path)
+        self.path = path
+        self._thread = threading.Thread(
+            target=self.run,
+            args=(path,),
+            name='PythonEditorModuleIndex'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def run(self, path):
+        if not self.entries:
+            self.load()
+
+        entries = {}
+        modules = {}
+        for entry in path:
+            entry = os.path.abspath(entry or os.curdir)
+            if entry in entries:
+                continue
+            mtime = modification_time(entry)
+            cached = self.entries.get(entry)
+            if cached is not None and cached['mtime'] == mtime:
+                listing = cached['modules']
+            else:
+                listing = list_modules(entry)
+            entries[entry] = {'mtime': mtime, 'modules': listing}
+            for name, module in listing.items():
+                modules.setdefault(name, module)
+        for name in sys.builtin_module_names:
+            modules.setdefault(name, [None, False])
+
+        self.entries = entries
+        self.modules = modules
+        self.names = sorted(modules)
+        self.packages = {}
+
+        parser = astindex.StatementParser()
+        for name in self.names:
+            source = modules[name][0]
+            if source is not None:
+                self.source_names(source, parser)
+                # let the GUI thread run between files.
+                time.sleep(0)
+        self.ready.set()
+        self.forget_files()
+        self.save()
+
+    def load(self):
+        """ Read the index saved by a previous session. """
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('version') != CACHE_VERSION:
+            return
+        with self._lock:
+            self.entries = data.get('entries', {})
+            self.files = data.get('files', {})
+
+    def save(self):
+        """ Write the index for the next session, to a
+        temporary file renamed over the cache, so that
+        a session reading it (or one interrupted while
+        writing it) never finds it half written.
+        """
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps({
+                    'version' : CACHE_VERSION,
+                    'entries' : self.entries,
+                    'files'   : self.files,
+                })
+            temp_path = None
+            try:
+                # one for each session, should two save at once.
+                handle, temp_path = tempfile.mkstemp(
+                    prefix=os.path.basename(self.cache_path),
+                    suffix='.tmp',
+                    dir=os.path.dirname(self.cache_path) or None
+                )
+                with os.fdopen(handle, 'w') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                replace_file(temp_path, self.cache_path)
+            except (IOError, OSError):
+                if temp_path is not None and os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+
+    def forget_files(self):
+        """ Drop the names of source files that are gone
+        or no longer in any indexed sys.path entry, so
+        that the cache does not keep growing.
+        """
+        roots = tuple(os.path.join(entry, '') for entry in self.entries)
+        with self._lock:
+            self.files = dict(
+                (path, cached) for path, cached in self.files.items()
+                if path.startswith(roots) and os.path.isfile(path)
+            )
+
+    def read_later(self, job, callback):
+        """ Parse a source file, for a job ('source', path),
+        or list a package directory, for ('package', directory),
+        on the reader thread, which calls callback (with no
+        arguments) once it has nothing left to read.
+        """
+        with self._jobs_lock:
+            if job not in self._jobs:
+                self._jobs.append(job)
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+            if self._reader is not None:
+                return
+            self._reader = threading.Thread(
+                target=self.read_jobs,
+                name='PythonEditorModuleReader'
+            )
+            self._reader.daemon = True
+            self._reader.start()
+
+    def read_jobs(self):
+        parser = astindex.StatementParser()
+        while True:
+            with self._jobs_lock:
+                if not self._jobs:
+                    callbacks = self._callbacks
+                    self._callbacks = []
+                    self._reader = None
+                    break
+                kind, path = self._jobs.pop(0)
+            if kind == 'source':
+                self.source_names(path, parser)
+            else:
+                self.packages[path] = list_modules(path)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # e.g. its editor has been deleted
+                pass
+        self.save()
+
+    def source_names(self, path, parser=None, callback=None):
+        """ Return the names defined in the source file
+        path, parsing it if it changed since it was last
+        parsed. If callback is given, it is parsed on the
+        reader thread instead (see read_later), and None is
+        returned until it is.
+        """
+        mtime = modification_time(path)
+        cached = self.files.get(path)
+        if cached is not None and cached['mtime'] == mtime:
+            return cached['names']
+        if callback is not None:
+            self.read_later(('source', path), callback)
+            return None
+        names = read_names(path, parser)
+        with self._lock:
+            self.files[path] = {'mtime': mtime, 'names': names}
+        return names
+
+    def find_module(self, name, callback=None):
+        """ Return [source file, is package] of the
+        module called name (which may be dotted),
+        or None if it is not in the index (or, if
+        callback is given, its package is not listed).
+        """
+        parts = name.split('.')
+        module = self.modules.get(parts[0])
+        for part in parts[1:]:
+            if module is None:
+                return None
+            submodules = self.submodules_of(module, callback)
+            if submodules is None:
+                return None
+            module = submodules.get(part)
+        return module
+
+    def submodules_of(self, module, callback=None):
+        """ Return the modules in a package, listing them
+        if they have not been. If callback is given, they are
+        listed on the reader thread instead (see read_later),
+        and None is returned until they are.
+        """
+        path, is_package = module
+        if not (path and is_package):
+            return {}
+        directory = os.path.dirname(path)
+        submodules = self.packages.get(directory)
+        if submodules is None:
+            if callback is not None:
+                self.read_later(('package', directory), callback)
+                return None
+            submodules = self.packages[directory] = list_modules(directory)
+        return submodules
+
+    def module_names(self, dotted, callback=None):
+        """ Return the sorted names of the modules to complete
+        the dotted name typed so far, e.g. those in package a
+        for 'a.b', or the top-level modules for 'b'.
+        """
+        package, _, prefix = dotted.rpartition('.')
+        if not package:
+            return with_prefix(self.names, prefix)
+        module = self.find_module(package, callback)
+        if module is None:
+            return []
+        submodules = self.submodules_of(module, callback)
+        return with_prefix(sorted(submodules or ()), prefix)
+
+    def names_in(self, name, prefix='', callback=None):
+        """ Return the sorted names that can be imported
+        from the module called name: those defined at its
+        top level and, for packages, the modules in them.
+        Modules that are already loaded (such as extensions,
+        which have no source) are listed with dir().
+        If callback is given, those of the names that have
+        not been read yet are left out (see read_later).
+        """
+        loaded = sys.modules.get(name)
+        module = self.find_module(name, callback)
+        names = set()
+        if module is not None:
+            if module[0] is not None:
+                names.update(
+                    self.source_names(module[0], callback=callback) or ()
+                )
+            names.update(self.submodules_of(module, callback) or ())
+        if loaded is not None:
+            names.update(attributes.attribute_names(loaded))
+        return attributes.order(with_prefix(sorted(names), prefix))
+
+    def complete(self, text, callback=None):
+        """ Return the completions of the import statement
+        before the cursor, text, or None if text is not in
+        an import statement. If callback is given, nothing
+        is read on the calling thread: the sources and
+        packages not yet read are read on the reader thread,
+        which calls callback once they are, so that it can
+        complete again.
+        """
+        context = import_context(text)
+        if context is None:
+            return None
+        module, prefix = context
+        if module:
+            return self.names_in(module, prefix, callback)
+        return self.module_names(prefix, callback)
+
+
+MODULE_INDEX = None
+
+
+def get_module_index():
+    """ Return the ModuleIndex, starting to
+    index sys.path if it changed.
+    """
+    global MODULE_INDEX
+    if MODULE_INDEX is None:
+        MODULE_INDEX = ModuleIndex()
+    MODULE_INDEX.start()
+    return MODULE_INDEX
@@ -0,0 +1,169 @@
+"""
+Gathering completions from providers within a time budget.
+
+A completion Request asks each of its providers in turn
+for completions. Cheap providers (those reading the
+document, its source index, snippets, keywords and
+builtins) are run as soon as the request is made, so that
+their results can be shown at once. The others (those
+reading the __main__ namespace or the attributes of live
+objects, whose __getattr__ may be slow, as on some Nuke
+objects) are run afterwards, a step at a time, between
+which key presses can be handled and the request cancelled.
+
+A provider is a function that takes the completions found
+so far and returns an iterator of updated lists of
+completions. Between items, the time it has taken is
+checked, and once it is over its budget it is stopped and
+its last list of completions kept. Providers that touch
+live objects are run on the thread that made the request,
+as Nuke's objects may only be used from the main thread.
+
+The budget can only stop a provider between items, so
+providers yield (None, for no change) between calls that
+may be slow: the object provider yields after getting
+each attribute of a dotted name, and again after listing
+the attributes of the object, before ranking them. A
+single call cannot be interrupted, so one slow __getattr__
+or __dir__ still holds up the event loop for as long as
+it takes.
+
+No Qt objects are used.
+"""
+import os
+import time
+
+
+# seconds a provider may run before it is stopped.
+PROVIDER_BUDGET = float(os.getenv(
+    'PYTHONEDITOR_PROVIDER_BUDGET', 0.2
+))
+# seconds each step of the deferred providers may run
+# for before control goes back to the event loop.
+STEP_BUDGET = 0.01
+
+
+class Provider(object):
+    """ A named source of completions.
+
+    :param function: takes the completions found so far
+                     and returns an iterator of lists of
+                     completions, each replacing the last.
+    :param cheap: if True, it is run as soon as the request
+                  is made, before any deferred providers.
+    """
+    def __init__(self, name, function, cheap=False, budget=None):
+        self.name = name
+        self.function = function
+        self.cheap = cheap
+        if budget is None:
+            budget = PROVIDER_BUDGET
+        self.budget = budget
+
+    def __repr__(self):
+        return '<Provider {0}>'.format(self.name)
+
+
+class Request(object):
+    """ The completions gathered from providers for
+    one key press, cheap providers first.
+    """
+    def __init__(self, providers, clock=time.time):
+        self.providers = (
+            [provider for provider in providers if provider.cheap]
+            + [provider for provider in providers if not provider.cheap]
+        )
+        self.clock = clock
+        self.completions = []
+        self.cancelled = False
+        # the names of providers that were stopped
+        # for running over their budget, or failed.
+        self.expired = []
+        self.failed = []
+        # [provider, iterator, seconds taken]
+        self._running = None
+
+    @property
+    def done(self):
+        return self.cancelled or not (self.providers or self._running)
+
+    def cancel(self):
+        self.cancelled = True
+        self.stop()
+
+    def stop(self):
+        if self._running is None:
+            return
+        iterator = self._running[1]
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+        self._running = None
+
+    def run_cheap(self):
+        """ Run the cheap providers to the end (or until
+        they are over their budget). Return True if the
+        completions changed.
+        """
+        changed = False
+        while not self.done:
+            running = self._running
+            if running is None and not self.providers[0].cheap:
+                break
+            if running is not None and not running[0].cheap:
+                break
+            changed = self.advance() or changed
+        return changed
+
+    def step(self, budget=STEP_BUDGET):
+        """ Run the providers for about budget seconds.
+        Return True if the completions changed.
+        """
+        deadline = self.clock()+budget
+        changed = False
+        while not self.done:
+            changed = self.advance() or changed
+            if self.clock() >= deadline:
+                break
+        return changed
+
+    def advance(self):
+        """ Get the next list of completions from the
+        running provider, starting the next provider
+        if none is running. Return True if the
+        completions changed.
+        """
+        if self._running is None:
+            provider = self.providers.pop(0)
+            start = self.clock()
+            try:
+                iterator = iter(provider.function(list(self.completions)))
+            except Exception:
+                self.failed.append(provider.name)
+                return False
+            self._running = [provider, iterator, self.clock()-start]
+
+        running = self._running
+        provider, iterator = running[0], running[1]
+        start = self.clock()
+        try:
+            completions = next(iterator)
+        except StopIteration:
+            self._running = None
+            return False
+        except Exception:
+            # e.g. an object's __getattr__ raising
+            self.failed.append(provider.name)
+            self._running = None
+            return False
+        finally:
+            running[2] += self.clock()-start
+
+        changed = False
+        if completions is not None and completions != self.completions:
+            self.completions = list(completions)
+            changed = True
+        if running[2] > provider.budget and self._running is running:
+            self.expired.append(provider.name)
+            self.stop()
+        return changed
@@ -98,11 +98,12 @@ def save_tab(folder, name, tabs, tab_index):
     Set the tab path property, then save.
     """
     file = name.split('.')[0] + '.py'
+    text = tabs.load_text(tab_index)
     data = tabs.tabData(tab_index)
     path = os.path.join(folder, file)
     data['path'] = path
     tabs.setTabData(tab_index, data)
-    save(data['text'], path)
+    save(text, path)
     return path
 
 
@@ -153,11 +154,10 @@ def export_all_tabs_to_external_editor(tabs):
     folder = os.path.dirname(path)
 
     for i in range(tabs.count()):
-        data = tabs.tabData(i)
         name = tabs.tabText(i)
         filename = name.split('.')[0] + '.py'
         path = os.path.join(folder, filename)
-        text = data['text']
+        text = tabs.load_text(i)
         if not text:
             print('No text found for tab %s, it will not be saved' % name)
             continue
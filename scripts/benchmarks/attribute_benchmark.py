@@ -0,0 +1,199 @@
+""" Benchmark finding the object before a dot and
+listing its attributes, as done for completion on
+each '.' keystroke.
+
+For each case, e.g. 'nuke.' and 'node.', both of
+the following are timed:
+- previous: copying the __main__ namespace, exec'ing
+  the dotted name, dir() and sorting lowercase names
+  first, as AutoCompleter used to.
+- cached: attributes.resolve_name and
+  attributes.attribute_names.
+
+Inside Nuke (or with nuke importable, e.g. from
+nuke -t) the real nuke module, a Blur node and its
+size knob are used. Otherwise, stand-ins of similar
+size are made. Each measurement is repeated and the
+minimum, median and maximum are reported, in
+milliseconds, as json:
+
+    python scripts/benchmarks/attribute_benchmark.py --output attributes.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import types
+import platform
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import attributes
+from PythonEditor._version import __version__
+
+
+# roughly the number of names in nuke and on its classes.
+MODULE_NAMES = 1500
+NODE_METHODS = 120
+KNOB_METHODS = 80
+# number of names in __main__ in a typical session.
+MAIN_NAMES = 2000
+
+
+def stand_in_namespace():
+    """ Return a namespace like that of a Nuke session,
+    with a nuke module, a node and a knob.
+    """
+    def method(self):
+        pass
+
+    knob_class = type('Knob', (object,), dict(
+        ('knobMethod{0}'.format(i), method)
+        for i in range(KNOB_METHODS)
+    ))
+    node_class = type('Node', (object,), dict(
+        ('nodeMethod{0}'.format(i), method)
+        for i in range(NODE_METHODS)
+    ))
+    group_class = type('Group', (node_class,), dict(
+        ('groupMethod{0}'.format(i), method)
+        for i in range(NODE_METHODS//4)
+    ))
+
+    nuke = types.ModuleType('nuke')
+    for i in range(MODULE_NAMES):
+        setattr(nuke, 'function{0}'.format(i), len)
+    nuke.Node = node_class
+    nuke.Group = group_class
+    nuke.Knob = knob_class
+
+    namespace = dict(
+        ('name{0}'.format(i), i) for i in range(MAIN_NAMES)
+    )
+    namespace['nuke'] = nuke
+    namespace['node'] = group_class()
+    namespace['knob'] = knob_class()
+    return namespace
+
+
+def nuke_namespace():
+    """ Return a namespace with the real nuke module,
+    or None if it cannot be imported.
+    """
+    try:
+        import nuke
+        node = nuke.nodes.Blur()
+    except Exception:
+        return None
+    namespace = stand_in_namespace()
+    namespace['nuke'] = nuke
+    namespace['node'] = node
+    namespace['knob'] = node['size']
+    return namespace
+
+
+def previous_completion(text, namespace):
+    """ Find and list the attributes the
+    way AutoCompleter used to.
+    """
+    app_namespace = namespace.copy()
+    _obj = app_namespace.get(text)
+    if _obj is None:
+        _ = {}
+        exec('_obj = '+text, app_namespace, _)
+        _obj = _.get('_obj')
+    attrs = dir(_obj)
+    methods = [a for a in attrs if a[0].islower()]
+    therest = [a for a in attrs if not a[0].islower()]
+    return methods+therest
+
+
+def cached_completion(text, namespace):
+    _obj = attributes.resolve_name(text, namespace)
+    return attributes.attribute_names(_obj)
+
+
+def summarise(times):
+    times = sorted(t*1000 for t in times)
+    return {
+        'min'    : times[0],
+        'median' : times[len(times)//2],
+        'max'    : times[-1],
+    }
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time()-start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--cases', nargs='+',
+        default=['nuke', 'node', 'knob', 'nuke.Node'],
+        help='the dotted names completed'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=200,
+        help='times each measurement is repeated'
+    )
+    parser.add_argument(
+        '--output', help='write the json here instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    namespace = nuke_namespace()
+    real_nuke = namespace is not None
+    if namespace is None:
+        namespace = stand_in_namespace()
+
+    results = []
+    for case in args.cases:
+        print('benchmarking {0}.'.format(case), file=sys.stderr)
+        same = (
+            previous_completion(case, namespace)
+            == cached_completion(case, namespace)
+        )
+        results.append({
+            'case'     : case+'.',
+            'names'    : len(cached_completion(case, namespace)),
+            'same'     : same,
+            'previous' : summarise([
+                timed(previous_completion, case, namespace)
+                for i in range(args.repeat)
+            ]),
+            'cached'   : summarise([
+                timed(cached_completion, case, namespace)
+                for i in range(args.repeat)
+            ]),
+        })
+
+    report = {
+        'benchmark' : 'attributes',
+        'version'   : __version__,
+        'nuke'      : real_nuke,
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results'   : results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+""" Benchmark the autosave as the number and size
+of tabs in the session grows.
+
+For each session size, a synthetic
+PythonEditorHistory.xml is written to a temporary
+directory and the following are timed:
+- restore: creating the AutoSaveManager, which
+  reads the autosave and loads the current tab.
+- save: autosaving one edited tab.
+- reorder: update_tab_index, moving the first
+  tab to the end.
+- close: removing one tab's autosave.
+- parsexml, writexml and remove_empty_autosaves.
+
+Saves are timed from the same start both as seen
+by the GUI thread (until autosave returns) and
+until the change is on disk (until store.flush
+returns). Each measurement is repeated and the
+minimum, median and maximum are reported, in
+seconds, as json.
+
+Runs without a display (QT_QPA_PLATFORM=offscreen):
+
+    python scripts/benchmarks/autosave_benchmark.py \\
+        --tabs 10 100 500 --sizes 1024 65536 5242880 \\
+        --output autosave.json
+
+Sessions larger than --max-session-size are
+skipped. Set PYTHONEDITOR_AUTOSAVE_BACKEND=sqlite
+to benchmark the sqlite backend.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import platform
+import argparse
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorBenchmark')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+os.environ['PYTHONEDITOR_AUTOSAVE_DB'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.db'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from xml.etree import cElementTree as ETree
+
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui import tabs
+from PythonEditor.ui.features import autosavexml
+from PythonEditor.ui.features import revisions
+from PythonEditor._version import __version__
+
+
+# characters that older versions of PythonEditor
+# wrote into the xml, making it unparseable.
+CONTROL_CHARACTERS = '\x01\x02\x08\x0b\x1b'
+SAMPLE_LINES = [
+    'import nuke\n',
+    'for node in nuke.selectedNodes():\n',
+    "    node['disable'].setValue(False)\n",
+    'def process(value, scale=1.0):\n',
+    '    return [v*scale for v in value]\n',
+    "print('done: {0}'.format(len(nuke.allNodes())))\n",
+    '# TODO: check the frame range\n',
+    '\n',
+]
+
+
+def synthetic_text(size, rng, control_characters=False):
+    """ Return roughly size characters of python-like text.
+    """
+    lines = []
+    length = 0
+    while length < size:
+        line = rng.choice(SAMPLE_LINES)
+        if control_characters and rng.random() < 0.01:
+            line = rng.choice(CONTROL_CHARACTERS)+line
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines)[:size]
+
+
+def write_session(tab_count, size, control_characters=False, seed=0):
+    """ Write a synthetic autosave with tab_count tabs
+    of size characters each. Control characters are
+    written as they are, as older versions did, so
+    the restore has to repair the file.
+    """
+    rng = random.Random(seed)
+    root = ETree.Element('script')
+    for i in range(tab_count):
+        sub = ETree.SubElement(root, 'subscript')
+        sub.attrib['uuid'] = 'benchmark-{0}'.format(i)
+        sub.attrib['name'] = 'tab_{0}.py'.format(i)
+        sub.attrib['tab_index'] = str(i)
+        sub.text = synthetic_text(size, rng, control_characters)
+    current_index = ETree.SubElement(root, 'current_index')
+    current_index.text = '0'
+    data = autosavexml.XML_HEADER+ETree.tostring(root).decode('utf-8')
+    with open(autosavexml.AUTOSAVE_FILE, 'wb') as f:
+        f.write(data.encode('utf-8'))
+
+
+def reset():
+    """ Remove the autosave files and forget the
+    stores, so the next restore starts from disk.
+    """
+    autosavexml.flush_stores()
+    revisions.flush_revision_stores()
+    autosavexml.STORES.clear()
+    revisions.REVISION_STORES.clear()
+    for name in os.listdir(TEMP_DIR):
+        path = os.path.join(TEMP_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def summarise(times):
+    times = sorted(times)
+    return {
+        'min'    : times[0],
+        'median' : times[len(times)//2],
+        'max'    : times[-1],
+    }
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time()-start
+
+
+def benchmark_session(tab_count, size, repeat, control_characters):
+    app = QtWidgets.QApplication.instance()
+    results = {}
+    def record(name, seconds):
+        results.setdefault(name, []).append(seconds)
+
+    for i in range(repeat):
+        reset()
+        write_session(tab_count, size, control_characters, seed=i)
+        tabeditor = tabs.TabEditor()
+
+        managers = []
+        record('restore', timed(lambda: managers.append(
+            autosavexml.AutoSaveManager(tabeditor)
+        )))
+        manager = managers[0]
+        store = manager.store
+        app.processEvents()
+
+        # one edited tab
+        editor = tabeditor.editor
+        text = editor.toPlainText()+'# edit {0}\n'.format(i)
+        editor.setPlainText(text)
+        tabeditor.tabs['text'] = text
+        editor.document().setModified(True)
+        start = time.time()
+        manager.autosave()
+        record('save', time.time()-start)
+        store.flush()
+        record('save_flushed', time.time()-start)
+
+        last = tabeditor.tabs.count()-1
+        def reorder():
+            manager.update_tab_index(0, last)
+            store.flush()
+        record('reorder', timed(reorder))
+
+        uid = tabeditor.tabs.tabData(last)['uuid']
+        def close():
+            manager.remove_subscript(uid)
+            store.flush()
+        record('close', timed(close))
+
+        root, subscripts = autosavexml.parsexml('subscript')
+        record('parsexml', timed(
+            lambda: autosavexml.parsexml('subscript')
+        ))
+        record('writexml', timed(
+            lambda: autosavexml.writexml(root)
+        ))
+        record('remove_empty_autosaves', timed(
+            autosavexml.remove_empty_autosaves
+        ))
+
+        tabeditor.deleteLater()
+        app.processEvents()
+
+    result = {
+        'tabs'               : tab_count,
+        'tab_size'           : size,
+        'control_characters' : control_characters,
+        'xml_size'           : None,
+        'timings'            : dict(
+            (name, summarise(times))
+            for name, times in results.items()
+        ),
+    }
+    if os.path.isfile(autosavexml.AUTOSAVE_FILE):
+        result['xml_size'] = os.path.getsize(autosavexml.AUTOSAVE_FILE)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--tabs', type=int, nargs='+', default=[10, 100, 500],
+        help='numbers of tabs in the session'
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+',
+        default=[1024, 64*1024, 5*1024*1024],
+        help='characters per tab'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='times each measurement is repeated'
+    )
+    parser.add_argument(
+        '--max-session-size', type=int, default=256*1024*1024,
+        help='skip sessions with more characters than this'
+    )
+    parser.add_argument(
+        '--output', help='write the json here instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv[:1])
+
+    sessions = []
+    try:
+        for tab_count in args.tabs:
+            for size in args.sizes:
+                if tab_count*size > args.max_session_size:
+                    continue
+                for control_characters in False, True:
+                    print(
+                        'benchmarking {0} tabs of {1} characters{2}'.format(
+                            tab_count, size,
+                            ' with control characters'*control_characters
+                        ), file=sys.stderr
+                    )
+                    sessions.append(benchmark_session(
+                        tab_count, size, args.repeat, control_characters
+                    ))
+    finally:
+        reset()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    report = {
+        'benchmark' : 'autosave',
+        'version'   : __version__,
+        'backend'   : os.getenv('PYTHONEDITOR_AUTOSAVE_BACKEND', 'xml'),
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sessions'  : sessions,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+""" Benchmark the fuzzy matching of completions
+as the number of candidate words grows.
+
+For each number of candidates, a list of synthetic
+identifiers (snake_case, camelCase and CapWords
+made of words common in Nuke scripts) is made, and
+the following are timed:
+- index: creating a FuzzyIndex and its match text.
+- update: replacing a word in the FuzzyIndex, as an
+  edit to the document does, then searching it for
+  the first needle.
+- search: FuzzyIndex.search for each needle.
+- complete: CompletionEngine.complete for each needle,
+  with the candidates split between the document,
+  globals and builtins, including the prefix lookup.
+- typing: FuzzyIndex.search for each key press as the
+  needle is typed (from its first two characters), as
+  each search narrows the next.
+
+Searches other than typing are timed from scratch,
+not narrowed by the search before, as for a needle
+pasted or completed all at once, with the indexes
+made beforehand, as the editor does once the document
+has been indexed (see CompletionEngine.prepare).
+
+The measurements whose median is over TARGET, the
+milliseconds aimed for per key press, are listed under
+over_target for each number of candidates.
+
+Each measurement is repeated and the minimum, median
+and maximum are reported, in milliseconds, as json.
+No display is needed:
+
+    python scripts/benchmarks/completion_benchmark.py \\
+        --candidates 1000 5000 50000 --output completion.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import completion
+from PythonEditor._version import __version__
+
+
+PARTS = [
+    'node', 'knob', 'value', 'get', 'set', 'selected', 'all',
+    'name', 'read', 'write', 'frame', 'render', 'color', 'matrix',
+    'transform', 'width', 'height', 'input', 'output', 'channel',
+    'layer', 'format', 'x', 'y',
+]
+NEEDLES = [
+    'ns', 'gkv', 'selnod', 'rdW', 'x', 'transformMatrix', 'qqq',
+]
+# milliseconds per key press aimed for.
+TARGET = 1.0
+
+
+def identifiers(count, seed=0):
+    """ Return a sorted list of count unique identifiers. """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        parts = [rng.choice(PARTS) for i in range(rng.randint(1, 4))]
+        style = rng.random()
+        if style < 0.4:
+            word = '_'.join(parts)
+        elif style < 0.8:
+            word = parts[0]+''.join(p.title() for p in parts[1:])
+        else:
+            word = ''.join(p.title() for p in parts)
+        if rng.random() < 0.3:
+            word += str(rng.randint(0, 99))
+        words.add(word)
+    return sorted(words)
+
+
+def summarise(times):
+    times = sorted(t*1000 for t in times)
+    return {
+        'min'    : times[0],
+        'median' : times[len(times)//2],
+        'max'    : times[-1],
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time()-start
+
+
+def forget_searches(*indexes):
+    """ Make the next searches of the
+    FuzzyIndexes start from scratch.
+    """
+    for index in indexes:
+        index.narrowed = None
+
+
+def benchmark_candidates(count, needles, repeat):
+    words = identifiers(count)
+
+    def make_index():
+        index = completion.FuzzyIndex(words)
+        index.segments()
+        return index
+    index = make_index()
+
+    def update(old, new):
+        index.update(added=[new], removed=[old])
+        index.search(needles[0])
+    edits = [
+        (word, word+'Edited') for word in words[:repeat]
+    ]
+    result = {
+        'candidates' : count,
+        'index'      : summarise(
+            [timed(make_index) for i in range(repeat)]
+        ),
+        'update'     : summarise(
+            [timed(update, old, new) for old, new in edits]
+        ),
+        'search'     : {},
+        'complete'   : {},
+        'typing'     : {},
+        'matches'    : {},
+    }
+
+    engine = completion.CompletionEngine()
+    engine.set_source(
+        completion.DOCUMENT,
+        words[::3],
+        lambda word: 1
+    )
+    engine.set_words(completion.GLOBAL, words[1::3])
+    engine.set_words(completion.BUILTIN, words[2::3])
+    # as done once the document is indexed
+    engine.prepare()
+
+    engine_indexes = [
+        cached[2] for cached in engine.fuzzy_indexes.values()
+    ]
+
+    def search(needle):
+        forget_searches(index)
+        return timed(index.search, needle)
+
+    def complete(needle):
+        forget_searches(*engine_indexes)
+        return timed(engine.complete, needle)
+
+    def typing(needle):
+        forget_searches(index)
+        return [
+            timed(index.search, needle[:length])
+            for length in range(2, len(needle)+1)
+        ]
+
+    for needle in needles:
+        result['search'][needle] = summarise([
+            search(needle) for i in range(repeat)
+        ])
+        result['complete'][needle] = summarise([
+            complete(needle) for i in range(repeat)
+        ])
+        if len(needle) > 1:
+            result['typing'][needle] = summarise(sum([
+                typing(needle) for i in range(repeat)
+            ], []))
+        result['matches'][needle] = engine.complete(needle)[:5]
+
+    result['over_target'] = sorted(
+        '{0} {1}'.format(metric, needle)
+        for metric in ('search', 'complete', 'typing')
+        for needle, times in result[metric].items()
+        if times['median'] > TARGET
+    )
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--candidates', type=int, nargs='+',
+        default=[1000, 5000, 50000],
+        help='numbers of candidate words'
+    )
+    parser.add_argument(
+        '--needles', nargs='+', default=NEEDLES,
+        help='the typed text to match'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=20,
+        help='times each measurement is repeated'
+    )
+    parser.add_argument(
+        '--output', help='write the json here instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for count in args.candidates:
+        print('benchmarking {0} candidates'.format(count), file=sys.stderr)
+        results.append(
+            benchmark_candidates(count, args.needles, args.repeat)
+        )
+
+    report = {
+        'benchmark' : 'completion',
+        'version'   : __version__,
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'target'    : TARGET,
+        'results'   : results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
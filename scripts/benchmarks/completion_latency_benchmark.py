@@ -0,0 +1,286 @@
+""" Benchmark the latency of completion by replaying key
+presses into an offscreen editor.
+
+Each session sets a document on an Editor (with its
+AutoCompleter), puts the cursor at the end, and sends
+the key presses of the session one by one, letting
+the deferred completion providers run after each. The
+AutoCompleter's timings (see utils.latency) are then
+summarised as the 50th, 95th and 99th percentiles, in
+milliseconds, of:
+- total: handling each key press.
+- popup: from each key press to the last update of the
+  popup for it.
+- each stage: words, candidates, set_list, show_popup.
+
+The built-in sessions type variables, attributes of
+modules, attributes of self and imports at the end of
+a standard library module. Key presses recorded in Nuke
+(with PYTHONEDITOR_COMPLETION_TIMING set, and saved with
+latency.RECORDER.save(path)) can be replayed instead:
+
+    python scripts/benchmarks/completion_latency_benchmark.py \\
+        --keys recorded.json --document script.py
+
+Keys that scripts/tests/_autocomplete_keys.py ignores
+are skipped. No display is needed.
+"""
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import inspect
+import tempfile
+import platform
+import argparse
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorBenchmark')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_COMPLETION_TIMING'] = '1'
+# index the modules from scratch, without
+# reading or replacing the user's cache.
+os.environ['PYTHONEDITOR_MODULE_CACHE'] = os.path.join(
+    TEMP_DIR, 'PythonEditor_modules.json'
+)
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(BENCHMARKS_DIR)))
+
+import __main__
+from PythonEditor.ui.Qt import QtWidgets, QtGui, QtCore
+from PythonEditor.ui import editor
+from PythonEditor.ui.features import sourceindex
+from PythonEditor.utils import astindex
+from PythonEditor.utils import latency
+from PythonEditor.utils import moduleindex
+from PythonEditor._version import __version__
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(BENCHMARKS_DIR), 'tests'
+))
+try:
+    from _autocomplete_keys import ignored_keys
+except (ImportError, AttributeError):
+    ignored_keys = []
+
+
+# typed as {Name} in the sessions.
+SPECIAL_KEYS = {
+    'Tab'       : (QtCore.Qt.Key_Tab, '\t'),
+    'Return'    : (QtCore.Qt.Key_Return, '\r'),
+    'Backspace' : (QtCore.Qt.Key_Backspace, '\b'),
+    'Escape'    : (QtCore.Qt.Key_Escape, '\x1b'),
+    'Down'      : (QtCore.Qt.Key_Down, ''),
+    'Up'        : (QtCore.Qt.Key_Up, ''),
+}
+SHIFTED = '~!@#$%^&*()_+{}|:"<>?'
+# (name, module whose source is the document, code run
+# in __main__ first, typed keys)
+SESSIONS = [
+    (
+        'variables',
+        'argparse',
+        '',
+        '\nparser = ArgumentParser(prog="benchmark")\n'
+        'for action in parser._actions:\n'
+        '    print(action.dest, action.help)\n'
+    ),
+    (
+        'attributes',
+        'argparse',
+        'import os',
+        '\nname = os.path.join(os.getcwd(), "name")\n'
+        'os.path.splitext(os.path.basename(name))\n'
+    ),
+    (
+        'self',
+        'argparse',
+        '',
+        '\nclass Benchmark(ArgumentParser):\n'
+        '    def method(self, value):\n'
+        '        self.value = value\n'
+        '        self.add_argument(self.value)\n'
+        '        return self.parse_args()\n'
+    ),
+    (
+        'imports',
+        'argparse',
+        '',
+        '\nimport collections\n'
+        'import xml.etree.ElementTree\n'
+        'from os import path\n'
+        'from collections import OrderedDict\n'
+    ),
+]
+
+
+def parse_keys(typed):
+    """ Return the (key, text) of each key press to
+    type the text typed, where {Name} is a key in
+    SPECIAL_KEYS.
+    """
+    keys = []
+    for match in re.finditer(r'\{(\w+)\}|(.)', typed, re.DOTALL):
+        name, char = match.groups()
+        if name is not None:
+            keys.append(SPECIAL_KEYS[name])
+        elif char == '\n':
+            keys.append(SPECIAL_KEYS['Return'])
+        elif ord(char) < 128:
+            keys.append((ord(char.upper()), char))
+        else:
+            keys.append((QtCore.Qt.Key_unknown, char))
+    return keys
+
+
+def recorded_keys(path):
+    """ Return the (key, text) of each key press
+    saved by latency.RECORDER.save.
+    """
+    with open(path, 'r') as f:
+        records = json.load(f)
+    return [(record['key'], record['text']) for record in records]
+
+
+def send_key(view, key, text):
+    modifiers = QtCore.Qt.NoModifier
+    if text and (text.isupper() or text in SHIFTED):
+        modifiers = QtCore.Qt.ShiftModifier
+    for event_type in (QtCore.QEvent.KeyPress, QtCore.QEvent.KeyRelease):
+        event = QtGui.QKeyEvent(event_type, key, modifiers, text)
+        QtWidgets.QApplication.sendEvent(view, event)
+
+
+def make_editor(app, document):
+    view = editor.Editor(handle_shortcuts=False)
+    view.resize(800, 600)
+    view.show()
+    QtWidgets.QApplication.setActiveWindow(view)
+    view.setFocus()
+    view.setPlainText(document)
+    view.moveCursor(QtGui.QTextCursor.End)
+    # index the document now, rather than
+    # after the delay following a change.
+    index = sourceindex.get_source_index(view)
+    index.index = astindex.StatementParser().index(document)
+    app.processEvents()
+    if not view.hasFocus():
+        raise RuntimeError('The editor could not be given focus.')
+    return view
+
+
+def replay(app, view, keys, delay):
+    """ Send the keys to view, letting the event loop
+    run until the completion pipeline is done.
+    """
+    pipeline = view.autocomplete.pipeline
+    for key, text in keys:
+        if key in ignored_keys:
+            continue
+        send_key(view, key, text)
+        app.processEvents()
+        for i in range(1000):
+            if pipeline.request is None:
+                break
+            app.processEvents()
+        if delay:
+            time.sleep(delay/1000.0)
+            app.processEvents()
+
+
+def run_session(app, document, keys, delay):
+    view = make_editor(app, document)
+    replay(app, view, keys, delay)
+    view.close()
+    view.deleteLater()
+    app.processEvents()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--keys', help='replay the key presses in this json file'
+    )
+    parser.add_argument(
+        '--document',
+        help='the file the recorded keys are typed at the end of'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='times each session is replayed'
+    )
+    parser.add_argument(
+        '--delay', type=float, default=0,
+        help='milliseconds between key presses'
+    )
+    parser.add_argument(
+        '--output', help='write the json here instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv[:1])
+
+    try:
+        # the first session should not include
+        # listing the modules on sys.path.
+        moduleindex.get_module_index().ready.wait(60)
+
+        if args.keys:
+            document = ''
+            if args.document:
+                with open(args.document, 'r') as f:
+                    document = f.read()
+            sessions = [
+                ('recorded', document, '', recorded_keys(args.keys))
+            ]
+        else:
+            sessions = []
+            for name, module, setup, typed in SESSIONS:
+                document = inspect.getsource(__import__(module))
+                sessions.append((name, document, setup, parse_keys(typed)))
+
+        results = []
+        all_records = []
+        for name, document, setup, keys in sessions:
+            print('replaying {0}'.format(name), file=sys.stderr)
+            exec(setup, __main__.__dict__)
+            latency.RECORDER.clear()
+            for i in range(args.repeat):
+                run_session(app, document, keys, args.delay)
+            all_records.extend(latency.RECORDER.records)
+            summary = latency.RECORDER.summary()
+            summary['session'] = name
+            results.append(summary)
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    latency.RECORDER.clear()
+    latency.RECORDER.records.extend(all_records)
+    report = {
+        'benchmark' : 'completion_latency',
+        'version'   : __version__,
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat'    : args.repeat,
+        'results'   : results,
+        'all'       : latency.RECORDER.summary(),
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
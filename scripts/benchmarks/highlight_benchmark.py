@@ -0,0 +1,334 @@
+""" Benchmark the syntax highlighter, and check its
+output against golden files.
+
+Each file of the corpus is set on an offscreen editor
+document with Highlight attached. The time spent in
+each highlightBlock call and in the whole setPlainText
+is recorded, and the format ranges of every block are
+read back from the document.
+
+The corpus is a set of standard library modules plus
+generated files: long triple-quoted strings, lines of
+10k characters, and strings and comments that are
+easily confused with each other.
+
+The format ranges of the generated files are checked
+against the golden files in highlight_golden, which
+hold the output of the highlighter before it was
+rewritten (at 9815e51):
+
+    python scripts/benchmarks/highlight_benchmark.py --output after.json
+
+reports the lines that differ, and fails if there are
+any, or if a golden file is missing. The old highlighter
+mistook quotes within strings (e.g. "it's") for the end
+of the string, ended a one-line triple-quoted string at
+the next quote, did not carry a string over a backslash
+continuation, and after a triple-quoted string with
+triple quotes of the other kind inside it, left every
+later line in a string. The lines it got wrong are listed in
+highlight_golden/corrections.json, by their text, with
+the ranges expected instead; every other line must
+match. The stdlib files are only timed, as their
+sources depend on the python version.
+
+To record the output of another highlighter (e.g. to
+make golden files from a checkout of the old one):
+
+    python scripts/benchmarks/highlight_benchmark.py --record-dir formats
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import inspect
+import platform
+import argparse
+import importlib
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# highlight every block straight away, so that
+# the results do not depend on the viewport.
+os.environ['PYTHONEDITOR_LARGE_DOCUMENT_LINES'] = str(10**9)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui import editor
+from PythonEditor.ui.features import syntaxhighlighter
+from PythonEditor._version import __version__
+
+
+GOLDEN_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'highlight_golden'
+)
+# {corpus name: {line text: ranges}} of the
+# lines the old highlighter got wrong.
+CORRECTIONS_FILE = 'corrections.json'
+STDLIB_MODULES = [
+    'argparse',
+    'collections',
+    'difflib',
+    'inspect',
+    'json.decoder',
+    'os',
+    'string',
+    'subprocess',
+    'textwrap',
+    'tokenize',
+]
+LONG_LINE_LENGTH = 10000
+
+
+def synthetic_corpus():
+    """ Return a list of (name, text) of generated
+    files exercising the highlighter's worst cases.
+    """
+    docstring = '\n'.join(
+        'line {0} of a docstring with "quotes", # hashes and def words'.format(i)
+        for i in range(5000)
+    )
+    long_triple_quoted = (
+        'def function():\n'
+        '    """\n'+docstring+'\n    """\n'
+        "    text = '''\n"+docstring+"\n    '''\n"
+        '    return text\n'
+    )
+
+    items = ', '.join(str(i) for i in range(LONG_LINE_LENGTH//5))
+    long_lines = '\n'.join([
+        'values = ['+items+']',
+        'text = "'+'x'*LONG_LINE_LENGTH+'"',
+        '# '+'comment '*(LONG_LINE_LENGTH//8),
+        "name = f'{"+'value + '*(LONG_LINE_LENGTH//8)+"value}'",
+        'call('+'argument, '*(LONG_LINE_LENGTH//10)+')',
+        'if '+' and '.join(['True']*(LONG_LINE_LENGTH//9))+': pass',
+    ])
+
+    mixed_strings = '\n'.join([
+        "s = '#not a comment' # a comment",
+        'd = "it\'s" + \'say "hi"\'',
+        'e = "escaped \\" quote" # comment',
+        "r = r'\\d+#' + b'\\x00'",
+        'f = f"{d[\'key\']} {x!r:>{width}} {{literal}}"',
+        'g = f"{ {\'a\': 1}[\'a\'] }"',
+        'h = """one line triple"""; i = \'\'\'another\'\'\'',
+        'j = "continued \\',
+        'string"',
+        'k = """starts here',
+        "# ''' inside",
+        'ends here""" + "after"',
+        'class A(Exception): pass',
+        '@decorator',
+        'def method(self, *args, **kwargs): return self.value.method()',
+    ]*200)
+
+    return [
+        ('long_triple_quoted', long_triple_quoted),
+        ('long_lines', long_lines),
+        ('mixed_strings', mixed_strings),
+    ]
+
+
+def stdlib_corpus(names=STDLIB_MODULES):
+    corpus = []
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+            path = inspect.getsourcefile(module)
+            with open(path) as f:
+                corpus.append((name, f.read()))
+        except (ImportError, TypeError, IOError) as e:
+            print('skipping {0}: {1}'.format(name, e), file=sys.stderr)
+    return corpus
+
+
+class TimedHighlight(syntaxhighlighter.Highlight):
+    """ Records the time spent in each highlightBlock call.
+    """
+    def __init__(self, document, editor):
+        self.block_times = []
+        super(TimedHighlight, self).__init__(document, editor)
+
+    def highlightBlock(self, text):
+        start = time.time()
+        super(TimedHighlight, self).highlightBlock(text)
+        self.block_times.append(time.time()-start)
+
+
+def format_name(text_format):
+    """ Describe a QTextCharFormat as its
+    colour, plus b for bold and i for italic.
+    """
+    name = text_format.foreground().color().name()
+    if text_format.fontWeight() > 50:
+        name += 'b'
+    if text_format.fontItalic():
+        name += 'i'
+    return name
+
+
+def block_formats(document):
+    """ Return a list of the [start, length, format name]
+    ranges of each block of the document.
+    """
+    result = []
+    block = document.firstBlock()
+    while block.isValid():
+        layout = block.layout()
+        if hasattr(layout, 'formats'):
+            ranges = layout.formats()
+        else:
+            ranges = layout.additionalFormats()
+        result.append([
+            [r.start, r.length, format_name(r.format)]
+            for r in ranges
+        ])
+        block = block.next()
+    return result
+
+
+def highlight(text):
+    """ Highlight text on a new document.
+
+    :return: `tuple` (total seconds, block times, formats)
+    """
+    view = editor.Editor(init_features=False)
+    highlighter = TimedHighlight(view.document(), view)
+    start = time.time()
+    view.setPlainText(text)
+    total = time.time()-start
+    formats = block_formats(view.document())
+    times = highlighter.block_times
+    view.deleteLater()
+    return total, times, formats
+
+
+def read_corrections(golden_dir):
+    path = os.path.join(golden_dir, CORRECTIONS_FILE)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def record(name, formats, record_dir):
+    """ Write formats to record_dir, as a golden file. """
+    if not os.path.isdir(record_dir):
+        os.makedirs(record_dir)
+    with open(os.path.join(record_dir, name+'.json'), 'w') as f:
+        json.dump(formats, f)
+
+
+def compare(name, text, formats, golden_dir, corrections):
+    """ Compare formats with the golden file for name,
+    allowing the corrected lines to differ from it.
+
+    :param corrections: `dict` of {line text: ranges}
+    :return: `list` of the line numbers that differ,
+             or None if there is no golden file.
+    """
+    path = os.path.join(golden_dir, name+'.json')
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        golden = json.load(f)
+    lines = text.split('\n')
+    differences = []
+    for number in range(max(len(golden), len(formats))):
+        actual = formats[number:number+1]
+        if golden[number:number+1] == actual:
+            continue
+        if number < len(lines) and actual:
+            corrected = corrections.get(lines[number])
+            if corrected == actual[0]:
+                continue
+        differences.append(number+1)
+    return differences
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='times each file is highlighted; the fastest run is kept'
+    )
+    parser.add_argument(
+        '--golden-dir', default=GOLDEN_DIR,
+        help='where the golden files are read from'
+    )
+    parser.add_argument(
+        '--record-dir',
+        help='write the format ranges of every file here'
+    )
+    parser.add_argument(
+        '--output', help='write the json here instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv[:1])
+
+    corrections = read_corrections(args.golden_dir)
+    checked = set(name for name, text in synthetic_corpus())
+    results = []
+    failed = False
+    for name, text in stdlib_corpus()+synthetic_corpus():
+        print('highlighting {0}'.format(name), file=sys.stderr)
+        runs = [highlight(text) for i in range(args.repeat)]
+        total, times, formats = min(runs, key=lambda run: run[0])
+        app.processEvents()
+
+        if args.record_dir:
+            record(name, formats, args.record_dir)
+        differences = None
+        if name in checked:
+            differences = compare(
+                name, text, formats, args.golden_dir,
+                corrections.get(name, {})
+            )
+            if differences is None:
+                print('no golden file for {0}'.format(name), file=sys.stderr)
+            if differences != []:
+                failed = True
+        times = sorted(times) or [0.0]
+        results.append({
+            'name'            : name,
+            'blocks'          : len(formats),
+            'characters'      : len(text),
+            'total'           : total,
+            'block_mean'      : sum(times)/len(times),
+            'block_median'    : times[len(times)//2],
+            'block_max'       : times[-1],
+            'golden'          : differences is not None,
+            'differing_lines' : (differences or [])[:20],
+            'differing_count' : len(differences or []),
+        })
+
+    report = {
+        'benchmark' : 'highlight',
+        'version'   : __version__,
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results'   : results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Checks that statements split at unindented lines inside
+strings or brackets are joined again by the astindex,
+whatever line the python version reports their syntax
+error at (from 3.10, the line the string or bracket
+opens on).
+
+    python scripts/tests/astindex_statements.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import astindex
+
+
+SOURCE = '''class Foo(object):
+    def meth(self):
+        y = """
+not indented
+"""
+        self.after = 1
+
+    def later(self):
+        pass
+def bracket():
+    value = [
+1]
+    return value
+'''
+
+
+def test_triple_quoted_string():
+    index = astindex.StatementParser().index(SOURCE)
+    foo = index.find_class('Foo')
+    assert foo is not None
+    assert foo.first == 1 and foo.last >= 9, foo
+    assert foo.members() == ['meth', 'later', 'after'], foo.members()
+    names = [scope.name for scope in index.scopes_at(9)]
+    assert names == ['later', 'Foo', ''], names
+
+
+def test_bracket():
+    index = astindex.StatementParser().index(SOURCE)
+    names = [scope.name for scope in index.scopes_at(12)]
+    assert names == ['bracket', ''], names
+    assert 'value' in index.local_names(13)
+
+
+if __name__ == '__main__':
+    test_triple_quoted_string()
+    test_bracket()
+    print('ok')
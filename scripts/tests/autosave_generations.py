@@ -0,0 +1,91 @@
+"""
+Checks that rewriting the autosave file keeps the previous
+versions as numbered generations, and that when the current
+file has been cut short (e.g. by a crash while writing) the
+newest generation that can still be parsed is restored.
+
+    python scripts/tests/autosave_generations.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+os.environ['PYTHONEDITOR_AUTOSAVE_GENERATIONS'] = '3'
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.features import autosavexml
+
+
+PATH = autosavexml.AUTOSAVE_FILE
+
+
+def save_version(text):
+    """ Save a tab and write the
+    whole xml file, as compacting does.
+    """
+    store = autosavexml.AutoSaveStore(PATH)
+    store.save_subscript('tab', 'tab.py', text, '0')
+    assert store.flush(timeout=10)
+    store.compact()
+
+
+def stored_text():
+    store = autosavexml.AutoSaveStore(PATH)
+    return store.find('tab').text
+
+
+def truncate(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data)//2])
+
+
+def test_generations():
+    for version in range(5):
+        save_version('version {0}\n'.format(version))
+    assert stored_text() == 'version 4\n'
+    generations = sorted(
+        name for name in os.listdir(TEMP_DIR)
+        if name.startswith('PythonEditorHistory.xml.')
+        and name[-1].isdigit()
+    )
+    assert generations == [
+        'PythonEditorHistory.xml.1',
+        'PythonEditorHistory.xml.2',
+        'PythonEditorHistory.xml.3',
+    ], generations
+
+
+def test_restore_generation():
+    truncate(PATH)
+    assert autosavexml.last_good_generation(PATH) == PATH+'.1'
+    assert stored_text() == 'version 3\n'
+
+    # a damaged generation is passed over.
+    truncate(PATH)
+    truncate(PATH+'.1')
+    assert autosavexml.last_good_generation(PATH) == PATH+'.2'
+    assert stored_text() == 'version 2\n'
+
+    # restoring does not push the damaged file into the generations.
+    assert autosavexml.last_good_generation(PATH) == PATH+'.2'
+
+
+if __name__ == '__main__':
+    try:
+        test_generations()
+        test_restore_generation()
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
@@ -0,0 +1,119 @@
+"""
+Checks that changes saved through the autosave store are
+appended to the journal, that another store reading the
+disk replays them, and that compacting the journal into
+the xml keeps the same tabs and current index.
+
+    python scripts/tests/autosave_journal.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.features import autosavexml
+
+
+PATH = autosavexml.AUTOSAVE_FILE
+
+
+def tabs(root):
+    return sorted(
+        (s.attrib.get('uuid'), s.attrib.get('name'), s.text)
+        for s in root.findall('subscript')
+    )
+
+
+def contents(store):
+    """ The tabs and current index as
+    the store reading the disk sees them.
+    """
+    store.refresh()
+    return tabs(store.tree()), store.current_index()
+
+
+def write_tabs(store):
+    store.save_subscript('a', 'a.py', 'print("a")\n', '0')
+    store.save_subscript('b', 'b.py', 'print("b")\n', '1')
+    store.save_subscript('c', 'c.py', 'print("c")\n', '2')
+    store.save_subscript('a', 'a.py', 'print("a2")\n', '0')
+    store.update_attribs({'b': {'name': 'renamed.py'}})
+    store.remove_subscripts(['c'])
+    store.set_current_index(1)
+    assert store.flush(timeout=10)
+
+
+EXPECTED = (
+    [
+        ('a', 'a.py', 'print("a2")\n'),
+        ('b', 'renamed.py', 'print("b")\n'),
+    ],
+    1
+)
+
+
+def test_replay():
+    store = autosavexml.AutoSaveStore(PATH)
+    write_tabs(store)
+    assert contents(store) == EXPECTED, contents(store)
+
+    # the changes are in the journal, not yet in the xml.
+    root = autosavexml.ETree.parse(PATH).getroot()
+    assert root.findall('subscript') == []
+    records, offset = autosavexml.read_journal(PATH)
+    assert offset == os.path.getsize(autosavexml.journal_path(PATH))
+    for record in records:
+        autosavexml.apply_journal_record(root, record)
+    subscripts = tabs(root)
+    assert (subscripts, 1) == EXPECTED, subscripts
+
+    # a torn record at the end is skipped.
+    with open(autosavexml.journal_path(PATH), 'ab') as f:
+        f.write(b'\n{"op": "clear"')
+    assert contents(autosavexml.AutoSaveStore(PATH)) == EXPECTED
+
+
+def test_compact():
+    store = autosavexml.AutoSaveStore(PATH)
+    store.save_subscript('d', 'd.py', 'print("d")\n', '2')
+    assert store.flush(timeout=10)
+    expected = contents(store)
+    assert len(expected[0]) == 3, expected
+
+    store.compact()
+    assert os.path.getsize(autosavexml.journal_path(PATH)) == 0
+    assert contents(autosavexml.AutoSaveStore(PATH)) == expected
+
+    # the xml alone holds everything.
+    root = autosavexml.ETree.parse(PATH).getroot()
+    assert autosavexml.replay_journal(root, PATH) == 0
+    subscripts = tabs(root)
+    assert subscripts == expected[0], subscripts
+    assert root.find('current_index').text == '1'
+
+    # and the journal carries on from the compacted file.
+    store.save_subscript('d', 'd.py', 'print("d2")\n', '2')
+    assert store.flush(timeout=10)
+    fresh = autosavexml.AutoSaveStore(PATH)
+    assert fresh.find('d').text == 'print("d2")\n'
+    assert contents(fresh)[0][:2] == expected[0][:2]
+
+
+if __name__ == '__main__':
+    try:
+        test_replay()
+        test_compact()
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
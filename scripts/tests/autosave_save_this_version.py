@@ -0,0 +1,113 @@
+"""
+Regression tests for "Save This Version" and autosaves
+after another session changed the same tab: the editor's
+text must end up on disk, not the other session's.
+
+Runs without a display (QT_QPA_PLATFORM=offscreen):
+
+    python scripts/tests/autosave_save_this_version.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+os.environ['PYTHONEDITOR_AUTOSAVE_DB'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.db'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui import tabs
+from PythonEditor.ui.features import autosavexml
+from PythonEditor.ui.features import revisions
+
+
+def stored_text(uid):
+    """ Return the text of the tab as another
+    session reading the disk would see it.
+    """
+    store = autosavexml.AutoSaveStore(autosavexml.AUTOSAVE_FILE)
+    subscript = store.find(uid)
+    return None if subscript is None else subscript.text
+
+
+def test_save_this_version():
+    tabeditor = tabs.TabEditor()
+    manager = autosavexml.AutoSaveManager(tabeditor)
+    store = manager.store
+    uid = tabeditor.tabs['uuid']
+
+    # this session saves A1
+    tabeditor.editor.setPlainText('A1')
+    tabeditor.tabs['text'] = 'A1'
+    manager.autosave()
+    store.flush()
+
+    # another session saves B1 to the same tab
+    other = autosavexml.AutoSaveStore(autosavexml.AUTOSAVE_FILE)
+    other.save_subscript(
+        uid, tabeditor.tabs['name'], 'B1',
+        str(tabeditor.tabs.currentIndex())
+    )
+    other.flush()
+    assert stored_text(uid) == 'B1'
+
+    # the out of sync popup offers the stored
+    # subscript, and the user keeps A1.
+    subscript = store.find(uid)
+    assert subscript.text == 'B1'
+    requested = store.saves_requested
+    performed = store.saves_performed
+    manager.save_this_version(subscript)
+    store.flush()
+
+    assert stored_text(uid) == 'A1', stored_text(uid)
+    assert store.saves_requested == requested+1
+    assert store.saves_performed == performed+1
+
+
+def test_save_after_other_session():
+    uid = 'test_save_after_other_session'
+    store = autosavexml.AutoSaveStore(autosavexml.AUTOSAVE_FILE)
+    other = autosavexml.AutoSaveStore(autosavexml.AUTOSAVE_FILE)
+
+    store.save_subscript(uid, 'tab', 'A1', '0')
+    store.flush()
+    other.save_subscript(uid, 'tab', 'B1', '0')
+    other.flush()
+    assert stored_text(uid) == 'B1'
+
+    # this session autosaves its unchanged text
+    # before anything has read the disk again.
+    requested = store.saves_requested
+    performed = store.saves_performed
+    store.save_subscript(uid, 'tab', 'A1', '0')
+    store.flush()
+
+    assert stored_text(uid) == 'A1', stored_text(uid)
+    assert store.saves_requested == requested+1
+    assert store.saves_performed == performed+1
+
+
+if __name__ == '__main__':
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv[:1])
+    try:
+        test_save_this_version()
+        test_save_after_other_session()
+    finally:
+        autosavexml.flush_stores()
+        revisions.flush_revision_stores()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
@@ -0,0 +1,72 @@
+"""
+Checks that fuzzy completion ranks the words where
+the needle starts their parts first however many
+other words match it, and that a FuzzyIndex updated
+with added and removed words, or narrowed by the
+search before, finds what a new one would.
+
+    python scripts/tests/completion_fuzzy.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import completion
+
+
+PARTS = ['name', 'node', 'set', 'sel', 'trans', 'knob', 'x']
+
+
+def identifier(rng):
+    parts = [rng.choice(PARTS) for i in range(rng.randint(1, 3))]
+    if rng.random() < 0.5:
+        return '_'.join(parts)
+    return parts[0]+''.join(part.title() for part in parts[1:])
+
+
+def test_boundary_matches_first():
+    # more short words contain 'ns' than are scored.
+    words = ['ans%d' % i for i in range(completion.MAX_SCORED*2)]
+    words += ['NameSetTransform', 'nameSet', 'NameSet']
+    index = completion.FuzzyIndex(words)
+    best = [word for score, word in index.search('ns', 2)]
+    assert sorted(best) == ['NameSet', 'nameSet'], best
+
+
+def test_update():
+    rng = random.Random(0)
+    words = set(identifier(rng) for i in range(500))
+    index = completion.FuzzyIndex(words)
+    for i in range(200):
+        added = set(identifier(rng)+str(i) for j in range(3))
+        removed = set(rng.sample(sorted(words), 2))
+        words = (words | added) - removed
+        index.update(added, removed)
+        assert set(index.slots) == words
+        for needle in ('ns', 'Se', 'xtr', ' set'):
+            expected = completion.FuzzyIndex(words).search(needle)
+            assert index.search(needle) == expected, needle
+
+
+def test_narrowed():
+    rng = random.Random(1)
+    words = set(identifier(rng) for i in range(2000))
+    index = completion.FuzzyIndex(words)
+    for needle in ('selNodeSet', 'transknob', 'nameNode'):
+        for length in range(2, len(needle)+1):
+            typed = needle[:length]
+            expected = completion.FuzzyIndex(words).search(typed)
+            assert index.search(typed) == expected, typed
+
+
+if __name__ == '__main__':
+    test_boundary_matches_first()
+    test_update()
+    test_narrowed()
+    print('ok')
@@ -0,0 +1,132 @@
+"""
+Checks that the DiffWorker used by the autosave's diff
+window emits the same diff as difflib in chunks, and that
+cancelling it stops the diff, both while the texts are
+being matched and between chunks, without emitting more.
+
+Runs without a display (QT_QPA_PLATFORM=offscreen):
+
+    python scripts/tests/diff_worker_cancel.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+import shutil
+import difflib
+import tempfile
+import threading
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.Qt import QtCore
+from PythonEditor.ui.features import autosavexml
+
+
+def texts(count=2000):
+    """ Two texts with a change every few lines,
+    so that the diff has many groups of changes.
+    """
+    random.seed(0)
+    old = ['line {0}\n'.format(i) for i in range(count)]
+    new = list(old)
+    for i in range(0, count, 10):
+        new[i] = 'changed {0}\n'.format(random.random())
+    return ''.join(old), ''.join(new)
+
+
+class CancelAfter(object):
+    """ A cancel event that is set once
+    it has been polled `polls` times.
+    """
+    def __init__(self, polls):
+        self.polls = polls
+
+    def is_set(self):
+        self.polls -= 1
+        return self.polls < 0
+
+    def set(self):
+        self.polls = 0
+
+
+def collect(worker, cancel_after_chunks=None):
+    """ Connect to the worker's chunks directly, as the
+    signal is emitted from the worker's own thread.
+    """
+    chunks = []
+    def chunk_ready(emitter, chunk):
+        assert emitter is worker
+        chunks.append(chunk)
+        if len(chunks) == cancel_after_chunks:
+            worker.cancel()
+    worker.chunk_ready.connect(chunk_ready, QtCore.Qt.DirectConnection)
+    return chunks
+
+
+def test_chunks():
+    old, new = texts()
+    worker = autosavexml.DiffWorker(old, new)
+    chunks = collect(worker)
+    worker.run()
+    expected = ''.join(difflib.context_diff(
+        old.splitlines(True), new.splitlines(True)
+    ))
+    assert ''.join(chunks) == expected
+    assert len(chunks) > 2, len(chunks)
+    for chunk in chunks:
+        assert len(chunk.splitlines()) <= autosavexml.DIFF_CHUNK_LINES
+
+
+def test_cancel_while_matching():
+    old, new = texts()
+    worker = autosavexml.DiffWorker(old, new)
+    worker.cancel_event = CancelAfter(1)
+    chunks = collect(worker)
+    worker.run()
+    assert chunks == [], len(chunks)
+
+
+def test_cancel_between_chunks():
+    old, new = texts()
+    worker = autosavexml.DiffWorker(old, new)
+    chunks = collect(worker, cancel_after_chunks=1)
+    worker.run()
+    assert len(chunks) == 1, len(chunks)
+
+
+def test_cancel_thread():
+    old, new = texts(100000)
+    worker = autosavexml.DiffWorker(old, new)
+    chunks = collect(worker)
+    worker.start()
+    worker.cancel()
+    start = time.time()
+    while time.time()-start < 10:
+        names = [thread.name for thread in threading.enumerate()]
+        if 'PythonEditorDiff' not in names:
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError('the diff thread did not stop')
+    assert chunks == [], len(chunks)
+
+
+if __name__ == '__main__':
+    try:
+        test_chunks()
+        test_cancel_while_matching()
+        test_cancel_between_chunks()
+        test_cancel_thread()
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
@@ -0,0 +1,114 @@
+"""
+Checks that scan_strings carries the state of triple-quoted
+strings (and of strings continued with a backslash) from one
+line to the next, so that the lines inside a string, and
+those after it, get the right styles.
+
+    python scripts/tests/lexer_strings.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import lexer
+
+
+def scan_lines(lines, state=lexer.NORMAL):
+    """ Scan lines as the highlighter does, one block
+    at a time, returning the ranges and state of each.
+    """
+    result = []
+    for line in lines:
+        ranges, state = lexer.scan_strings(line, state)
+        result.append((ranges, state))
+    return result
+
+
+def span(line, text, style):
+    return (line.index(text), len(text), style)
+
+
+def test_triple_double():
+    lines = [
+        'x = """start',
+        '',
+        'middle "quoted" \'\'\' # not a comment',
+        'escaped \\""" still inside',
+        'end""" + "s"  # comment',
+        'def f(): pass',
+    ]
+    result = scan_lines(lines)
+    assert result[0] == (
+        [span(lines[0], '"""start', 'comment')],
+        lexer.IN_TRIPLE_DOUBLE,
+    ), result[0]
+    assert result[1] == ([], lexer.IN_TRIPLE_DOUBLE), result[1]
+    for line, (ranges, state) in zip(lines[2:4], result[2:4]):
+        assert ranges == [(0, len(line), 'comment')], ranges
+        assert state == lexer.IN_TRIPLE_DOUBLE, state
+    assert result[4] == ([
+        span(lines[4], 'end"""', 'comment'),
+        span(lines[4], '"s"', 'string'),
+        span(lines[4], '# comment', 'comment'),
+    ], lexer.NORMAL), result[4]
+    assert result[5] == ([], lexer.NORMAL), result[5]
+
+
+def test_other_triple_inside():
+    lines = [
+        "'''",
+        'contains """ the other quotes',
+        "'''",
+        'after = "string"',
+    ]
+    result = scan_lines(lines)
+    assert [state for ranges, state in result] == [
+        lexer.IN_TRIPLE_SINGLE,
+        lexer.IN_TRIPLE_SINGLE,
+        lexer.NORMAL,
+        lexer.NORMAL,
+    ], result
+    assert result[3][0] == [span(lines[3], '"string"', 'string')]
+
+
+def test_one_line_triple():
+    ranges, state = lexer.scan_strings('"""doc""" # it\'s')
+    assert ranges == [(0, 9, 'comment'), (10, 6, 'comment')], ranges
+    assert state == lexer.NORMAL
+
+
+def test_backslash_continuation():
+    lines = ['s = "abc\\', 'def" + 1', 's = "unclosed', 'x']
+    result = scan_lines(lines)
+    assert result[0] == (
+        [span(lines[0], '"abc\\', 'string')], lexer.IN_DOUBLE
+    ), result[0]
+    assert result[1] == ([(0, 4, 'string')], lexer.NORMAL), result[1]
+    # without the backslash the string ends with the line.
+    assert result[2][1] == lexer.NORMAL, result[2]
+    assert result[3] == ([], lexer.NORMAL), result[3]
+
+
+def test_line_styles():
+    lex = lexer.Lexer([(r'\bdef\b', 0, 'keyword')])
+    state = lexer.NORMAL
+    styles = []
+    for line in ['"""', 'def inside', '"""', 'def outside']:
+        ranges, state = lex.line_styles(line, state)
+        styles.append(ranges)
+    assert styles[1] == [(0, 10, 'comment')], styles
+    assert styles[3] == [(0, 3, 'keyword')], styles
+
+
+if __name__ == '__main__':
+    test_triple_double()
+    test_other_triple_inside()
+    test_one_line_triple()
+    test_backslash_continuation()
+    test_line_styles()
+    print('ok')
@@ -0,0 +1,89 @@
+"""
+Checks that completing an import from a package that has
+not been read yet does not read it on the calling thread,
+but has the module index's reader thread list and parse
+it and call back, and that the cache only keeps the
+source files in the indexed sys.path entries.
+
+    python scripts/tests/moduleindex_reader.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import moduleindex
+
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+
+
+def write(path, text=''):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def make_index():
+    entry = os.path.join(TEMP_DIR, 'site')
+    write(os.path.join(entry, 'pkgtest', '__init__.py'), 'top = 1\n')
+    write(os.path.join(entry, 'pkgtest', 'sub.py'), 'def func(): pass\n')
+    index = moduleindex.ModuleIndex(os.path.join(TEMP_DIR, 'cache.json'))
+    index.run([entry])
+    return index, entry
+
+
+def complete(index, text):
+    """ Complete text as the editor does, returning the
+    completions before and after the reader has run.
+    """
+    read = threading.Event()
+    first = index.complete(text, read.set)
+    assert read.wait(10), text
+    return first, index.complete(text, read.set)
+
+
+def test_read_later():
+    index, entry = make_index()
+    names = complete(index, 'from pkgtest import ')
+    assert names == (['top'], ['sub', 'top']), names
+    names = complete(index, 'from pkgtest.sub import f')
+    assert names == ([], ['func']), names
+
+
+def test_forget_files():
+    index, entry = make_index()
+    complete(index, 'from pkgtest import ')
+    complete(index, 'from pkgtest.sub import ')
+    outside = os.path.join(TEMP_DIR, 'elsewhere', 'gone.py')
+    index.files[outside] = {'mtime': 0, 'names': []}
+    index.files[os.path.join(entry, 'deleted.py')] = {
+        'mtime': 0, 'names': []
+    }
+    index.forget_files()
+    index.save()
+    with open(index.cache_path) as f:
+        files = sorted(json.load(f)['files'])
+    assert files == [
+        os.path.join(entry, 'pkgtest', '__init__.py'),
+        os.path.join(entry, 'pkgtest', 'sub.py'),
+    ], files
+
+
+if __name__ == '__main__':
+    try:
+        test_read_later()
+        test_forget_files()
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
@@ -0,0 +1,85 @@
+"""
+Checks that finding an object by a dotted name one
+attribute at a time lets a completion Request hand
+control back after each slow attribute, and stop
+within about one attribute once over its budget.
+
+    python scripts/tests/provider_steps.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.utils import attributes
+from PythonEditor.utils import providers
+
+
+# seconds each attribute of a Slow object takes.
+DELAY = 0.05
+
+
+class Slow(object):
+    def __getattr__(self, name):
+        time.sleep(DELAY)
+        return Slow()
+
+
+def object_provider(text, namespace):
+    def provider(completions):
+        _obj = None
+        for _obj in attributes.resolve_steps(text, namespace):
+            yield None
+        if _obj is None:
+            return
+        yield attributes.attribute_names(_obj)
+    return provider
+
+
+def test_resolve_steps():
+    namespace = {'slow': Slow(), 'value': 1}
+    steps = list(attributes.resolve_steps('value.real', namespace))
+    assert steps == [1, 1], steps
+    steps = list(attributes.resolve_steps('missing.real', namespace))
+    assert steps == [None], steps
+    assert attributes.resolve_name('value.real', namespace) == 1
+
+
+def test_step_per_attribute():
+    namespace = {'slow': Slow()}
+    request = providers.Request([providers.Provider(
+        'object', object_provider('slow.a.b.c', namespace)
+    )])
+    durations = []
+    while not request.done:
+        start = time.time()
+        request.step(budget=0)
+        durations.append(time.time()-start)
+    assert max(durations) < DELAY*2, durations
+    assert len(durations) >= 4, durations
+
+
+def test_budget():
+    namespace = {'slow': Slow()}
+    request = providers.Request([providers.Provider(
+        'object',
+        object_provider('.'.join(['slow']+['a']*20), namespace),
+        budget=DELAY*2
+    )])
+    start = time.time()
+    while not request.done:
+        request.step(budget=0)
+    assert time.time()-start < DELAY*5, time.time()-start
+    assert request.expired == ['object'], request.expired
+
+
+if __name__ == '__main__':
+    test_resolve_steps()
+    test_step_per_attribute()
+    test_budget()
+    print('ok')
@@ -0,0 +1,84 @@
+"""
+Checks that when another session appends a revision to
+a tab's history while it is being pruned, the next
+revision this session writes is a full copy rather than
+a delta against its own (no longer last) revision, and
+that every revision kept can still be rebuilt.
+
+    python scripts/tests/revisions_prune.py
+"""
+from __future__ import print_function
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+TEMP_DIR = tempfile.mkdtemp(prefix='PythonEditorTest')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['PYTHONEDITOR_AUTOSAVE_FILE'] = os.path.join(
+    TEMP_DIR, 'PythonEditorHistory.xml'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.features import revisions
+
+
+BASE = ''.join('line {0}\n'.format(i) for i in range(50))
+
+
+def test_append_during_prune():
+    folder = os.path.join(TEMP_DIR, 'revisions')
+    os.makedirs(folder)
+    store = revisions.RevisionStore(folder)
+    path = store.path('tab')
+    now = time.time()
+    for i in range(5):
+        store.add_revision('tab', BASE+'edit {0}\n'.format(i), now+i)
+
+    # another session appends once prune has read the file.
+    read_data = revisions.read_data
+    reads = []
+    def racing_read(read_path):
+        reads.append(read_path)
+        if len(reads) == 2:
+            with io.open(read_path, 'ab') as f:
+                f.write(revisions.encode_entry(now+10, revisions.FULL, 'other\n'))
+        return read_data(read_path)
+
+    max_size = revisions.REVISIONS_MAX_SIZE
+    revisions.read_data = racing_read
+    revisions.REVISIONS_MAX_SIZE = len(read_data(path))-1
+    try:
+        store.prune('tab')
+    finally:
+        revisions.read_data = read_data
+        revisions.REVISIONS_MAX_SIZE = max_size
+
+    entries = revisions.read_entries(path)
+    assert revisions.decode_payload(entries[-1][2]) == 'other\n'
+
+    store.add_revision('tab', BASE+'edit 5\n', now+20)
+    entries = revisions.read_entries(path)
+    assert entries[-1][1] == revisions.FULL, entries[-1][:2]
+    for index in range(len(entries)):
+        revisions.rebuild_text(entries, index)
+    assert revisions.rebuild_text(entries, len(entries)-1) == BASE+'edit 5\n'
+
+    # with nothing appended, revisions are deltas again.
+    store.add_revision('tab', BASE+'edit 6\n', now+30)
+    entries = revisions.read_entries(path)
+    assert entries[-1][1] == revisions.DELTA, entries[-1][:2]
+    assert revisions.rebuild_text(entries, len(entries)-1) == BASE+'edit 6\n'
+
+
+if __name__ == '__main__':
+    try:
+        test_append_during_prune()
+    finally:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+    print('ok')
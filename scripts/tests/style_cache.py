@@ -0,0 +1,97 @@
+"""
+Checks that the highlighter keeps the style caches of the
+CACHED_TABS most recently viewed tabs, dropping the least
+recently used one, and that switching back to a cached tab
+highlights it without running the lexer again.
+
+Runs without a display (QT_QPA_PLATFORM=offscreen):
+
+    python scripts/tests/style_cache.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.Qt import QtGui
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui import editor
+from PythonEditor.ui.features import syntaxhighlighter
+
+
+def test_style_cache():
+    cache = syntaxhighlighter.StyleCache(size=2)
+    cache.set('a', 0, 'A')
+    cache.set('b', 0, 'B')
+    # 'a' becomes the most recently used
+    assert cache.get('a', 0) == 'A'
+    cache.set('c', 0, 'C')
+    assert cache.get('b', 0) is None
+    assert cache.get('a', 0) == 'A'
+    assert cache.get('c', 0) == 'C'
+    # the state is part of the key
+    assert cache.get('a', 1) is None
+
+
+def test_cached_tabs(app):
+    _editor = editor.Editor()
+    highlighter = _editor.document().findChild(
+        QtGui.QSyntaxHighlighter,
+        'Highlight'
+    )
+    count = syntaxhighlighter.CACHED_TABS
+
+    keys = ['tab {0}'.format(i) for i in range(count)]
+    caches = [highlighter.get_cache(key) for key in keys]
+    assert list(highlighter.caches) == keys
+
+    # viewing the first tab again keeps its cache,
+    # so the next new tab drops the second one.
+    highlighter.select_cache(keys[0])
+    assert highlighter.cache is caches[0]
+    highlighter.select_cache('new tab')
+    assert len(highlighter.caches) == count
+    assert keys[1] not in highlighter.caches
+    assert list(highlighter.caches)[-2:] == [keys[0], 'new tab']
+    highlighter.select_cache(keys[1])
+    assert highlighter.cache is not caches[1]
+    assert keys[2] not in highlighter.caches
+
+    # a cached tab is highlighted from its cache.
+    text = 'def f(x):\n    return "x"  # comment\n'
+    highlighter.select_cache(keys[0])
+    _editor.setPlainText(text)
+    lines = len(highlighter.cache.entries)
+    assert lines == 3, lines
+
+    highlighter.select_cache('other tab')
+    _editor.setPlainText('other = 1\n')
+
+    lexed = []
+    line_styles = highlighter.lexer.line_styles
+    def counting_line_styles(text, state):
+        lexed.append(text)
+        return line_styles(text, state)
+    highlighter.lexer.line_styles = counting_line_styles
+    highlighter.select_cache(keys[0])
+    _editor.setPlainText(text)
+    assert lexed == [], lexed
+
+    # other tabs' lines are not in its cache.
+    highlighter.select_cache('another tab')
+    _editor.setPlainText(text)
+    assert len(lexed) == 3, lexed
+
+
+if __name__ == '__main__':
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv)
+    test_style_cache()
+    test_cached_tabs(app)
+    print('ok')
@@ -0,0 +1,125 @@
+"""
+Checks that the word index of a document, updated line by
+line as the document is edited, matches an index built from
+scratch after each of many random edits, and that the
+sorted words and the changes reported by changes_since
+stay in step with it.
+
+Runs without a display (QT_QPA_PLATFORM=offscreen):
+
+    python scripts/tests/word_index_update.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import random
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)))
+
+from PythonEditor.ui.Qt import QtGui
+from PythonEditor.ui.Qt import QtWidgets
+from PythonEditor.ui.features import wordindex
+
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'x', 'y1', '_z']
+EDITS = 2000
+
+
+def make_document(text):
+    """ A document laid out as an editor's is; without
+    a layout it does not report what each edit changed.
+    """
+    document = QtGui.QTextDocument()
+    document.setDocumentLayout(
+        QtWidgets.QPlainTextDocumentLayout(document)
+    )
+    document.setPlainText(text)
+    return document
+
+
+def random_text(count):
+    pieces = []
+    for i in range(count):
+        pieces.append(random.choice(WORDS))
+        pieces.append(random.choice([' ', '.', '(', '\n', '\n\n', '']))
+    return ''.join(pieces)
+
+
+def random_edit(document):
+    """ Insert, remove or replace a random
+    piece of text, or undo the last edit.
+    """
+    cursor = QtGui.QTextCursor(document)
+    length = document.characterCount()-1
+    start = random.randint(0, length)
+    end = min(length, start+random.randint(0, 40))
+    edit = random.choice(['insert', 'remove', 'replace', 'undo'])
+    if edit == 'undo' and document.isUndoAvailable():
+        document.undo()
+        return
+    cursor.setPosition(start)
+    if edit != 'insert':
+        cursor.setPosition(end, QtGui.QTextCursor.KeepAnchor)
+    if edit == 'remove':
+        cursor.removeSelectedText()
+    else:
+        cursor.insertText(random_text(random.randint(1, 8)))
+
+
+def assert_rebuilt(index, document):
+    rebuilt = wordindex.WordIndex(document.toPlainText().split('\n'))
+    assert index.texts == rebuilt.texts
+    assert index.lines == rebuilt.lines
+    assert index.counts == rebuilt.counts
+    assert index.sorted_words() == sorted(rebuilt.counts)
+
+
+def test_random_edits():
+    random.seed(0)
+    document = make_document(random_text(200))
+    word_index = wordindex.DocumentWordIndex(document)
+    index = word_index.index
+
+    # a copy of the sorted words, kept
+    # up to date through changes_since.
+    words = set(index.sorted_words())
+    version = index.version
+    for i in range(EDITS):
+        random_edit(document)
+        assert word_index._index is index, i
+        assert_rebuilt(index, document)
+        changes = index.changes_since(version)
+        if changes is None:
+            words = set(index.sorted_words())
+        else:
+            added, removed = changes
+            words = (words-set(removed)) | set(added)
+        assert words == set(index.sorted_words()), i
+        version = index.version
+
+
+def test_large_change():
+    document = make_document('first line\nsecond')
+    word_index = wordindex.DocumentWordIndex(document)
+    assert word_index.index.count('second') == 1
+    cursor = QtGui.QTextCursor(document)
+    cursor.movePosition(QtGui.QTextCursor.End)
+    lines = wordindex.REBUILD_LINES+10
+    cursor.insertText('\nline'*lines)
+    # dropped, and rebuilt when next used.
+    assert word_index._index is None
+    assert word_index.index.count('line') == lines+1
+    assert_rebuilt(word_index.index, document)
+
+
+if __name__ == '__main__':
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication(sys.argv)
+    test_random_edits()
+    test_large_change()
+    print('ok')